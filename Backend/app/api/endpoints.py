@@ -1,11 +1,45 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Any
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from contextlib import aclosing
+from typing import Any, List
+import asyncio
+import json
 import logging
-from app.models.database import get_db
-from app.models.schemas import QueryRequest, QueryResponse, UploadResponse, ErrorResponse
-from app.services.document_service import process_document
-from app.services.query_service import answer_query
+import time
+from app.core.resources import get_vector_store
+from app.core.startup import startup
+from app.core.vector_store import VectorStore
+from app.models.database import get_async_db
+from app.models.schemas import (
+    BatchQueryRequest,
+    BatchQueryResponse,
+    BatchQueryResult,
+    BulkFileResult,
+    BulkUploadResponse,
+    DocumentListResponse,
+    DocumentStatsResponse,
+    ErrorResponse,
+    JobStatusResponse,
+    QueryRequest,
+    QueryResponse,
+    UploadResponse
+)
+from app.models.tables import IngestionJob
+from app.core.config import settings
+from app.services.bulk_ingestion import BulkItem, expand_archive, run_bulk_ingestion
+from app.services.document_stats import get_document_stats, list_documents
+from app.services.ingestion_queue import (
+    QueueFullError,
+    UploadTooLargeError,
+    ingestion_queue,
+    remove_spooled_file,
+    spool_upload
+)
+from app.services.query_service import answer_batch_async, answer_query_async, stream_answer
+from app.services.workflow_service import WorkflowError, execute_workflow, plan_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,39 +51,43 @@ router = APIRouter(prefix="/api/v1", tags=["RAG Service"])
 @router.post(
     "/upload",
     response_model=UploadResponse,
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     responses={
         400: {"model": ErrorResponse, "description": "Bad Request"},
-        500: {"model": ErrorResponse, "description": "Internal Server Error"}
+        413: {"model": ErrorResponse, "description": "File Too Large"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"},
+        503: {"model": ErrorResponse, "description": "Ingestion Queue Full"}
     },
     summary="Upload PDF Document",
-    description="Upload a PDF document for processing and ingestion into the RAG system."
+    description="Upload a PDF document and queue it for ingestion into the RAG system."
 )
 async def upload_document(
     file: UploadFile = File(..., description="PDF file to upload"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> UploadResponse:
     """
-    Upload and process a PDF document.
+    Upload a PDF document and queue it for background processing.
     
     This endpoint:
     1. Accepts a PDF file
-    2. Extracts text from the PDF
-    3. Chunks the text
-    4. Generates embeddings
-    5. Stores embeddings in ChromaDB
-    6. Stores metadata in PostgreSQL
+    2. Spools it to disk
+    3. Creates the document and ingestion job records
+    4. Returns immediately with the job ID
+    
+    A pool of ingestion workers then extracts, chunks and embeds the text and
+    stores it in ChromaDB. Poll /api/v1/jobs/{job_id} for progress.
     
     Args:
         file: The uploaded PDF file
         db: Database session (injected)
         
     Returns:
-        UploadResponse with document ID and filename
+        UploadResponse with document ID, filename and job ID
         
     Raises:
-        HTTPException: If file is not PDF or processing fails
+        HTTPException: If file is not PDF, is too large, the queue is full or queuing fails
     """
+    file_path = None
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
@@ -58,38 +96,286 @@ async def upload_document(
                 detail="Only PDF files are supported"
             )
         
-        # Validate file size (optional - add if needed)
-        # file_size = len(await file.read())
-        # await file.seek(0)  # Reset file pointer
-        # if file_size > 10 * 1024 * 1024:  # 10MB limit
-        #     raise HTTPException(
-        #         status_code=status.HTTP_400_BAD_REQUEST,
-        #         detail="File size must be less than 10MB"
-        #     )
+        # Validate file size up front when the client declared it;
+        # spooling enforces the same limit on the bytes actually received
+        if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File size must be less than {settings.MAX_UPLOAD_SIZE_MB}MB"
+            )
         
-        logger.info(f"Processing uploaded file: {file.filename}")
+        logger.info(f"Queuing uploaded file: {file.filename}")
         
-        # Process the document
-        document_id = process_document(
-            file=file,
-            file_name=file.filename,
-            db_session=db
+        # Spool the upload to disk in blocks, off the event loop
+        file_path = await run_in_threadpool(spool_upload, file.file, file.filename)
+        
+        # Queue the document for background ingestion
+        job = await ingestion_queue.enqueue(
+            db_session=db,
+            file_path=file_path,
+            file_name=file.filename
         )
         
         return UploadResponse(
-            document_id=document_id,
-            file_name=file.filename
+            document_id=job.document_id,
+            file_name=file.filename,
+            job_id=job.id,
+            status=job.status
         )
         
     except HTTPException:
+        remove_spooled_file(file_path)
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except QueueFullError as e:
+        remove_spooled_file(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
+        remove_spooled_file(file_path)
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process document: {str(e)}"
         )
 
+@router.post(
+    "/upload/bulk",
+    response_model=BulkUploadResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad Request"},
+        413: {"model": ErrorResponse, "description": "Archive Too Large"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"}
+    },
+    summary="Bulk Upload PDF Documents",
+    description="Upload many PDF documents, or zip archives of PDFs, and ingest them in one pipelined run."
+)
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(..., description="PDF files and/or zip archives of PDF files")
+) -> BulkUploadResponse:
+    """
+    Upload and ingest many PDF documents at once.
+    
+    This endpoint:
+    1. Spools every PDF, expanding zip archives
+    2. Extracts the next document while embedding the previous ones,
+       filling embedding batches across document boundaries
+    3. Writes document and chunk metadata with bulk inserts
+    4. Returns the outcome of each file and aggregate throughput
+    
+    Unlike /upload, ingestion finishes before the response is sent.
+    A file that is not a PDF, is too large or cannot be parsed is reported
+    as failed without affecting the rest.
+    
+    Args:
+        files: The uploaded PDF files and zip archives
+        
+    Returns:
+        BulkUploadResponse with per-file results and throughput
+        
+    Raises:
+        HTTPException: If an archive is invalid or too large, too many files
+            are sent, or ingestion fails
+    """
+    items: List[BulkItem] = []
+    try:
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".zip"):
+                archive_path = await run_in_threadpool(
+                    spool_upload, file.file, name, settings.BULK_UPLOAD_MAX_ARCHIVE_MB * 1024 * 1024
+                )
+                try:
+                    items.extend(await run_in_threadpool(
+                        expand_archive, archive_path, settings.BULK_UPLOAD_MAX_FILES - len(items)
+                    ))
+                finally:
+                    remove_spooled_file(archive_path)
+            elif name.lower().endswith(".pdf"):
+                item = BulkItem(file_name=name)
+                try:
+                    item.file_path = await run_in_threadpool(spool_upload, file.file, name)
+                except UploadTooLargeError as e:
+                    item.fail(str(e))
+                items.append(item)
+            else:
+                items.append(BulkItem(file_name=name, status="failed", error="Only PDF and zip files are supported"))
+            
+            if len(items) > settings.BULK_UPLOAD_MAX_FILES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"At most {settings.BULK_UPLOAD_MAX_FILES} files can be uploaded at once"
+                )
+        
+        logger.info(f"Bulk ingesting {len(items)} uploaded files")
+        # Ingestion is synchronous; it runs on a worker thread with its own session
+        result = await run_in_threadpool(run_bulk_ingestion, items)
+        
+        results = [
+            BulkFileResult(
+                file_name=item.file_name,
+                document_id=item.document_id,
+                status=item.status,
+                version=item.version,
+                pages=item.pages,
+                chunks=item.chunks,
+                error=item.error
+            )
+            for item in result.items
+        ]
+        failed = sum(1 for item in result.items if item.status == "failed")
+        return BulkUploadResponse(
+            results=results,
+            files=len(results),
+            succeeded=len(results) - failed,
+            failed=failed,
+            pages=result.pages,
+            chunks=result.chunks,
+            elapsed_seconds=round(result.elapsed_seconds, 3),
+            pages_per_second=round(result.pages_per_second, 2),
+            chunks_per_second=round(result.chunks_per_second, 2)
+        )
+        
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error in bulk upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process documents: {str(e)}"
+        )
+    finally:
+        for item in items:
+            remove_spooled_file(item.file_path)
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Job Not Found"}
+    },
+    summary="Get Ingestion Job Status",
+    description="Get the status and current stage of a background ingestion job."
+)
+async def get_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db)
+) -> JobStatusResponse:
+    """
+    Get the progress of an ingestion job.
+    
+    Args:
+        job_id: ID returned by the upload endpoint
+        db: Database session (injected)
+        
+    Returns:
+        JobStatusResponse with status, stage and any error
+        
+    Raises:
+        HTTPException: If the job does not exist
+    """
+    job = await db.get(IngestionJob, job_id, options=[selectinload(IngestionJob.document)])
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    
+    stage, chunks_stored = job.stage, job.chunks_stored or 0
+    if job.status == "running":
+        # Live progress when this process runs the job (it may not be persisted yet)
+        stage, chunks_stored = ingestion_queue.progress(job.id) or (stage, chunks_stored)
+    
+    return JobStatusResponse(
+        job_id=job.id,
+        document_id=job.document_id,
+        file_name=job.document.file_name,
+        status=job.status,
+        stage=stage,
+        chunks_stored=chunks_stored,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@router.get(
+    "/documents",
+    response_model=DocumentListResponse,
+    status_code=status.HTTP_200_OK,
+    summary="List Documents",
+    description="List documents with their chunk and token counts and last ingestion time."
+)
+async def get_documents(
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of documents to return"),
+    offset: int = Query(0, ge=0, description="Number of documents to skip"),
+    db: AsyncSession = Depends(get_async_db)
+) -> DocumentListResponse:
+    """
+    List documents in ID order.
+    
+    Args:
+        limit: Page size
+        offset: Documents to skip
+        db: Async database session (injected)
+        
+    Returns:
+        DocumentListResponse with a page of documents and the total count
+    """
+    return DocumentListResponse(**await list_documents(db, limit, offset))
+
+@router.get(
+    "/documents/{document_id}/stats",
+    response_model=DocumentStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Document Not Found"}
+    },
+    summary="Get Document Statistics",
+    description="Get chunk counts, sizes and ingestion timings of one document."
+)
+async def get_document_statistics(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+) -> DocumentStatsResponse:
+    """
+    Get the chunk statistics of a document from the chunks table.
+    
+    Args:
+        document_id: ID of the document
+        db: Async database session (injected)
+        
+    Returns:
+        DocumentStatsResponse with chunk token and size statistics and stage timings
+        
+    Raises:
+        HTTPException: If the document does not exist
+    """
+    stats = await get_document_stats(db, document_id)
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {document_id} not found"
+        )
+    return DocumentStatsResponse(**stats)
+
 @router.post(
     "/query",
     response_model=QueryResponse,
@@ -102,7 +388,8 @@ async def upload_document(
     description="Ask a question about the uploaded documents and get an AI-generated answer."
 )
 async def query_documents(
-    request: QueryRequest
+    request: QueryRequest,
+    store: VectorStore = Depends(get_vector_store)
 ) -> QueryResponse:
     """
     Query the uploaded documents using RAG.
@@ -114,8 +401,13 @@ async def query_documents(
     4. Constructs a prompt with context
     5. Generates an answer using GPT-4o-mini
     
+    If the request carries a workflow graph, the graph is validated and
+    compiled (compiled plans are cached by graph hash) and run instead, so
+    each node's documents, top-k, prompt, model and temperature apply.
+    
     Args:
         request: QueryRequest containing the user's question
+        store: Shared vector store (injected)
         
     Returns:
         QueryResponse with the generated answer
@@ -133,8 +425,17 @@ async def query_documents(
         
         logger.info(f"Processing query: {request.query}")
         
-        # Get answer using RAG pipeline
-        answer = answer_query(request.query)
+        if request.workflow is not None:
+            plan = compile_request_workflow(request)
+            result = await execute_workflow(plan, request.query, store=store)
+            return QueryResponse(answer=result.answer, outputs=result.outputs)
+        
+        # Get answer using the non-blocking RAG pipeline
+        answer = await answer_query_async(
+            request.query,
+            store=store,
+            use_cache=request.use_cache
+        )
         
         return QueryResponse(answer=answer)
         
@@ -147,6 +448,174 @@ async def query_documents(
             detail=f"Failed to process query: {str(e)}"
         )
 
+@router.post(
+    "/query/batch",
+    response_model=BatchQueryResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad Request"},
+        500: {"model": ErrorResponse, "description": "Internal Server Error"}
+    },
+    summary="Query Documents (Batch)",
+    description="Ask many questions at once; embedding and retrieval are shared and answers come back in order."
+)
+async def batch_query_documents(
+    request: BatchQueryRequest,
+    store: VectorStore = Depends(get_vector_store)
+) -> BatchQueryResponse:
+    """
+    Answer a batch of questions using RAG.
+    
+    All questions are embedded in as few API calls as possible and
+    retrieved with vectorized vector store queries; completions run with
+    at most BATCH_QUERY_CONCURRENCY in flight. A question that fails does
+    not fail the batch; its result carries status "failed" and the error.
+    
+    Args:
+        request: BatchQueryRequest containing the questions
+        store: Shared vector store (injected)
+        
+    Returns:
+        BatchQueryResponse with one result per question, in request order
+        
+    Raises:
+        HTTPException: If the batch is empty or too large, or the shared
+            embedding or retrieval step fails
+    """
+    if not request.queries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one query is required"
+        )
+    if len(request.queries) > settings.BATCH_QUERY_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many queries (maximum is {settings.BATCH_QUERY_MAX_ITEMS})"
+        )
+    
+    started = time.perf_counter()
+    try:
+        answers = await answer_batch_async(request.queries, store=store, use_cache=request.use_cache)
+    except Exception as e:
+        logger.error(f"Error processing query batch: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process query batch: {str(e)}"
+        )
+    
+    failed = sum(1 for answer in answers if answer.status == "failed")
+    return BatchQueryResponse(
+        results=[
+            BatchQueryResult(query=answer.query, status=answer.status, answer=answer.answer, error=answer.error)
+            for answer in answers
+        ],
+        succeeded=len(answers) - failed,
+        failed=failed,
+        elapsed_seconds=round(time.perf_counter() - started, 3)
+    )
+
+def compile_request_workflow(request: QueryRequest):
+    """
+    Compile the workflow graph of a query request, using the plan cache.
+    
+    Raises:
+        HTTPException: If the graph is invalid
+    """
+    try:
+        return plan_cache.get_or_compile(
+            [node.model_dump() for node in request.workflow.nodes],
+            [edge.model_dump() for edge in request.workflow.edges]
+        )
+    except WorkflowError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid workflow: {str(e)}"
+        )
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post(
+    "/query/stream",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Stream of server-sent events"},
+        400: {"model": ErrorResponse, "description": "Bad Request"}
+    },
+    summary="Query Documents (Streaming)",
+    description="Ask a question and receive retrieved-context metadata followed by the answer tokens as server-sent events."
+)
+async def stream_query_documents(
+    request: QueryRequest,
+    http_request: Request,
+    store: VectorStore = Depends(get_vector_store)
+) -> StreamingResponse:
+    """
+    Query the uploaded documents using RAG and stream the answer.
+    
+    The response is a text/event-stream with these events:
+    1. `context`: sources of the retrieved chunks
+    2. `token`: pieces of the generated answer, in order
+    3. `done`: timing summary (including time to first token)
+    
+    An `error` event is sent if the pipeline fails mid-stream. If the client
+    disconnects, generation is cancelled upstream.
+    
+    Args:
+        request: QueryRequest containing the user's question
+        http_request: Raw request, used to detect client disconnects
+        store: Shared vector store (injected)
+        
+    Returns:
+        StreamingResponse of server-sent events
+        
+    Raises:
+        HTTPException: If the query is empty
+    """
+    if not request.query.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query cannot be empty"
+        )
+    
+    logger.info(f"Processing streaming query: {request.query}")
+    plan = compile_request_workflow(request) if request.workflow is not None else None
+    
+    async def workflow_events():
+        # Workflow answers are generated whole, then sent as a single token event
+        started = time.perf_counter()
+        result = await execute_workflow(plan, request.query, store=store)
+        elapsed = time.perf_counter() - started
+        yield {"event": "context", "data": {"sources": result.sources, "cached": False}}
+        yield {"event": "token", "data": {"text": result.answer}}
+        yield {"event": "done", "data": {"time_to_first_token": elapsed, "total_time": elapsed, "outputs": result.outputs}}
+    
+    async def event_source():
+        try:
+            if plan is not None:
+                events = workflow_events()
+            else:
+                events = stream_answer(request.query, store=store, use_cache=request.use_cache)
+            async with aclosing(events):
+                async for event in events:
+                    if await http_request.is_disconnected():
+                        logger.info("Client disconnected, cancelling generation")
+                        break
+                    yield format_sse(event["event"], event["data"])
+        except asyncio.CancelledError:
+            logger.info("Streaming query cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield format_sse("error", {"detail": f"Failed to process query: {str(e)}"})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get(
     "/health",
     status_code=status.HTTP_200_OK,
@@ -160,4 +629,25 @@ async def health_check() -> dict[str, str]:
     Returns:
         Status message
     """
-    return {"status": "healthy", "service": "RAG Backend Service"}
\ No newline at end of file
+    return {"status": "healthy", "service": "RAG Backend Service"}
+
+@router.get(
+    "/ready",
+    status_code=status.HTTP_200_OK,
+    summary="Readiness Check",
+    description="Check if the database, vector store and LLM clients are warm. Returns 503 until they are.",
+    responses={503: {"description": "Service is still starting"}}
+)
+async def readiness_check(response: Response) -> dict[str, Any]:
+    """
+    Readiness endpoint for load balancers and orchestrators.
+    
+    Unlike /health, which passes as soon as the process serves requests,
+    this only passes once every shared component has been warmed.
+    
+    Returns:
+        Readiness of each component and the startup time breakdown
+    """
+    if not startup.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return startup.report()
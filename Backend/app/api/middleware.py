@@ -0,0 +1,45 @@
+from typing import Optional
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.metrics import IN_FLIGHT_REQUESTS
+
+class InFlightMiddleware:
+    """
+    Tracks the number of HTTP requests in flight per route.
+
+    Requests are labelled with the matched route template (e.g.
+    /api/v1/jobs/{job_id}) rather than the raw path, so label cardinality
+    stays bounded; unmatched paths share the "unmatched" label. Written as
+    plain ASGI middleware so streamed responses count until their last byte
+    is sent.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _route(self, routes, scope: Scope) -> Optional[str]:
+        for route in routes:
+            # Newer FastAPI versions wrap included routers instead of copying their routes
+            included = getattr(route, "original_router", None)
+            if included is not None:
+                path = self._route(included.routes, scope)
+                if path:
+                    return path
+                continue
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route(scope["app"].router.routes, scope) or "unmatched"
+        gauge = IN_FLIGHT_REQUESTS.labels(scope["method"], route)
+        gauge.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gauge.dec()
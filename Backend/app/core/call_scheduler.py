@@ -0,0 +1,374 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+import logging
+from app.core.config import settings
+from app.core.metrics import LLM_CONCURRENCY_LIMIT, LLM_RETRIES, LLM_THROTTLE_WAIT
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Statuses that signal the provider is overloaded: back off and shrink concurrency
+CONGESTION_STATUSES = (429, 503)
+
+# Other statuses worth retrying
+RETRYABLE_STATUSES = (408, 409, 500, 502, 504)
+
+# Buckets hold one second of budget, so calls are spread evenly instead of bursting a minute's worth
+BURST_SECONDS = 1.0
+
+class TokenBucket:
+    """
+    Budget refilled continuously at `per_minute` units per minute.
+
+    The bucket holds BURST_SECONDS of budget. A single call larger than
+    that is admitted once the bucket is full and drives it negative, so it
+    delays later calls instead of waiting forever.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * BURST_SECONDS
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be now)."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def drain(self):
+        """Forget any remaining budget (the provider just said it is spent)."""
+        self.level = min(self.level, 0.0)
+
+def _wake(future: "asyncio.Future"):
+    if not future.done():
+        future.set_result(None)
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error, if it has one."""
+    return getattr(error, "status_code", None)
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Delay requested by the provider with a failed response.
+
+    Reads retry-after-ms (sent by OpenAI), then Retry-After as seconds or
+    an HTTP date.
+
+    Args:
+        error: Exception raised by the provider client
+
+    Returns:
+        Seconds to wait, or None if the response did not say
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _is_connection_error(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, openai.APIConnectionError)
+
+class CallScheduler:
+    """
+    Paces calls to one provider API within its rate limits.
+
+    Every call first takes a concurrency slot and its share of the
+    requests/min and tokens/min budgets, waiting until both are available.
+    Budgets are RATE_LIMIT_HEADROOM of the configured provider limits, so
+    the scheduler stays just under them; a limit of 0 means unknown.
+
+    The concurrency limit adapts AIMD-style: it grows by one slot per
+    limit's worth of successful calls and halves when the provider reports
+    congestion (429 or 503), at most once per congestion event. A 429
+    also drains the budgets and pauses every caller for the Retry-After
+    the provider sent.
+
+    Failed calls are retried up to LLM_MAX_RETRIES times (or the caller's
+    max_retries) on rate limits, server errors and connection errors, after
+    a full-jitter exponential backoff (never shorter than Retry-After).
+    Other errors are raised straight away.
+
+    Works from threads (call) and from the event loop (call_async), which
+    share the same limits.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrency: int = 16):
+        self.name = name
+        self._condition = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.configure(requests_per_minute, tokens_per_minute, max_concurrency)
+
+    def configure(self, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        """
+        Set the provider limits and reset the adaptive state.
+
+        Args:
+            requests_per_minute: Provider request limit (0 if unknown)
+            tokens_per_minute: Provider token limit (0 if unknown)
+            max_concurrency: Upper bound for the adaptive concurrency limit
+        """
+        headroom = settings.RATE_LIMIT_HEADROOM
+        with self._condition:
+            self.requests = TokenBucket(requests_per_minute * headroom) if requests_per_minute > 0 else None
+            self.tokens = TokenBucket(tokens_per_minute * headroom) if tokens_per_minute > 0 else None
+            self.max_concurrency = max(1, max_concurrency)
+            self.limit = float(self.max_concurrency)
+            self.in_flight = 0
+            self.paused_until = 0.0
+            self._last_decrease = 0.0
+            self._condition.notify_all()
+        LLM_CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        tokens: int = 0,
+        usage: Optional[Callable[[T], Optional[int]]] = None,
+        max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Run a blocking provider call within the limits, retrying transient failures.
+
+        Args:
+            fn: Makes the call
+            tokens: Estimated tokens the call will be billed for
+            usage: Optional function returning the tokens actually billed,
+                used to correct the token budget
+            max_retries: Retries before giving up (defaults to LLM_MAX_RETRIES)
+
+        Returns:
+            The result of fn
+        """
+        if not settings.LLM_SCHEDULER_ENABLED:
+            return fn()
+        attempt = 0
+        while True:
+            self._acquire(tokens)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self._release()
+                delay = self._retry_delay(e, started, attempt, max_retries)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._release(success=True)
+            self._settle(tokens, usage, result)
+            return result
+
+    async def call_async(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        usage: Optional[Callable[[T], Optional[int]]] = None,
+        max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Async variant of call; factory returns a fresh awaitable for each attempt.
+
+        For a streaming call the slot is held until the stream is opened,
+        not until it is consumed.
+        """
+        if not settings.LLM_SCHEDULER_ENABLED:
+            return await factory()
+        attempt = 0
+        while True:
+            await self._acquire_async(tokens)
+            started = time.monotonic()
+            try:
+                result = await factory()
+            except Exception as e:
+                self._release()
+                delay = self._retry_delay(e, started, attempt, max_retries)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._release(success=True)
+            self._settle(tokens, usage, result)
+            return result
+
+    def _try_acquire(self, tokens: int, now: float) -> Optional[float]:
+        """
+        Take a slot and budget if available. Caller holds the condition.
+
+        Returns:
+            0.0 if acquired, seconds to wait for budget, or None to wait for a free slot
+        """
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return None
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens and tokens:
+            self.tokens.take(tokens)
+        self.in_flight += 1
+        return 0.0
+
+    def _acquire(self, tokens: int):
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                wait = self._try_acquire(tokens, time.monotonic())
+                if wait == 0.0:
+                    break
+                self._condition.wait(wait)
+        LLM_THROTTLE_WAIT.labels(self.name).observe(time.monotonic() - started)
+
+    async def _acquire_async(self, tokens: int):
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        while True:
+            future = None
+            with self._condition:
+                wait = self._try_acquire(tokens, time.monotonic())
+                if wait == 0.0:
+                    break
+                if wait is None:
+                    future = loop.create_future()
+                    self._async_waiters.append((loop, future))
+            if future is not None:
+                await future
+            else:
+                await asyncio.sleep(wait)
+        LLM_THROTTLE_WAIT.labels(self.name).observe(time.monotonic() - started)
+
+    def _release(self, success: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if success and self.limit < self.max_concurrency:
+                # Additive increase: one more slot per `limit` successful calls
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                LLM_CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's event loop has been closed
+                pass
+
+    def _settle(self, estimated: int, usage: Optional[Callable[[Any], Optional[int]]], result: Any):
+        """Charge the difference between billed and estimated tokens to the token budget."""
+        if usage is None or self.tokens is None:
+            return
+        billed = usage(result)
+        if billed is not None:
+            with self._condition:
+                self.tokens.take(billed - estimated)
+
+    def _retry_delay(
+        self,
+        error: Exception,
+        started: float,
+        attempt: int,
+        max_retries: Optional[int] = None
+    ) -> Optional[float]:
+        """
+        Record a failed call and decide whether to retry it.
+
+        Returns:
+            Seconds to sleep before the retry, or None to give up
+        """
+        status = status_code(error)
+        if status in CONGESTION_STATUSES:
+            reason = "rate_limit" if status == 429 else "server_error"
+        elif status in RETRYABLE_STATUSES or (status is not None and status >= 500):
+            reason = "server_error"
+        elif status is None and _is_connection_error(error):
+            reason = "connection"
+        else:
+            return None
+        max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        if attempt >= max_retries:
+            logger.error(f"{self.name} call failed after {attempt + 1} attempts: {str(error)}")
+            return None
+
+        retry_after = retry_after_seconds(error)
+        if status in CONGESTION_STATUSES:
+            now = time.monotonic()
+            with self._condition:
+                # Calls started before the last decrease belong to the same congestion event
+                if started >= self._last_decrease:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                    LLM_CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+                if status == 429:
+                    for bucket in (self.requests, self.tokens):
+                        if bucket:
+                            bucket.drain()
+                    if retry_after:
+                        self.paused_until = max(self.paused_until, now + retry_after)
+
+        backoff = random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+        delay = max(backoff, retry_after or 0.0)
+        LLM_RETRIES.labels(self.name, reason).inc()
+        logger.warning(
+            f"{self.name} call failed ({status or type(error).__name__}), retry {attempt + 1}/"
+            f"{max_retries} in {delay:.2f}s with concurrency limit {int(self.limit)}"
+        )
+        return delay
+
+# Shared by every thread and request of this process (limits are per process)
+embedding_scheduler = CallScheduler(
+    "embedding",
+    settings.EMBEDDING_RPM_LIMIT,
+    settings.EMBEDDING_TPM_LIMIT,
+    settings.EMBEDDING_MAX_IN_FLIGHT
+)
+chat_scheduler = CallScheduler(
+    "chat",
+    settings.CHAT_RPM_LIMIT,
+    settings.CHAT_TPM_LIMIT,
+    settings.CHAT_MAX_IN_FLIGHT
+)
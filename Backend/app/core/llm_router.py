@@ -0,0 +1,428 @@
+import asyncio
+import inspect
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import logging
+from app.core.call_scheduler import CallScheduler, status_code
+from app.core.config import settings
+from app.core.metrics import LLM_HEDGES, LLM_PROVIDER_LATENCY
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OPERATIONS = ("chat", "embedding")
+
+# Routes with fewer samples than this are tried before measured ones
+MIN_SAMPLES = 5
+
+# Samples needed before a rolling percentile is trusted as the hedge delay
+HEDGE_MIN_SAMPLES = 20
+
+# How much a failed call counts against a route, relative to its mean latency
+ERROR_PENALTY = 10.0
+
+@dataclass
+class ProviderConfig:
+    """One entry of LLM_PROVIDERS."""
+    name: str
+    base_url: str
+    api_key: str
+    chat_model: Optional[str] = None
+    embedding_model: Optional[str] = None
+    rpm_limit: int = 0
+    tpm_limit: int = 0
+    max_in_flight: int = 16
+
+@dataclass(eq=False)
+class Provider:
+    """
+    An OpenAI-compatible endpoint serving chat completions, embeddings or both.
+
+    Attributes:
+        name: Label used in logs and metrics
+        chat_model: Model used for chat completions (None if it serves none)
+        embedding_model: Model used for embeddings (None if it serves none)
+        clients / async_clients: Pooled clients by operation
+        schedulers: Call scheduler pacing this provider's calls, by operation
+        owned: Whether the router's owner should close the clients
+    """
+    name: str
+    chat_model: Optional[str]
+    embedding_model: Optional[str]
+    clients: Dict[str, Any]
+    async_clients: Dict[str, Any]
+    schedulers: Dict[str, CallScheduler]
+    owned: bool = False
+
+@dataclass(frozen=True)
+class Route:
+    """A provider and the model it is called with for one operation."""
+    provider: Provider
+    operation: str
+    model: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider.name}:{self.model}"
+
+    @property
+    def client(self) -> Any:
+        return self.provider.clients[self.operation]
+
+    @property
+    def async_client(self) -> Any:
+        return self.provider.async_clients[self.operation]
+
+    @property
+    def scheduler(self) -> CallScheduler:
+        return self.provider.schedulers[self.operation]
+
+def parse_provider_configs(raw: str) -> List[ProviderConfig]:
+    """
+    Parse LLM_PROVIDERS, a JSON list of extra OpenAI-compatible providers.
+
+    Each entry needs a name, a base_url and a chat_model and/or
+    embedding_model. The API key is given inline (api_key) or as the name
+    of an environment variable holding it (api_key_env). rpm_limit,
+    tpm_limit and max_in_flight configure the provider's call schedulers.
+
+    Args:
+        raw: The setting's value
+
+    Returns:
+        Provider configurations in the order given
+    """
+    if not raw.strip():
+        return []
+    try:
+        entries = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM_PROVIDERS is not valid JSON: {str(e)}")
+    if not isinstance(entries, list):
+        raise ValueError("LLM_PROVIDERS must be a JSON list of provider objects")
+
+    configs = []
+    names = {"openai"}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("name") or not entry.get("base_url"):
+            raise ValueError(f"LLM_PROVIDERS entry needs a name and a base_url: {entry}")
+        name = str(entry["name"])
+        if name in names:
+            raise ValueError(f"LLM_PROVIDERS has a duplicate or reserved provider name: {name}")
+        names.add(name)
+        if not entry.get("chat_model") and not entry.get("embedding_model"):
+            raise ValueError(f"LLM_PROVIDERS entry {name} needs a chat_model or an embedding_model")
+        api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", ""), "")
+        if not api_key:
+            logger.warning(f"LLM provider {name} has no API key")
+        configs.append(ProviderConfig(
+            name=name,
+            base_url=str(entry["base_url"]),
+            api_key=api_key,
+            chat_model=entry.get("chat_model"),
+            embedding_model=entry.get("embedding_model"),
+            rpm_limit=int(entry.get("rpm_limit", 0)),
+            tpm_limit=int(entry.get("tpm_limit", 0)),
+            max_in_flight=int(entry.get("max_in_flight", settings.CHAT_MAX_IN_FLIGHT))
+        ))
+    return configs
+
+class LatencyStats:
+    """Rolling window of one route's call latencies and outcomes."""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=window)
+        self._failures: deque = deque(maxlen=window)
+
+    def record(self, seconds: float, outcome: str):
+        """
+        Add a finished call.
+
+        Only answered calls are latency samples. A cancelled call (the
+        losing side of a hedge) is dropped: it was stopped once the hedge
+        delay had passed, so keeping it would pull the percentile that sets
+        that delay towards the delay itself.
+        """
+        with self._lock:
+            if outcome == "ok":
+                self._latencies.append(seconds)
+            if outcome != "cancelled":
+                self._failures.append(outcome == "error")
+
+    def percentile(self, percent: float, min_samples: int = MIN_SAMPLES) -> Optional[float]:
+        """The given latency percentile, or None with fewer than min_samples samples."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    def score(self) -> float:
+        """
+        Expected cost of sending a call this way; lower is better.
+
+        Mean latency inflated by the recent error rate. Routes with too few
+        samples score 0 so they get measured.
+        """
+        with self._lock:
+            calls = len(self._failures)
+            errors = sum(self._failures)
+            latencies = list(self._latencies)
+        if calls < MIN_SAMPLES and len(latencies) < MIN_SAMPLES:
+            return 0.0
+        if not latencies or (calls and errors == calls):
+            return math.inf
+        return sum(latencies) / len(latencies) * (1 + ERROR_PENALTY * errors / max(1, calls))
+
+async def _maybe_await(value: Any):
+    if inspect.isawaitable(value):
+        await value
+
+class LLMRouter:
+    """
+    Sends each provider call the way that has recently been fastest.
+
+    Candidate routes for a call are ordered by their rolling latency score
+    (LLM_LATENCY_WINDOW calls); a small share of calls (LLM_EXPLORE_RATE)
+    goes to another candidate so a route that was slow once is measured
+    again. A failed call fails over to the next candidate. While another
+    candidate is left, a route's scheduler retries transient failures only
+    LLM_FAILOVER_RETRIES times instead of LLM_MAX_RETRIES, so the call
+    moves on quickly; the last candidate retries as usual.
+
+    Async calls can be hedged (LLM_HEDGE_ENABLED): when the first route
+    has not answered after the hedge delay, the same call is sent to the
+    next route, the first answer wins and the other call is cancelled. The
+    delay is LLM_HEDGE_DELAY_MS, or when that is 0 the first route's rolling
+    LLM_HEDGE_PERCENTILE latency, so only about the slowest
+    (100 - percentile)% of calls are duplicated.
+
+    Chat calls for the default CHAT_MODEL may go to any provider with a
+    chat model; a call for another model goes to the providers serving it,
+    or to the default provider. Embeddings only go to providers serving
+    EMBEDDING_MODEL, since vectors from different models are not comparable.
+    """
+
+    def __init__(self, providers: List[Provider]):
+        self.providers = providers
+        self._lock = threading.Lock()
+        self._stats: Dict[str, LatencyStats] = {}
+
+    def stats(self, route: Route) -> LatencyStats:
+        """Rolling statistics of a route."""
+        key = f"{route.operation}:{route.key}"
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = LatencyStats(settings.LLM_LATENCY_WINDOW)
+            return self._stats[key]
+
+    def chat_models(self) -> List[str]:
+        """Chat models some provider serves, i.e. the models a chat call may ask for."""
+        return sorted({p.chat_model for p in self.providers if p.chat_model})
+
+    def routes(self, operation: str, model: Optional[str] = None) -> List[Route]:
+        """
+        Candidate routes for a call, best first.
+
+        Args:
+            operation: "chat" or "embedding"
+            model: Requested model (None for the configured default)
+
+        Returns:
+            At least one route
+        """
+        if operation == "embedding":
+            model = model or settings.EMBEDDING_MODEL
+            routes = [Route(p, operation, model) for p in self.providers if p.embedding_model == model]
+        elif model is None or model == settings.CHAT_MODEL:
+            routes = [Route(p, operation, p.chat_model) for p in self.providers if p.chat_model]
+        else:
+            routes = [Route(p, operation, model) for p in self.providers if p.chat_model == model]
+        if not routes:
+            default = self.providers[0]
+            fallback = default.embedding_model if operation == "embedding" else default.chat_model
+            routes = [Route(default, operation, model or fallback)]
+
+        routes.sort(key=lambda route: self.stats(route).score())
+        if len(routes) > 1 and random.random() < settings.LLM_EXPLORE_RATE:
+            routes.insert(0, routes.pop(random.randrange(1, len(routes))))
+        return routes
+
+    def hedge_delay(self, routes: List[Route]) -> Optional[float]:
+        """
+        Seconds to wait for the first route before hedging.
+
+        Uses the first route's rolling percentile, or while that route has
+        too few samples (e.g. it was picked to explore), the next measured
+        route's. None while no route has enough samples.
+        """
+        if settings.LLM_HEDGE_DELAY_MS > 0:
+            return settings.LLM_HEDGE_DELAY_MS / 1000
+        for route in routes:
+            observed = self.stats(route).percentile(settings.LLM_HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+            if observed is not None:
+                return max(settings.LLM_HEDGE_MIN_DELAY_MS / 1000, observed)
+        return None
+
+    @staticmethod
+    def max_retries(routes: List[Route], index: int) -> Optional[int]:
+        """Scheduler retries for routes[index]: capped while a later route can take over."""
+        if index < len(routes) - 1:
+            return min(settings.LLM_MAX_RETRIES, settings.LLM_FAILOVER_RETRIES)
+        return None
+
+    def _observe(self, route: Route, seconds: float, outcome: str):
+        self.stats(route).record(seconds, outcome)
+        LLM_PROVIDER_LATENCY.labels(route.provider.name, route.operation, outcome).observe(seconds)
+
+    def call(
+        self,
+        operation: str,
+        fn: Callable[[Route], T],
+        tokens: int = 0,
+        usage: Optional[Callable[[T], Optional[int]]] = None,
+        model: Optional[str] = None
+    ) -> Tuple[T, Route]:
+        """
+        Make a blocking provider call on the best route, failing over on errors.
+
+        Blocking calls are never hedged: a losing call could not be cancelled.
+
+        Args:
+            operation: "chat" or "embedding"
+            fn: Makes the call on the given route
+            tokens: Estimated tokens the call will be billed for
+            usage: Optional function returning the tokens actually billed
+            model: Requested model (None for the configured default)
+
+        Returns:
+            (result of fn, route that produced it)
+        """
+        routes = self.routes(operation, model)
+        for index, route in enumerate(routes):
+            started = time.monotonic()
+            try:
+                result = route.scheduler.call(lambda: fn(route), tokens, usage, self.max_retries(routes, index))
+            except Exception as e:
+                self._observe(route, time.monotonic() - started, "error")
+                if index == len(routes) - 1:
+                    raise
+                self._log_failover(route, routes[index + 1], e)
+                continue
+            self._observe(route, time.monotonic() - started, "ok")
+            return result, route
+        raise RuntimeError("No route for provider call")
+
+    async def call_async(
+        self,
+        operation: str,
+        factory: Callable[[Route], Awaitable[T]],
+        tokens: int = 0,
+        usage: Optional[Callable[[T], Optional[int]]] = None,
+        model: Optional[str] = None,
+        hedge: Optional[bool] = None,
+        discard: Optional[Callable[[T], Any]] = None
+    ) -> Tuple[T, Route]:
+        """
+        Async variant of call that can hedge slow calls on a second route.
+
+        Args:
+            operation: "chat" or "embedding"
+            factory: Returns a fresh awaitable making the call on the given route
+            tokens: Estimated tokens the call will be billed for
+            usage: Optional function returning the tokens actually billed
+            model: Requested model (None for the configured default)
+            hedge: Whether to hedge (defaults to LLM_HEDGE_ENABLED)
+            discard: Releases a result that lost the race after it arrived
+                (e.g. closes a stream); may be async
+
+        Returns:
+            (result of factory, route that produced it)
+        """
+        routes = self.routes(operation, model)
+        hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        delay = self.hedge_delay(routes) if hedge and len(routes) > 1 else None
+        backups = list(routes[1:])
+        tasks: Dict[asyncio.Future, Route] = {}
+        hedged = False
+        error: Optional[BaseException] = None
+
+        def start(route: Route):
+            retries = self.max_retries(routes, routes.index(route))
+            tasks[asyncio.ensure_future(self._attempt_async(route, factory, tokens, usage, retries))] = route
+
+        start(routes[0])
+        try:
+            while tasks:
+                timeout = delay if delay is not None and not hedged and backups else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The first route is slower than usual: race it against the next one
+                    hedged = True
+                    start(backups.pop(0))
+                    continue
+
+                winner = None
+                for task in done:
+                    route = tasks.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        if not tasks and backups:
+                            self._log_failover(route, backups[0], error)
+                    elif winner is None:
+                        winner = (task.result(), route)
+                    elif discard is not None:
+                        await _maybe_await(discard(task.result()))
+                if winner is not None:
+                    if hedged:
+                        LLM_HEDGES.labels(operation, "primary" if winner[1] is routes[0] else "hedge").inc()
+                    return winner
+                if not tasks and backups:
+                    start(backups.pop(0))
+            if hedged:
+                LLM_HEDGES.labels(operation, "none").inc()
+            raise error
+        finally:
+            # Cancel the losing call; one that finished meanwhile is discarded
+            for task in tasks:
+                task.cancel()
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if discard is not None and not isinstance(result, BaseException):
+                    await _maybe_await(discard(result))
+
+    async def _attempt_async(
+        self,
+        route: Route,
+        factory: Callable[[Route], Awaitable[T]],
+        tokens: int,
+        usage: Optional[Callable[[T], Optional[int]]],
+        max_retries: Optional[int]
+    ) -> T:
+        started = time.monotonic()
+        try:
+            result = await route.scheduler.call_async(lambda: factory(route), tokens, usage, max_retries)
+        except asyncio.CancelledError:
+            self._observe(route, time.monotonic() - started, "cancelled")
+            raise
+        except Exception:
+            self._observe(route, time.monotonic() - started, "error")
+            raise
+        self._observe(route, time.monotonic() - started, "ok")
+        return result
+
+    def _log_failover(self, failed: Route, next_route: Route, error: BaseException):
+        logger.warning(
+            f"{failed.operation} call to {failed.key} failed ({status_code(error) or type(error).__name__}), "
+            f"trying {next_route.key}"
+        )
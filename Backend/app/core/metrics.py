@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, TypeVar
+from prometheus_client import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+# Latency buckets (seconds) covering cache hits through slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Ingestion of large documents runs for minutes, so its stages get longer buckets
+INGESTION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from receiving a streaming query to sending its first generated token",
+    buckets=LATENCY_BUCKETS
+)
+
+QUERY_STAGE_DURATION = Histogram(
+    "rag_query_stage_duration_seconds",
+    "Time spent in each stage of answering a query",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+INGESTION_STAGE_DURATION = Histogram(
+    "rag_ingestion_stage_duration_seconds",
+    "Time spent in each stage of ingesting one document",
+    ["stage"],
+    buckets=INGESTION_BUCKETS
+)
+
+LLM_TOKENS = Counter(
+    "rag_llm_tokens",
+    "Tokens billed by the OpenAI API, as reported in response usage",
+    ["model", "kind"]
+)
+
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"]
+)
+
+ERRORS = Counter(
+    "rag_errors",
+    "Failures by pipeline and the stage they happened in",
+    ["pipeline", "stage"]
+)
+
+COALESCED_CALLS = Counter(
+    "rag_coalesced_calls",
+    "Calls that waited on an identical call already in flight instead of running, by operation",
+    ["operation"]
+)
+
+LLM_RETRIES = Counter(
+    "rag_llm_retries",
+    "Provider calls retried by the call scheduler, by operation and reason (rate_limit, server_error, connection)",
+    ["operation", "reason"]
+)
+
+LLM_THROTTLE_WAIT = Histogram(
+    "rag_llm_throttle_wait_seconds",
+    "Time provider calls waited for a rate-limit budget or a concurrency slot",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "rag_llm_concurrency_limit",
+    "Adaptive limit on concurrent provider calls, by operation",
+    ["operation"]
+)
+
+LLM_PROVIDER_LATENCY = Histogram(
+    "rag_llm_provider_latency_seconds",
+    "Latency of provider calls by provider, operation and outcome (ok, error, cancelled)",
+    ["provider", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_HEDGES = Counter(
+    "rag_llm_hedges",
+    "Hedged provider calls by operation and which request answered first (primary, hedge, none)",
+    ["operation", "winner"]
+)
+
+IN_FLIGHT_REQUESTS = Gauge(
+    "rag_in_flight_requests",
+    "HTTP requests currently being handled, by route",
+    ["method", "route"]
+)
+
+def record_usage(model: str, usage) -> None:
+    """
+    Count the tokens reported in an OpenAI response's usage block.
+
+    Args:
+        model: Model that served the request
+        usage: The response's usage object (may be None)
+    """
+    if usage is None:
+        return
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    if completion_tokens:
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+@contextmanager
+def query_stage(stage: str) -> Iterator[None]:
+    """
+    Time one stage of answering a query and count it as an error if it raises.
+
+    Works around awaits as well as blocking calls. A client going away
+    (cancellation or a closed stream) is not counted as an error.
+
+    Args:
+        stage: Stage name ("embed", "retrieve", "prompt_build", "generate")
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except (GeneratorExit, asyncio.CancelledError):
+        raise
+    except BaseException:
+        ERRORS.labels("query", stage).inc()
+        raise
+    finally:
+        QUERY_STAGE_DURATION.labels(stage).observe(time.perf_counter() - started)
+
+class StageTimer:
+    """
+    Accumulates the time one document spends in each ingestion stage.
+
+    Ingestion interleaves its stages (extraction and chunking run lazily
+    inside the chunk iterator, embedding and storing run on a worker
+    thread), so each stage's time is summed while the document is processed
+    and observed once by finish(). Nested stages are exclusive: time spent
+    in an inner stage is not also charged to the stage that called it.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Charge the time spent in the block to `name`; failures count as errors of the innermost stage."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            if getattr(self._local, "counted", None) is not e:
+                self._local.counted = e
+                ERRORS.labels("ingestion", name).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            with self._lock:
+                self.totals[name] = self.totals.get(name, 0.0) + elapsed - frame[0]
+
+    def timed(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield from items, charging the time spent producing each item to `name`."""
+        iterator = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def finish(self):
+        """Observe the accumulated stage totals."""
+        with self._lock:
+            for name, seconds in self.totals.items():
+                INGESTION_STAGE_DURATION.labels(name).observe(seconds)
@@ -0,0 +1,299 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+import logging
+from app.core.call_scheduler import CallScheduler, chat_scheduler, embedding_scheduler
+from app.core.config import settings
+from app.core.llm_router import OPERATIONS, LLMRouter, Provider, ProviderConfig, parse_provider_configs
+from app.core.vector_store import ChromaVectorStore, NumpyVectorStore, VectorStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# chromadb and openai take about a second to import, so they are loaded on first use
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+# ChromaDB collection name
+COLLECTION_NAME = "document_collection"
+
+def _http_limits() -> "httpx.Limits":
+    """Connection pool limits shared by all OpenAI clients."""
+    import httpx
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY
+    )
+
+def _max_retries() -> int:
+    """SDK retries, off while the call scheduler retries provider calls itself."""
+    import openai
+    return 0 if settings.LLM_SCHEDULER_ENABLED else openai.DEFAULT_MAX_RETRIES
+
+def _sync_client(api_key: str, base_url: str) -> "openai.OpenAI":
+    import openai
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url or None,
+        timeout=settings.OPENAI_TIMEOUT,
+        max_retries=_max_retries(),
+        http_client=openai.DefaultHttpxClient(limits=_http_limits())
+    )
+
+def _async_client(api_key: str, base_url: str) -> "openai.AsyncOpenAI":
+    import openai
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url or None,
+        timeout=settings.OPENAI_TIMEOUT,
+        max_retries=_max_retries(),
+        http_client=openai.DefaultAsyncHttpxClient(limits=_http_limits())
+    )
+
+def _open_provider(config: ProviderConfig) -> Provider:
+    """Create the clients and call schedulers of an LLM_PROVIDERS entry."""
+    client = _sync_client(config.api_key, config.base_url)
+    async_client = _async_client(config.api_key, config.base_url)
+    return Provider(
+        name=config.name,
+        chat_model=config.chat_model,
+        embedding_model=config.embedding_model,
+        clients={operation: client for operation in OPERATIONS},
+        async_clients={operation: async_client for operation in OPERATIONS},
+        schedulers={
+            operation: CallScheduler(f"{operation}:{config.name}", config.rpm_limit, config.tpm_limit, config.max_in_flight)
+            for operation in OPERATIONS
+        },
+        owned=True
+    )
+
+def _open_chroma(create: bool = True) -> Tuple[Any, Any]:
+    """
+    Open the persistent ChromaDB client and the document collection.
+
+    Args:
+        create: Create the collection if missing; readers pass False, so
+            only the writer ever creates it
+
+    Raises:
+        chromadb.errors.NotFoundError (ValueError on older chromadb): If not
+            creating and the collection does not exist yet
+    """
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    client = chromadb.PersistentClient(
+        path=settings.CHROMA_DB_PATH,
+        settings=ChromaSettings(anonymized_telemetry=False)
+    )
+    if create:
+        return client, client.get_or_create_collection(name=COLLECTION_NAME)
+    return client, client.get_collection(name=COLLECTION_NAME)
+
+def _reopen_chroma() -> Any:
+    # The embedded client is cached per path and never reloads its index; drop it and open afresh
+    from chromadb.api.shared_system_client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+    return _open_chroma(create=False)[1]
+
+def open_vector_store(role: str = "embedded") -> Tuple[VectorStore, Any, Any]:
+    """
+    Open the configured vector store (VECTOR_STORE_BACKEND).
+
+    Args:
+        role: "embedded" (this process reads and writes), "writer" (the
+            vector writer process, which tells readers about its writes) or
+            "reader" (an API process that opens the store read-only and
+            picks up the writer's changes)
+
+    Returns:
+        (vector store, ChromaDB client, ChromaDB collection); the last two are
+        None for the numpy backend
+
+    Raises:
+        FileNotFoundError / chromadb.errors.NotFoundError: For a reader, if
+            the vector writer has not created the store yet
+    """
+    if settings.VECTOR_STORE_BACKEND == "numpy":
+        # Numpy stores already pick up other processes' writes through their generation file
+        store = NumpyVectorStore(
+            settings.NUMPY_INDEX_PATH,
+            quantization=settings.VECTOR_QUANTIZATION,
+            rerank_oversample=settings.VECTOR_RERANK_OVERSAMPLE,
+            read_only=role == "reader"
+        )
+        return store, None, None
+    if settings.VECTOR_STORE_BACKEND == "chroma":
+        if settings.VECTOR_QUANTIZATION != "none":
+            logger.warning("VECTOR_QUANTIZATION only applies to the numpy vector store backend")
+        client, collection = _open_chroma(create=role != "reader")
+        if role == "embedded":
+            return ChromaVectorStore(collection), client, collection
+        store = ChromaVectorStore(
+            collection,
+            path=settings.CHROMA_DB_PATH,
+            reopen=_reopen_chroma if role == "reader" else None,
+            refresh_seconds=settings.VECTOR_READER_REFRESH_SECONDS
+        )
+        return store, client, collection
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {settings.VECTOR_STORE_BACKEND}")
+
+class Resources:
+    """
+    Registry of long-lived clients shared by every request and worker.
+
+    The application lifespan calls init() once at startup and close() at
+    shutdown. Code running outside the app (scripts, benchmarks) gets the
+    same objects lazily on first access.
+
+    Attributes:
+        vector_store: Chunk storage and search (VECTOR_STORE_BACKEND); with
+            VECTOR_WRITER_ADDRESS set, reads are local and writes go to the writer process
+        chroma_client: The single ChromaDB PersistentClient (chroma backend only)
+        collection: Handle to the document collection (chroma backend only)
+        llm_client / async_llm_client: Pooled clients for chat completions
+        embedding_client / async_embedding_client: Pooled clients for embeddings
+        router: Routes chat and embedding calls between the default OpenAI
+            provider (the clients above) and the LLM_PROVIDERS endpoints
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.vector_store: Optional[VectorStore] = None
+        self.chroma_client: Any = None
+        self.collection: Any = None
+        self.llm_client: Optional["openai.OpenAI"] = None
+        self.async_llm_client: Optional["openai.AsyncOpenAI"] = None
+        self.embedding_client: Optional["openai.OpenAI"] = None
+        self.async_embedding_client: Optional["openai.AsyncOpenAI"] = None
+        self.router: Optional[LLMRouter] = None
+
+    def init(self):
+        """Create all shared clients. Safe to call more than once."""
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            started = time.perf_counter()
+            if settings.VECTOR_WRITER_ADDRESS:
+                from app.core.vector_writer import RemoteWriteVectorStore, VectorWriterClient
+                reader, self.chroma_client, self.collection = open_vector_store("reader")
+                self.vector_store = RemoteWriteVectorStore(reader, VectorWriterClient(settings.VECTOR_WRITER_ADDRESS))
+            else:
+                self.vector_store, self.chroma_client, self.collection = open_vector_store()
+            self.llm_client = _sync_client(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+            self.async_llm_client = _async_client(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+            self.embedding_client = _sync_client(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+            self.async_embedding_client = _async_client(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+            default = Provider(
+                name="openai",
+                chat_model=settings.CHAT_MODEL,
+                embedding_model=settings.EMBEDDING_MODEL,
+                clients={"chat": self.llm_client, "embedding": self.embedding_client},
+                async_clients={"chat": self.async_llm_client, "embedding": self.async_embedding_client},
+                schedulers={"chat": chat_scheduler, "embedding": embedding_scheduler}
+            )
+            extra = [_open_provider(config) for config in parse_provider_configs(settings.LLM_PROVIDERS)]
+            self.router = LLMRouter([default] + extra)
+            self._initialized = True
+            logger.info(f"Shared resources initialized in {time.perf_counter() - started:.3f}s")
+
+    def ensure(self) -> "Resources":
+        """Initialize on first use and return the registry."""
+        if not self._initialized:
+            self.init()
+        return self
+
+    async def warm_up(self):
+        """
+        Touch each resource once so the first user request does not pay cold-start costs.
+
+        Loads the vector index with a real similarity query and opens the
+        HTTP connections to the LLM provider. Failures are logged, not raised.
+        """
+        started = time.perf_counter()
+        await self.warm_up_vector_store()
+        await self.warm_up_clients()
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.3f}s")
+
+    async def warm_up_vector_store(self) -> bool:
+        """
+        Load the vector index with a real similarity query.
+
+        Returns:
+            True if the store answered (an empty store counts), False on failure
+        """
+        self.ensure()
+        try:
+            sample = await asyncio.to_thread(self.vector_store.sample_embedding)
+            if sample is not None:
+                await asyncio.to_thread(self.vector_store.query, [sample], 1)
+            return True
+        except Exception as e:
+            logger.warning(f"Vector store warm-up failed: {str(e)}")
+            return False
+
+    async def warm_up_clients(self) -> bool:
+        """
+        Open the HTTP connections of the async LLM and embedding clients.
+
+        Extra LLM_PROVIDERS are warmed too, but only the default provider
+        decides the result: the router fails over away from the others.
+
+        Returns:
+            True if the LLM provider answered both clients, False otherwise
+        """
+        self.ensure()
+        warmed = True
+        for client in (self.async_embedding_client, self.async_llm_client):
+            try:
+                await client.models.list()
+            except Exception as e:
+                logger.warning(f"LLM client warm-up failed: {str(e)}")
+                warmed = False
+        for provider in self.router.providers:
+            if provider.owned:
+                try:
+                    await provider.async_clients["chat"].models.list()
+                except Exception as e:
+                    logger.warning(f"LLM provider {provider.name} warm-up failed: {str(e)}")
+        return warmed
+
+    async def close(self):
+        """Close pooled HTTP connections."""
+        with self._lock:
+            if not self._initialized:
+                return
+            self._initialized = False
+        self.vector_store.close()
+        self.llm_client.close()
+        self.embedding_client.close()
+        await self.async_llm_client.close()
+        await self.async_embedding_client.close()
+        for provider in self.router.providers:
+            if provider.owned:
+                provider.clients["chat"].close()
+                await provider.async_clients["chat"].close()
+        logger.info("Shared resources closed")
+
+# Process-wide registry
+resources = Resources()
+
+# FastAPI dependencies
+
+def get_vector_store() -> VectorStore:
+    """Dependency returning the shared vector store."""
+    return resources.ensure().vector_store
+
+def get_llm_client() -> "openai.AsyncOpenAI":
+    """Dependency returning the shared async chat completions client."""
+    return resources.ensure().async_llm_client
+
+def get_embedding_client() -> "openai.AsyncOpenAI":
+    """Dependency returning the shared async embeddings client."""
+    return resources.ensure().async_embedding_client
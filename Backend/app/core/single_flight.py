@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar
+from app.core.config import settings
+from app.core.metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls made from threads.
+
+    While a call for a key is running, further calls with the same key wait
+    for its outcome (result or exception) instead of running it again.
+    Nothing is cached: once the call finishes, the next one runs afresh.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Run fn() unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the call
+            fn: The work to do
+
+        Returns:
+            fn's result, possibly from another caller's run
+        """
+        owned, shared = self.claim([key])
+        if shared:
+            return shared[key].result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(owned, e)
+            raise
+        self.resolve(owned, [result])
+        return result
+
+    def claim(self, keys: Sequence[Hashable]) -> Tuple[List[Hashable], Dict[Hashable, Future]]:
+        """
+        Claim the keys of a multi-item call.
+
+        Keys nobody is working on are claimed by the caller, who must then
+        resolve() or fail() them. Keys already in flight are returned with
+        the future of the call working on them.
+
+        Args:
+            keys: Distinct keys of the items to compute
+
+        Returns:
+            (keys claimed by the caller, {key: future} for keys in flight elsewhere)
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return list(keys), {}
+        owned: List[Hashable] = []
+        shared: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in keys:
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    owned.append(key)
+                else:
+                    shared[key] = future
+        if shared:
+            COALESCED_CALLS.labels(self.name).inc(len(shared))
+        return owned, shared
+
+    def resolve(self, keys: Sequence[Hashable], values: Sequence[Any]):
+        """Publish the results of claimed keys to their waiters."""
+        for future, value in zip(self._release(keys), values):
+            if future is not None:
+                future.set_result(value)
+
+    def fail(self, keys: Sequence[Hashable], error: BaseException):
+        """Publish the failure of claimed keys to their waiters."""
+        for future in self._release(keys):
+            if future is not None:
+                future.set_exception(error)
+
+    def _release(self, keys: Sequence[Hashable]) -> List[Optional[Future]]:
+        # Unregister before publishing so later callers start a fresh call
+        with self._lock:
+            return [self._calls.pop(key, None) for key in keys]
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent identical coroutine calls on an event loop.
+
+    The first caller's coroutine runs as a task; callers arriving while it
+    is running await the same task. The task is shielded, so a caller that
+    is cancelled (e.g. a client disconnecting) does not cancel the work
+    the others are waiting for.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Tasks belong to one event loop; keep a registry per loop
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Task]]" = \
+            weakref.WeakKeyDictionary()
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await factory() unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the call
+            factory: Creates the coroutine doing the work
+
+        Returns:
+            The coroutine's result, possibly from another caller's run
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await factory()
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(tasks, key, done))
+        else:
+            COALESCED_CALLS.labels(self.name).inc()
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finish(tasks: Dict[Hashable, asyncio.Task], key: Hashable, task: asyncio.Task):
+        if tasks.get(key) is task:
+            del tasks[key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
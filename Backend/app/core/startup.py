@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Components that must be warm before the service reports ready
+READINESS_COMPONENTS = ("database", "vector_store", "llm_client")
+
+class StartupTracker:
+    """
+    Startup step timings and readiness of the shared components.
+
+    Liveness (/api/v1/health) only says the process is serving; readiness
+    (/api/v1/ready) waits until every component in READINESS_COMPONENTS
+    has been warmed, which may happen in the background after the server
+    starts accepting connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.steps: Dict[str, float] = {}
+        self.components: Dict[str, bool] = {name: False for name in READINESS_COMPONENTS}
+        self.errors: Dict[str, str] = {}
+        self.ready_after: Optional[float] = None
+
+    def reset(self, started: Optional[float] = None):
+        """Start a new startup (e.g. when the app is started again in the same process)."""
+        with self._lock:
+            self.started = time.perf_counter() if started is None else started
+            self.steps.clear()
+            self.errors.clear()
+            self.components = {name: False for name in READINESS_COMPONENTS}
+            self.ready_after = None
+
+    def record(self, step: str, seconds: float):
+        """Record the duration of a startup step."""
+        with self._lock:
+            self.steps[step] = seconds
+        logger.info(f"Startup step {step} took {seconds:.3f}s")
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """Time a startup step."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self, component: str):
+        """Mark a component as warm; logs the startup breakdown once all are."""
+        with self._lock:
+            self.components[component] = True
+            self.errors.pop(component, None)
+            if self.ready_after is not None or not all(self.components.values()):
+                return
+            self.ready_after = time.perf_counter() - self.started
+            breakdown = ", ".join(f"{step} {seconds:.3f}s" for step, seconds in self.steps.items())
+        logger.info(f"Service ready {self.ready_after:.3f}s after start ({breakdown})")
+
+    def mark_failed(self, component: str, error: str):
+        """Record why a component could not be warmed (it stays not ready)."""
+        with self._lock:
+            self.errors[component] = error
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def report(self) -> Dict[str, Any]:
+        """Readiness of each component and the startup breakdown, for the readiness endpoint."""
+        with self._lock:
+            return {
+                "status": "ready" if self.ready_after is not None else "starting",
+                "components": dict(self.components),
+                "errors": dict(self.errors),
+                "startup_seconds": {step: round(seconds, 4) for step, seconds in self.steps.items()},
+                "ready_after_seconds": round(self.ready_after, 4) if self.ready_after is not None else None
+            }
+
+# Process-wide tracker
+startup = StartupTracker()
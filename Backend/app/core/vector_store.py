@@ -0,0 +1,854 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class VectorMatch:
+    """One search result: a stored chunk and its squared L2 distance to the query."""
+    id: str
+    text: str
+    distance: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+class VectorStore(ABC):
+    """
+    Storage and similarity search for chunk embeddings.
+
+    Ingestion writes through upsert/update_metadata/delete and retrieval
+    reads through query, so the search engine can be swapped without
+    touching the services. Distances are squared L2, as in ChromaDB's
+    default space; smaller is more similar.
+    """
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Insert chunks, replacing any with the same IDs."""
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing chunks without touching their embeddings."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete chunks by ID, ignoring unknown IDs."""
+
+    @abstractmethod
+    def ids_for_file(self, file_name: str) -> List[str]:
+        """IDs of every chunk stored for a file name."""
+
+    @abstractmethod
+    def query(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        file_names: Optional[Sequence[str]] = None
+    ) -> List[List[VectorMatch]]:
+        """
+        Find the nearest chunks for each query embedding.
+
+        Args:
+            embeddings: Query embeddings
+            n_results: Number of matches per query
+            file_names: Only search chunks of these files (default: all)
+
+        Returns:
+            Matches for each query, nearest first
+        """
+
+    @abstractmethod
+    def sample_embedding(self) -> Optional[List[float]]:
+        """Any one stored embedding (used to warm up the index), or None if empty."""
+
+    def close(self):
+        """Release files and connections."""
+
+class ReadWriteLock:
+    """Lock shared by any number of readers or held by one writer (writers go first)."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._writing = True
+            while self._readers:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class ChromaVectorStore(VectorStore):
+    """
+    VectorStore backed by a ChromaDB collection.
+
+    An embedded ChromaDB client only loads the index when it is opened, so
+    a process reading a directory that another process writes to does not
+    see new chunks. In the single-writer deployment the writer is created
+    with `path` and touches a generation file there after every write;
+    readers are created with `path` and `reopen` and reopen their client
+    when the generation changes, checking at most every `refresh_seconds`.
+    """
+
+    GENERATION_FILE = "writer_generation"
+
+    def __init__(
+        self,
+        collection: Any,
+        path: Optional[str] = None,
+        reopen: Optional[Callable[[], Any]] = None,
+        refresh_seconds: float = 1.0
+    ):
+        self.collection = collection
+        self._generation_path = Path(path) / self.GENERATION_FILE if path else None
+        self._reopen = reopen
+        self._refresh_seconds = refresh_seconds
+        self._access = ReadWriteLock()
+        self._generation = self._generation_mtime()
+        self._checked_at = time.monotonic()
+
+    def _generation_mtime(self) -> Optional[int]:
+        if self._generation_path is None:
+            return None
+        try:
+            return self._generation_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _written(self):
+        """Tell reader processes the collection changed (writer side)."""
+        if self._generation_path is not None and self._reopen is None:
+            tmp = self._generation_path.with_name(f"{self.GENERATION_FILE}.{os.getpid()}.tmp")
+            tmp.write_text(str(time.time_ns()))
+            os.replace(tmp, self._generation_path)
+
+    @contextmanager
+    def _reading(self) -> Iterator[None]:
+        """Reopen the client if the writer changed the collection, then hold it for a read."""
+        if self._reopen is not None and time.monotonic() - self._checked_at >= self._refresh_seconds:
+            self._checked_at = time.monotonic()
+            generation = self._generation_mtime()
+            if generation != self._generation:
+                with self._access.writing():
+                    if generation != self._generation:
+                        started = time.perf_counter()
+                        self.collection = self._reopen()
+                        self._generation = generation
+                        logger.info(f"Reopened ChromaDB after external writes in {time.perf_counter() - started:.3f}s")
+        with self._access.reading():
+            yield
+
+    def count(self) -> int:
+        with self._reading():
+            return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self._written()
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+        self._written()
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+            self._written()
+
+    def ids_for_file(self, file_name):
+        with self._reading():
+            return self.collection.get(where={"file_name": file_name}, include=[])["ids"]
+
+    def query(self, embeddings, n_results, file_names=None):
+        with self._reading():
+            if self.collection.count() == 0 or (file_names is not None and not file_names):
+                return [[] for _ in embeddings]
+            where = None
+            if file_names is not None:
+                names = list(file_names)
+                where = {"file_name": names[0]} if len(names) == 1 else {"file_name": {"$in": names}}
+            results = self.collection.query(
+                query_embeddings=[np.asarray(embedding, dtype=np.float32) for embedding in embeddings],
+                n_results=n_results,
+                where=where
+            )
+        matches = []
+        for index, ids in enumerate(results["ids"]):
+            documents = results["documents"][index]
+            metadatas = (results.get("metadatas") or [[]])[index] or [{}] * len(ids)
+            distances = (results.get("distances") or [[]])[index] or [None] * len(ids)
+            matches.append([
+                VectorMatch(id=chunk_id, text=text, distance=distance, metadata=metadata or {})
+                for chunk_id, text, metadata, distance in zip(ids, documents, metadatas, distances)
+            ])
+        return matches
+
+    def sample_embedding(self):
+        with self._reading():
+            sample = self.collection.peek(1)
+        embeddings = sample.get("embeddings") if sample else None
+        if embeddings is not None and len(embeddings) > 0:
+            return list(embeddings[0])
+        return None
+
+# Quantization modes of NumpyVectorStore and their meta codes
+QUANTIZATION_MODES = {"none": 0, "float16": 16, "int8": 8}
+
+# Rows converted to float32 at a time when scanning quantized vectors
+SCAN_BLOCK_ROWS = 4096
+
+def quantize(matrix: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compress float32 rows for approximate search.
+
+    float16 halves the size. int8 uses symmetric per-row scalar quantization
+    (codes in [-127, 127] and one float32 scale per row), a quarter of the size.
+
+    Args:
+        matrix: float32 embeddings, one per row
+        mode: "float16" or "int8"
+
+    Returns:
+        (codes, scales), with scales None for float16
+    """
+    if mode == "float16":
+        return matrix.astype(np.float16), None
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(matrix / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class _LayoutChanged(Exception):
+    """Rows of a search were renumbered by a compaction before they could be resolved."""
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process exact search over a memory-mapped float32 matrix.
+
+    Embeddings live in vectors.npy (one row per chunk, grown by doubling)
+    with their squared norms in norms.npy; texts and metadata live in a
+    small SQLite file keyed by row. A search is one matrix product over all
+    rows followed by argpartition, so results are exact.
+
+    With quantization ("float16" or "int8") a compressed copy of every row
+    is kept in codes.npy (plus per-row scales.npy for int8). Searches scan
+    only the compressed rows, then re-rank the best k * rerank_oversample
+    candidates exactly against their float32 rows, so the float32 matrix
+    stays on disk and only candidate rows are ever paged in.
+
+    Appends write new rows at the end. Deletes (and the old row of an
+    upserted ID) only tombstone the row; the matrix is compacted once dead
+    rows outnumber live ones. Other processes sharing the directory pick up
+    changes through a generation file that every write touches.
+
+    Compaction renumbers rows, so it writes the arrays of a new layout to
+    new files (vectors.<layout>.npy, ...) and commits the layout number
+    with the renumbered records. Searches remember the layout their rows
+    come from and resolve them only if the records still have that layout,
+    otherwise they search again on the new one.
+
+    A read-only store (the API processes, when a vector writer owns the
+    directory) never writes: it opens the records database with mode=ro
+    and the arrays with mmap_mode="r", and searches with the quantization
+    the writer stored rather than re-quantizing to its own setting. It
+    raises FileNotFoundError if the writer has not created the store yet.
+    """
+
+    GENERATION_FILE = "generation"
+    LAYOUT_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        path: str,
+        quantization: str = "none",
+        rerank_oversample: int = 4,
+        read_only: bool = False
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.path = Path(path)
+        self.quantization = quantization
+        self.rerank_oversample = max(1, rerank_oversample)
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        records_path = self.path / "records.sqlite3"
+        if read_only:
+            if not records_path.exists():
+                raise FileNotFoundError(f"No vector index at {self.path} yet, start the vector writer first")
+            self._db = sqlite3.connect(
+                f"{records_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+                isolation_level=None
+            )
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(records_path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " row INTEGER PRIMARY KEY,"
+                " id TEXT NOT NULL UNIQUE,"
+                " file_name TEXT,"
+                " document TEXT NOT NULL,"
+                " metadata TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS records_file_name ON records (file_name)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        # Open memory maps by name: vectors, norms and, when quantized, codes (and scales)
+        self._arrays: Dict[str, np.ndarray] = {}
+        # Row numbering of the open arrays, bumped by every compaction
+        self._layout = 0
+        # (arrays, alive, size, layout) as seen by searches; replaced, never mutated
+        self._snapshot: Tuple[Dict[str, np.ndarray], np.ndarray, int, int] = ({}, np.zeros(0, dtype=bool), 0, 0)
+        self._generation = None
+        with self._lock:
+            self._load()
+
+    # Persistence helpers
+
+    def _meta(self, key: str, default: int = 0) -> int:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: int):
+        self._db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def _specs(self, dim: int) -> Dict[str, Tuple[Any, Tuple[int, ...]]]:
+        """dtype and per-row shape of each array file for the quantization mode."""
+        specs = {"vectors": (np.float32, (dim,)), "norms": (np.float32, ())}
+        if self.quantization == "float16":
+            specs["codes"] = (np.float16, (dim,))
+        elif self.quantization == "int8":
+            specs["codes"] = (np.int8, (dim,))
+            specs["scales"] = (np.float32, ())
+        return specs
+
+    def _array_path(self, name: str, layout: int) -> Path:
+        """File of one array in a row layout (layout 0 keeps the original file names)."""
+        return self.path / (f"{name}.npy" if layout == 0 else f"{name}.{layout}.npy")
+
+    def _generation_mtime(self) -> Optional[int]:
+        try:
+            return (self.path / self.GENERATION_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _touch_generation(self):
+        path = self.path / self.GENERATION_FILE
+        tmp = path.with_name(f"{self.GENERATION_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(str(self._meta("size")))
+        os.replace(tmp, path)
+        self._generation = self._generation_mtime()
+
+    def _load(self):
+        """(Re)open the array files and rebuild the alive mask. Caller holds the lock."""
+        self._generation = self._generation_mtime()
+        mmap_mode = "r" if self.read_only else "r+"
+        for attempt in range(self.LAYOUT_ATTEMPTS):
+            # Layout, size and rows are read in one transaction, so they match the files opened
+            self._db.execute("BEGIN")
+            try:
+                self._layout = self._meta("layout")
+                size = self._meta("size")
+                rows = [row for (row,) in self._db.execute("SELECT row FROM records")]
+                self._arrays = {}
+                if size and self._array_path("vectors", self._layout).exists():
+                    self._arrays["vectors"] = np.load(self._array_path("vectors", self._layout), mmap_mode=mmap_mode)
+                    self._arrays["norms"] = np.load(self._array_path("norms", self._layout), mmap_mode=mmap_mode)
+                    if self._meta("quantization") != QUANTIZATION_MODES[self.quantization]:
+                        if self.read_only:
+                            self._adopt_stored_quantization()
+                        else:
+                            self._rebuild_codes(size)
+                    for name in self._specs(0):
+                        if name not in self._arrays:
+                            self._arrays[name] = np.load(self._array_path(name, self._layout), mmap_mode=mmap_mode)
+                else:
+                    size = 0
+            except FileNotFoundError:
+                # Another process compacted the store and removed this layout's files meanwhile
+                if attempt == self.LAYOUT_ATTEMPTS - 1:
+                    raise
+                continue
+            finally:
+                self._db.execute("COMMIT")
+            break
+        capacity = len(self._arrays["vectors"]) if self._arrays else 0
+        alive = np.zeros(capacity, dtype=bool)
+        if rows:
+            alive[np.asarray(rows, dtype=np.int64)] = True
+        self._snapshot = (dict(self._arrays), alive, size, self._layout)
+
+    def _adopt_stored_quantization(self):
+        """Search the codes the writer stored; only the writer re-quantizes. Caller holds the lock."""
+        stored = self._meta("quantization")
+        mode = next((name for name, code in QUANTIZATION_MODES.items() if code == stored), "none")
+        logger.warning(
+            f"Vector index is quantized as {mode}, not {self.quantization}; "
+            "searching it as stored until the vector writer is restarted with the same setting"
+        )
+        self.quantization = mode
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector index at {self.path} is open read-only; writes go through the vector writer")
+
+    def _rebuild_codes(self, size: int):
+        """Re-quantize every row after the quantization mode changed. Caller holds the lock."""
+        vectors = self._arrays["vectors"]
+        capacity, dim = vectors.shape
+        for name in ("codes", "scales"):
+            if name not in self._specs(dim):
+                self._array_path(name, self._layout).unlink(missing_ok=True)
+        for name, (dtype, tail) in self._specs(dim).items():
+            if name in ("vectors", "norms"):
+                continue
+            np.lib.format.open_memmap(
+                self._array_path(name, self._layout), mode="w+", dtype=dtype, shape=(capacity,) + tail
+            )
+        self._arrays.update({
+            name: np.load(self._array_path(name, self._layout), mmap_mode="r+")
+            for name in self._specs(dim) if name not in ("vectors", "norms")
+        })
+        for start in range(0, size, SCAN_BLOCK_ROWS):
+            self._write_codes(start, np.asarray(vectors[start:start + SCAN_BLOCK_ROWS][:size - start]))
+        for name in self._arrays:
+            self._arrays[name].flush()
+        self._set_meta("quantization", QUANTIZATION_MODES[self.quantization])
+        if self.quantization == "none":
+            logger.info("Quantization disabled, dropped compressed vectors")
+        else:
+            logger.info(f"Quantized {size} stored vectors to {self.quantization}")
+
+    def _write_codes(self, start: int, matrix: np.ndarray):
+        """Store the compressed form of rows starting at `start`, if quantization is on."""
+        if self.quantization == "none":
+            return
+        codes, scales = quantize(matrix, self.quantization)
+        self._arrays["codes"][start:start + len(matrix)] = codes
+        if scales is not None:
+            self._arrays["scales"][start:start + len(matrix)] = scales
+
+    def _refresh(self):
+        """Reload if another process wrote to the store since the last load."""
+        if self._generation_mtime() != self._generation:
+            with self._lock:
+                if self._generation_mtime() != self._generation:
+                    self._load()
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        """Grow the array files (by doubling) to hold at least `needed` rows. Caller holds the lock."""
+        vectors = self._arrays.get("vectors")
+        capacity = len(vectors) if vectors is not None else 0
+        if vectors is not None and vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the index dimension {vectors.shape[1]}")
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        size = self._snapshot[2]
+        self._arrays = {
+            name: self._rewrite_file(
+                name, dtype, (new_capacity,) + tail, self._arrays.get(name), np.arange(size), self._layout
+            )
+            for name, (dtype, tail) in self._specs(dim).items()
+        }
+        if not capacity:
+            self._set_meta("quantization", QUANTIZATION_MODES[self.quantization])
+        logger.info(f"Grew vector index to {new_capacity} rows")
+
+    def _rewrite_file(
+        self,
+        name: str,
+        dtype: Any,
+        shape: Tuple[int, ...],
+        old: Optional[np.ndarray],
+        rows: np.ndarray,
+        layout: int
+    ) -> np.ndarray:
+        """Write a new array file of a layout holding old[rows] at the top and swap it in."""
+        path = self._array_path(name, layout)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        rewritten = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        if old is not None:
+            for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+                part = rows[start:start + SCAN_BLOCK_ROWS]
+                rewritten[start:start + len(part)] = old[part]
+        rewritten.flush()
+        del rewritten
+        os.replace(tmp, path)
+        return np.load(path, mmap_mode="r+")
+
+    def _publish(self, alive: np.ndarray, size: int):
+        """Make a write visible to searches and other processes. Caller holds the lock."""
+        self._set_meta("size", size)
+        self._snapshot = (dict(self._arrays), alive, size, self._layout)
+        self._touch_generation()
+
+    def _tombstone(self, ids: List[str], alive: np.ndarray):
+        """Drop records for ids and clear their rows in alive. Caller holds the lock."""
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = [row for (row,) in self._db.execute(
+                f"SELECT row FROM records WHERE id IN ({placeholders})", part
+            )]
+            if rows:
+                alive[np.asarray(rows, dtype=np.int64)] = False
+                self._db.execute(f"DELETE FROM records WHERE id IN ({placeholders})", part)
+
+    def _maybe_compact(self):
+        """Rewrite the arrays without dead rows once they outnumber live ones. Caller holds the lock."""
+        _, alive, size, _ = self._snapshot
+        live = int(alive[:size].sum())
+        dead = size - live
+        if dead <= max(1024, live):
+            return
+        keep = np.flatnonzero(alive[:size])
+        capacity = max(1024, live * 2)
+        dim = self._arrays["vectors"].shape[1]
+
+        # The new layout gets its own files, so searches still reading the old rows are unaffected
+        old_layout, layout = self._layout, self._layout + 1
+        arrays = {
+            name: self._rewrite_file(name, dtype, (capacity,) + tail, self._arrays[name], keep, layout)
+            for name, (dtype, tail) in self._specs(dim).items()
+        }
+
+        # Renumber rows in ascending order, so every target row is already free
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            "UPDATE records SET row = ? WHERE row = ?",
+            ((new, int(old)) for new, old in enumerate(keep) if new != old)
+        )
+        self._set_meta("layout", layout)
+        self._set_meta("size", live)
+        self._db.execute("COMMIT")
+        self._arrays = arrays
+        self._layout = layout
+
+        new_alive = np.zeros(capacity, dtype=bool)
+        new_alive[:live] = True
+        self._publish(new_alive, live)
+        # Open memory maps of the old layout stay valid after their files are removed
+        for name in self._specs(dim):
+            try:
+                self._array_path(name, old_layout).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not remove {name} array of vector layout {old_layout}: {str(e)}")
+        logger.info(f"Compacted vector index: {dead} dead rows removed, {live} kept")
+
+    def memory_bytes(self) -> int:
+        """Bytes a full search scan touches (the compressed rows when quantized)."""
+        arrays, _, size, _ = self._snapshot
+        scanned = ("codes", "scales", "norms") if "codes" in arrays else ("vectors", "norms")
+        return sum(arrays[name][:size].nbytes for name in scanned if name in arrays)
+
+    # VectorStore interface
+
+    def count(self) -> int:
+        self._refresh()
+        _, alive, size, _ = self._snapshot
+        return int(alive[:size].sum())
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._check_writable()
+        if not ids:
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            _, alive, size, _ = self._snapshot
+            alive = alive.copy()
+
+            self._ensure_capacity(size + len(ids), matrix.shape[1])
+            self._arrays["vectors"][size:size + len(ids)] = matrix
+            self._arrays["norms"][size:size + len(ids)] = np.einsum("ij,ij->i", matrix, matrix)
+            self._write_codes(size, matrix)
+            for array in self._arrays.values():
+                array.flush()
+
+            # Records and the row count commit together, so a crash never leaves records past the end
+            self._db.execute("BEGIN")
+            self._tombstone(list(ids), alive)
+            self._set_meta("size", size + len(ids))
+            self._db.executemany(
+                "INSERT INTO records (row, id, file_name, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (size + offset, chunk_id, (metadata or {}).get("file_name"), text, json.dumps(metadata or {}))
+                    for offset, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas))
+                )
+            )
+            self._db.execute("COMMIT")
+
+            capacity = len(self._arrays["vectors"])
+            if len(alive) < capacity:
+                alive = np.concatenate([alive, np.zeros(capacity - len(alive), dtype=bool)])
+            alive[size:size + len(ids)] = True
+            self._publish(alive, size + len(ids))
+            self._maybe_compact()
+
+    def update_metadata(self, ids, metadatas):
+        self._check_writable()
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE records SET file_name = ?, metadata = ? WHERE id = ?",
+                (
+                    ((metadata or {}).get("file_name"), json.dumps(metadata or {}), chunk_id)
+                    for chunk_id, metadata in zip(ids, metadatas)
+                )
+            )
+            self._db.execute("COMMIT")
+
+    def delete(self, ids):
+        self._check_writable()
+        if not ids:
+            return
+        with self._lock:
+            self._refresh()
+            _, alive, size, _ = self._snapshot
+            alive = alive.copy()
+            self._db.execute("BEGIN")
+            self._tombstone(list(ids), alive)
+            self._db.execute("COMMIT")
+            self._publish(alive, size)
+            self._maybe_compact()
+
+    def ids_for_file(self, file_name):
+        with self._lock:
+            return [chunk_id for (chunk_id,) in self._db.execute(
+                "SELECT id FROM records WHERE file_name = ?", (file_name,)
+            )]
+
+    @staticmethod
+    def _top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and values of the k smallest entries of each column, sorted, one row per column."""
+        top = np.argpartition(distances, k - 1, axis=0)[:k].T
+        top_distances = np.take_along_axis(distances.T, top, axis=1)
+        order = np.argsort(top_distances, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_distances, order, axis=1)
+
+    def _approximate_dots(self, arrays: Dict[str, np.ndarray], size: int, queries: np.ndarray) -> np.ndarray:
+        """Dot products of every row with the queries, computed from the compressed rows in blocks."""
+        codes = arrays["codes"]
+        scales = arrays.get("scales")
+        dots = np.empty((size, len(queries)), dtype=np.float32)
+        buffer = np.empty((min(SCAN_BLOCK_ROWS, size), codes.shape[1]), dtype=np.float32)
+        for start in range(0, size, SCAN_BLOCK_ROWS):
+            stop = min(start + SCAN_BLOCK_ROWS, size)
+            # Widen into a reused buffer; BLAS has no float16/int8 kernels
+            np.copyto(buffer[:stop - start], codes[start:stop])
+            block = buffer[:stop - start] @ queries.T
+            if scales is not None:
+                block *= scales[start:stop, None]
+            dots[start:stop] = block
+        return dots
+
+    @contextmanager
+    def _reading_layout(self, layout: int) -> Iterator[None]:
+        """
+        Read records in one transaction, raising _LayoutChanged if their rows
+        are no longer numbered as in `layout`.
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if self._meta("layout") != layout:
+                    raise _LayoutChanged()
+                yield
+            finally:
+                self._db.execute("COMMIT")
+
+    def _rows_for_files(self, file_names: Sequence[str], layout: int) -> np.ndarray:
+        """Row numbers (in `layout`) of the chunks belonging to any of the files."""
+        names = list(file_names)
+        rows = []
+        with self._reading_layout(layout):
+            for start in range(0, len(names), 500):
+                part = names[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(row for (row,) in self._db.execute(
+                    f"SELECT row FROM records WHERE file_name IN ({placeholders})", part
+                ))
+        return np.asarray(rows, dtype=np.int64)
+
+    def _consistent(self, attempt: Callable[[Tuple[Dict[str, np.ndarray], np.ndarray, int, int]], Any]) -> Any:
+        """Run attempt(snapshot), retrying on a fresh snapshot if a compaction renumbered its rows."""
+        for retry in range(self.LAYOUT_ATTEMPTS):
+            self._refresh()
+            snapshot = self._snapshot
+            try:
+                return attempt(snapshot)
+            except _LayoutChanged:
+                if retry == self.LAYOUT_ATTEMPTS - 1:
+                    raise RuntimeError("Vector index was compacted repeatedly during a search")
+                # Another process may not have touched the generation file yet
+                with self._lock:
+                    if self._snapshot[3] == snapshot[3]:
+                        self._load()
+
+    def search(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        file_names: Optional[Sequence[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest-neighbour search returning row numbers and exact distances.
+
+        Without quantization every row is scored exactly. With quantization
+        the compressed rows are scored first and only the best
+        k * rerank_oversample candidates are re-scored from float32 rows.
+
+        Args:
+            embeddings: Query embeddings
+            n_results: Number of matches per query
+            file_names: Only search rows of these files (default: all)
+
+        Returns:
+            (rows, distances) arrays of shape (queries, k), nearest first
+        """
+        return self._consistent(lambda snapshot: self._search(snapshot, embeddings, n_results, file_names))
+
+    def _search(
+        self,
+        snapshot: Tuple[Dict[str, np.ndarray], np.ndarray, int, int],
+        embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        file_names: Optional[Sequence[str]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """search() over one snapshot; rows are numbered in the snapshot's layout."""
+        arrays, alive, size, layout = snapshot
+        if file_names is not None:
+            allowed = np.zeros(size, dtype=bool)
+            rows = self._rows_for_files(file_names, layout)
+            allowed[rows[rows < size]] = True
+            alive = alive[:size] & allowed
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        live = int(alive[:size].sum()) if size else 0
+        k = min(n_results, live)
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        norms = arrays["norms"]
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+
+        # Squared L2 distance: |x|^2 - 2 x.q + |q|^2, for every row at once
+        if "codes" in arrays:
+            distances = self._approximate_dots(arrays, size, queries)
+        else:
+            distances = np.asarray(arrays["vectors"][:size] @ queries.T)
+        distances *= -2.0
+        distances += norms[:size, None]
+        distances += query_norms[None, :]
+        distances[~alive[:size]] = np.inf
+
+        if "codes" not in arrays:
+            return self._top_k(distances, k)
+
+        # Exact re-rank of the oversampled candidates from their float32 rows
+        candidates, _ = self._top_k(distances, min(live, k * self.rerank_oversample))
+        rows = np.unique(candidates)
+        exact = np.asarray(arrays["vectors"][rows]) @ queries.T
+        exact *= -2.0
+        exact += norms[rows, None]
+        exact += query_norms[None, :]
+        candidate_distances = exact[np.searchsorted(rows, candidates), np.arange(len(queries))[:, None]]
+        order = np.argsort(candidate_distances, axis=1)[:, :k]
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+    def records(self, rows: Sequence[int], layout: int) -> Dict[int, Tuple[str, str, Dict[str, Any]]]:
+        """
+        Map row numbers to (id, text, metadata), skipping rows deleted meanwhile.
+
+        Raises:
+            _LayoutChanged: If the rows are no longer numbered as in `layout`
+        """
+        rows = [int(row) for row in rows]
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        with self._reading_layout(layout):
+            return {
+                row: (chunk_id, text, json.loads(metadata))
+                for row, chunk_id, text, metadata in self._db.execute(
+                    f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", rows
+                )
+            }
+
+    def query(self, embeddings, n_results, file_names=None):
+        def attempt(snapshot):
+            rows, distances = self._search(snapshot, embeddings, n_results, file_names)
+            return rows, distances, self.records(np.unique(rows), snapshot[3])
+
+        rows, distances, found = self._consistent(attempt)
+        return [
+            [
+                VectorMatch(id=found[row][0], text=found[row][1], distance=float(distance), metadata=found[row][2])
+                for row, distance in zip(query_rows.tolist(), query_distances.tolist())
+                if row in found
+            ]
+            for query_rows, query_distances in zip(rows, distances)
+        ]
+
+    def sample_embedding(self):
+        self._refresh()
+        arrays, alive, size, _ = self._snapshot
+        live = np.flatnonzero(alive[:size])
+        return arrays["vectors"][live[0]].tolist() if live.size else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+            self._arrays = {}
+            self._snapshot = ({}, np.zeros(0, dtype=bool), 0, 0)
@@ -0,0 +1,273 @@
+import os
+import secrets
+import signal
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener, answer_challenge, deliver_challenge
+from typing import Any, Optional, Tuple, Union
+import logging
+import numpy as np
+from app.core.config import settings
+from app.core.vector_store import VectorStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Store methods the writer executes; everything else is served by the local reader
+WRITE_METHODS = ("upsert", "update_metadata", "delete")
+
+class VectorWriterError(RuntimeError):
+    """The writer process could not be reached or failed to apply a write."""
+
+def parse_address(address: str) -> Tuple[Union[str, Tuple[str, int]], str]:
+    """
+    Turn VECTOR_WRITER_ADDRESS into a multiprocessing.connection address.
+
+    Args:
+        address: Socket path, or host:port
+
+    Returns:
+        (address, family) for Listener/Client
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and host and port.isdigit() and "/" not in address:
+        return (host, int(port)), "AF_INET"
+    return address, "AF_UNIX"
+
+def key_path(address: str) -> str:
+    """File next to a Unix socket holding the key the writer generated for it."""
+    return f"{address}.key"
+
+def _configured_authkey(family: str) -> Optional[bytes]:
+    """
+    VECTOR_WRITER_AUTHKEY, which a TCP address requires.
+
+    Messages are pickled, so anyone able to talk to an unauthenticated
+    writer could run code in it (and a fake writer could in its clients).
+
+    Raises:
+        VectorWriterError: If the address is host:port and no key is configured
+    """
+    if settings.VECTOR_WRITER_AUTHKEY:
+        return settings.VECTOR_WRITER_AUTHKEY.encode("utf-8")
+    if family == "AF_INET":
+        raise VectorWriterError("VECTOR_WRITER_AUTHKEY must be set when VECTOR_WRITER_ADDRESS is host:port")
+    return None
+
+def _client_authkey(address: str, family: str) -> bytes:
+    """The configured key, or the one the writer wrote next to its Unix socket."""
+    authkey = _configured_authkey(family)
+    if authkey is not None:
+        return authkey
+    try:
+        with open(key_path(address), "rb") as key_file:
+            return key_file.read()
+    except OSError as e:
+        raise VectorWriterError(f"Cannot read the vector writer key for {address}: {str(e)}") from e
+
+class VectorWriterClient:
+    """
+    Connection from one process to the writer, shared by its threads.
+
+    Calls are serialized over a single connection (the writer applies
+    writes one at a time anyway). A broken connection is re-established
+    and the call retried once; every write method is idempotent, so a
+    retried write that had already been applied does no harm.
+    """
+
+    def __init__(self, address: str):
+        self.address, self.family = parse_address(address)
+        # Fail at start-up rather than on the first write
+        _configured_authkey(self.family)
+        self._connection: Optional[Connection] = None
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args: Any) -> Any:
+        """
+        Run a store method in the writer process.
+
+        Raises:
+            VectorWriterError: If the writer is unreachable or the write failed
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._connection is None:
+                        # Read on every connect: a restarted writer generates a new key
+                        authkey = _client_authkey(self.address, self.family)
+                        self._connection = Client(self.address, family=self.family, authkey=authkey)
+                    self._connection.send((method, args))
+                    status, value = self._connection.recv()
+                    break
+                except (EOFError, OSError, AuthenticationError) as e:
+                    self._close()
+                    if attempt:
+                        raise VectorWriterError(f"Vector writer at {self.address} is unreachable: {str(e)}") from e
+        if status == "error":
+            raise VectorWriterError(value)
+        return value
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except OSError:
+                pass
+            self._connection = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+class RemoteWriteVectorStore(VectorStore):
+    """VectorStore that reads from a local store and sends writes to the writer process."""
+
+    def __init__(self, reader: VectorStore, client: VectorWriterClient):
+        self.reader = reader
+        self.client = client
+
+    def count(self) -> int:
+        return self.reader.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        # A float32 array pickles far smaller than nested lists of floats
+        self.client.call("upsert", list(ids), np.asarray(embeddings, dtype=np.float32), list(documents), list(metadatas))
+
+    def update_metadata(self, ids, metadatas):
+        self.client.call("update_metadata", list(ids), list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.client.call("delete", list(ids))
+
+    def ids_for_file(self, file_name):
+        return self.reader.ids_for_file(file_name)
+
+    def query(self, embeddings, n_results, file_names=None):
+        return self.reader.query(embeddings, n_results, file_names)
+
+    def sample_embedding(self):
+        return self.reader.sample_embedding()
+
+    def close(self):
+        self.client.close()
+        self.reader.close()
+
+class VectorWriterServer:
+    """Applies the writes of every API process to the one store this process owns."""
+
+    def __init__(self, store: VectorStore, address: str):
+        self.store = store
+        self.address, self.family = parse_address(address)
+        self._lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+
+    def serve_forever(self):
+        """
+        Accept authenticated connections until close() is called, one thread per connection.
+
+        A host:port address requires VECTOR_WRITER_AUTHKEY. A Unix socket
+        without one gets a random key, written to a file next to it; the
+        socket and the key file are only accessible to the writer's user.
+
+        Raises:
+            VectorWriterError: If the address is host:port and no key is configured
+        """
+        authkey = _configured_authkey(self.family)
+        if self.family != "AF_UNIX":
+            self._listener = Listener(self.address, family=self.family)
+        else:
+            for path in (self.address, key_path(self.address)):
+                if os.path.lexists(path):
+                    os.unlink(path)
+            if authkey is None:
+                authkey = secrets.token_bytes(32)
+                descriptor = os.open(key_path(self.address), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(descriptor, "wb") as key_file:
+                    key_file.write(authkey)
+            previous_umask = os.umask(0o177)
+            try:
+                self._listener = Listener(self.address, family=self.family)
+            finally:
+                os.umask(previous_umask)
+        logger.info(f"Vector writer listening on {self.address}")
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._listener is None:
+                    return
+                logger.warning("Failed to accept a vector writer connection", exc_info=True)
+                continue
+            threading.Thread(target=self._serve, args=(connection, authkey), daemon=True).start()
+
+    def _serve(self, connection: Connection, authkey: bytes):
+        with connection:
+            # Authenticate here rather than in accept(), so a client that
+            # never answers the challenge cannot stall the accept loop
+            try:
+                deliver_challenge(connection, authkey)
+                answer_challenge(connection, authkey)
+            except (EOFError, OSError, AuthenticationError) as e:
+                logger.warning(f"Rejected an unauthenticated vector writer connection: {str(e)}")
+                return
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if method not in WRITE_METHODS:
+                    connection.send(("error", f"Unsupported vector writer call: {method}"))
+                    continue
+                try:
+                    with self._lock:
+                        result = getattr(self.store, method)(*args)
+                    connection.send(("ok", result))
+                except Exception as e:
+                    logger.error(f"Vector writer {method} failed: {str(e)}")
+                    connection.send(("error", f"{type(e).__name__}: {str(e)}"))
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+            if self.family == "AF_UNIX" and os.path.exists(key_path(self.address)):
+                os.unlink(key_path(self.address))
+
+def serve():
+    """
+    Run the vector writer process until SIGINT/SIGTERM.
+
+    An embedded vector store must only be written by one process. With
+    VECTOR_WRITER_ADDRESS set (a Unix socket path, or host:port for TCP
+    together with VECTOR_WRITER_AUTHKEY), the API processes open the store
+    read-only and send every upsert, metadata update and delete here:
+
+        python -m app.core.vector_writer
+        uvicorn main:app --workers 4
+    """
+    if not settings.VECTOR_WRITER_ADDRESS:
+        raise SystemExit("Set VECTOR_WRITER_ADDRESS to run the vector writer")
+    if parse_address(settings.VECTOR_WRITER_ADDRESS)[1] == "AF_INET" and not settings.VECTOR_WRITER_AUTHKEY:
+        raise SystemExit("Set VECTOR_WRITER_AUTHKEY to run the vector writer on a TCP address")
+    from app.core.config import ensure_directories
+    from app.core.resources import open_vector_store
+    ensure_directories()
+    store = open_vector_store("writer")[0]
+    server = VectorWriterServer(store, settings.VECTOR_WRITER_ADDRESS)
+
+    def stop(signum, frame):
+        server.close()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        with server._lock:
+            store.close()
+        logger.info("Vector writer stopped")
+
+if __name__ == "__main__":
+    serve()
@@ -1,20 +1,64 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Index, create_engine, func, inspect, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator, List
+import csv
+import io
+import logging
+import time
 from app.core.config import settings
 
-# Create SQLAlchemy engine
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Async drivers used for the API when ASYNC_DATABASE_URL is not set
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite"
+}
+
+def async_database_url(url: str) -> str:
+    """
+    Turn a synchronous database URL into the same database with an async driver.
+
+    Args:
+        url: SQLAlchemy URL such as postgresql://... or sqlite:///...
+
+    Returns:
+        URL using asyncpg (PostgreSQL) or aiosqlite (SQLite); other URLs are returned unchanged
+    """
+    scheme, separator, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if not separator or dialect not in ASYNC_DRIVERS:
+        return url
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+# Create SQLAlchemy engine (ingestion workers and other threads)
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW
 )
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers, so database I/O does not block the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW
+)
+
+# Objects stay usable after commit; async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -29,6 +73,120 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
-def init_db():
-    """Initialize database by creating all tables."""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency function to get an async database session.
+    Yields an AsyncSession and ensures it's closed after use.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def bulk_insert(db_session: Session, model: Any, rows: List[Dict[str, Any]]):
+    """
+    Insert many rows of one model in the session's transaction.
+
+    On PostgreSQL with psycopg2 the rows are streamed with COPY ... FROM
+    STDIN, which avoids per-row statement overhead. Other databases get a
+    single executemany INSERT. Every row must have the same keys.
+
+    Args:
+        db_session: Database session
+        model: Mapped class of the target table
+        rows: Column values of each row
+    """
+    if not rows:
+        return
+    connection = db_session.connection()
+    dialect = connection.dialect
+    if dialect.name != "postgresql" or dialect.driver != "psycopg2":
+        db_session.execute(insert(model), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # None becomes an unquoted empty field, which COPY reads as NULL
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+
+    quote = dialect.identifier_preparer.quote
+    statement = (
+        f"COPY {quote(model.__table__.name)} ({', '.join(quote(column) for column in columns)}) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+def _has_duplicates(connection: Connection, index: Index) -> bool:
+    """Whether existing rows share values in the index's columns."""
+    columns = list(index.columns)
+    duplicate = connection.execute(
+        select(*columns).group_by(*columns).having(func.count() > 1).limit(1)
+    ).first()
+    return duplicate is not None
+
+def _add_missing_columns(connection: Connection):
+    """
+    Add columns and indexes that were introduced after a table was created.
+
+    create_all only creates missing tables, so existing databases would
+    otherwise lack newer columns such as the document version or the chunk
+    offsets. A NOT NULL column is added with its server default, which
+    fills the existing rows; one without a server default cannot be added
+    and is reported instead, as is a unique index that existing rows violate.
+    """
+    inspector = inspect(connection)
+    compiler = connection.dialect.ddl_compiler(connection.dialect, None)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            definition = f"{column.name} {column_type}"
+            if not column.nullable:
+                default = compiler.get_column_default_string(column)
+                if default is None:
+                    logger.error(f"Cannot add NOT NULL column {table.name}.{column.name} without a server default")
+                    continue
+                definition += f" NOT NULL DEFAULT {default}"
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+            logger.info(f"Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            if index.unique and not inspector.has_index(table.name, index.name) and _has_duplicates(connection, index):
+                logger.error(
+                    f"Cannot create unique index {index.name}: {table.name} has duplicate "
+                    f"{', '.join(column.name for column in index.columns)} values, remove them and restart"
+                )
+                continue
+            index.create(connection, checkfirst=True)
+
+def init_db(attempts: int = 3):
+    """
+    Initialize database by creating all tables.
+
+    Several API workers start at once, and one may create a table between
+    another's existence check and its CREATE TABLE. The loser retries,
+    which then finds the table.
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as connection:
+                _add_missing_columns(connection)
+            return
+        except DBAPIError as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning(f"Database initialization raced with another process, retrying: {str(e.orig)}")
+            time.sleep(0.2 * (attempt + 1))
+
+async def close_async_db():
+    """Close the pooled connections of the async engine."""
+    await async_engine.dispose()
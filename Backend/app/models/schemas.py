@@ -1,26 +1,107 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+class WorkflowNode(BaseModel):
+    """Schema for one node of a workflow graph (extra canvas fields are ignored)."""
+    id: str = Field(..., description="Node ID")
+    type: str = Field(..., description="One of userQuery, knowledgeBase, llmEngine or output")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Node data; settings live under data.config")
+
+class WorkflowEdge(BaseModel):
+    """Schema for one edge of a workflow graph."""
+    source: str = Field(..., description="ID of the upstream node")
+    target: str = Field(..., description="ID of the downstream node")
+
+class Workflow(BaseModel):
+    """Schema for the workflow graph built in the frontend."""
+    nodes: List[WorkflowNode] = Field(..., description="Workflow nodes")
+    edges: List[WorkflowEdge] = Field(default_factory=list, description="Connections between nodes")
 
 class QueryRequest(BaseModel):
     """Schema for query request."""
     query: str = Field(..., description="The question to ask about the documents")
+    use_cache: bool = Field(True, description="Allow serving a cached answer to a semantically equivalent question")
+    workflow: Optional[Workflow] = Field(None, description="Workflow graph to run instead of the default pipeline")
     
     class Config:
         json_schema_extra = {
             "example": {
-                "query": "What is the main topic of the document?"
+                "query": "What is the main topic of the document?",
+                "use_cache": True,
+                "workflow": {
+                    "nodes": [
+                        {"id": "1", "type": "userQuery", "data": {"config": {}}},
+                        {"id": "2", "type": "knowledgeBase", "data": {"config": {"uploadedFile": {"file_name": "example.pdf"}, "topK": 5}}},
+                        {"id": "3", "type": "llmEngine", "data": {"config": {"customPrompt": "Context: {context}\nQuestion: {question}", "temperature": 0.2}}},
+                        {"id": "4", "type": "output", "data": {"config": {}}}
+                    ],
+                    "edges": [
+                        {"source": "1", "target": "2"},
+                        {"source": "2", "target": "3"},
+                        {"source": "3", "target": "4"}
+                    ]
+                }
             }
         }
 
 class QueryResponse(BaseModel):
     """Schema for query response."""
     answer: str = Field(..., description="The answer to the query based on document context")
+    outputs: Optional[Dict[str, str]] = Field(None, description="Answer of each Output node, when a workflow was run")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "answer": "The main topic of the document is...",
+                "outputs": None
+            }
+        }
+
+class BatchQueryRequest(BaseModel):
+    """Schema for batch query request."""
+    queries: List[str] = Field(..., description="The questions to ask, answered in this order")
+    use_cache: bool = Field(True, description="Allow serving cached answers to semantically equivalent questions")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "queries": [
+                    "What is the main topic of the document?",
+                    "Who is the intended audience?"
+                ],
+                "use_cache": True
+            }
+        }
+
+class BatchQueryResult(BaseModel):
+    """Schema for the outcome of one question in a batch."""
+    query: str = Field(..., description="The question")
+    status: str = Field(..., description="One of completed, cached or failed")
+    answer: Optional[str] = Field(None, description="The answer, unless the question failed")
+    error: Optional[str] = Field(None, description="Error message if the question failed")
+
+class BatchQueryResponse(BaseModel):
+    """Schema for batch query response."""
+    results: List[BatchQueryResult] = Field(..., description="Outcome of each question, in request order")
+    succeeded: int = Field(..., description="Number of questions answered (including cached answers)")
+    failed: int = Field(..., description="Number of questions that failed")
+    elapsed_seconds: float = Field(..., description="Wall-clock time of the batch")
     
     class Config:
         json_schema_extra = {
             "example": {
-                "answer": "The main topic of the document is..."
+                "results": [
+                    {
+                        "query": "What is the main topic of the document?",
+                        "status": "completed",
+                        "answer": "The main topic of the document is...",
+                        "error": None
+                    }
+                ],
+                "succeeded": 1,
+                "failed": 0,
+                "elapsed_seconds": 1.42
             }
         }
 
@@ -28,12 +109,148 @@ class UploadResponse(BaseModel):
     """Schema for upload response."""
     document_id: int = Field(..., description="The ID of the uploaded document")
     file_name: str = Field(..., description="The name of the uploaded file")
+    job_id: str = Field(..., description="The ID of the background ingestion job")
+    status: str = Field(..., description="Status of the ingestion job")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "document_id": 1,
+                "file_name": "example.pdf",
+                "job_id": "3f2b8c1e-6a0d-4a7e-9d55-1c2f0b9e7a41",
+                "status": "queued"
+            }
+        }
+
+class BulkFileResult(BaseModel):
+    """Schema for the outcome of one file in a bulk upload."""
+    file_name: str = Field(..., description="The name of the file")
+    document_id: Optional[int] = Field(None, description="The ID of the document, if it was stored")
+    status: str = Field(..., description="One of completed, unchanged or failed")
+    version: Optional[int] = Field(None, description="Document version after ingestion")
+    pages: int = Field(0, description="Number of pages extracted")
+    chunks: int = Field(0, description="Number of chunks in the document")
+    error: Optional[str] = Field(None, description="Error message if the file failed")
+
+class BulkUploadResponse(BaseModel):
+    """Schema for bulk upload response."""
+    results: List[BulkFileResult] = Field(..., description="Outcome of each file, in upload order")
+    files: int = Field(..., description="Number of files received")
+    succeeded: int = Field(..., description="Number of files completed or unchanged")
+    failed: int = Field(..., description="Number of files that failed")
+    pages: int = Field(..., description="Total pages extracted")
+    chunks: int = Field(..., description="Total chunks stored")
+    elapsed_seconds: float = Field(..., description="Wall-clock time of the ingestion run")
+    pages_per_second: float = Field(..., description="Aggregate extraction throughput")
+    chunks_per_second: float = Field(..., description="Aggregate ingestion throughput")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": [
+                    {
+                        "file_name": "example.pdf",
+                        "document_id": 1,
+                        "status": "completed",
+                        "version": 1,
+                        "pages": 12,
+                        "chunks": 40,
+                        "error": None
+                    }
+                ],
+                "files": 1,
+                "succeeded": 1,
+                "failed": 0,
+                "pages": 12,
+                "chunks": 40,
+                "elapsed_seconds": 1.8,
+                "pages_per_second": 6.7,
+                "chunks_per_second": 22.2
+            }
+        }
+
+class JobStatusResponse(BaseModel):
+    """Schema for ingestion job status."""
+    job_id: str = Field(..., description="The ID of the ingestion job")
+    document_id: int = Field(..., description="The ID of the document being ingested")
+    file_name: str = Field(..., description="The name of the uploaded file")
+    status: str = Field(..., description="One of queued, running, completed or failed")
+    stage: str = Field(..., description="Current pipeline stage (queued, extracting, embedding, storing, completed)")
+    chunks_stored: int = Field(0, description="Number of chunks embedded and stored so far")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    created_at: Optional[datetime] = Field(None, description="When the job was created")
+    updated_at: Optional[datetime] = Field(None, description="When the job last changed")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "job_id": "3f2b8c1e-6a0d-4a7e-9d55-1c2f0b9e7a41",
+                "document_id": 1,
+                "file_name": "example.pdf",
+                "status": "running",
+                "stage": "embedding",
+                "chunks_stored": 512,
+                "error": None,
+                "created_at": "2024-01-01T12:00:00Z",
+                "updated_at": "2024-01-01T12:00:05Z"
+            }
+        }
+
+class DocumentSummary(BaseModel):
+    """Schema for a document with its stored counts and ingestion timing."""
+    document_id: int = Field(..., description="The ID of the document")
+    file_name: str = Field(..., description="The name of the uploaded file")
+    version: int = Field(0, description="Number of times the document has been ingested")
+    chunk_count: int = Field(0, description="Number of chunks in the current version")
+    token_count: Optional[int] = Field(None, description="Total tokens over all chunks")
+    ingestion_seconds: Optional[float] = Field(None, description="Wall-clock time of the last ingestion")
+    ingested_at: Optional[datetime] = Field(None, description="When the last ingestion finished")
+    created_at: Optional[datetime] = Field(None, description="When the document was first uploaded")
+    updated_at: Optional[datetime] = Field(None, description="When the document last changed")
+
+class DocumentListResponse(BaseModel):
+    """Schema for a page of documents."""
+    documents: List[DocumentSummary] = Field(..., description="Documents in ID order")
+    total: int = Field(..., description="Total number of documents")
+
+class ChunkTokenStats(BaseModel):
+    """Schema for the token counts of a document's chunks."""
+    total: int = Field(0, description="Sum of chunk token counts")
+    min: Optional[int] = Field(None, description="Smallest chunk")
+    max: Optional[int] = Field(None, description="Largest chunk")
+    mean: Optional[float] = Field(None, description="Average chunk size")
+
+class ChunkCharacterStats(BaseModel):
+    """Schema for the character lengths of a document's chunks."""
+    total: int = Field(0, description="Sum of chunk lengths")
+    mean: Optional[float] = Field(None, description="Average chunk length")
+
+class DocumentStatsResponse(DocumentSummary):
+    """Schema for per-document chunk statistics and ingestion timings."""
+    pages: int = Field(0, description="Pages that produced at least one chunk")
+    chunk_tokens: ChunkTokenStats = Field(..., description="Token counts of the chunks")
+    chunk_characters: ChunkCharacterStats = Field(..., description="Character lengths of the chunks")
+    ingestion_stage_seconds: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Time the last ingestion spent in each stage (hash, extract, chunk, embed, store, ...)"
+    )
     
     class Config:
         json_schema_extra = {
             "example": {
                 "document_id": 1,
-                "file_name": "example.pdf"
+                "file_name": "example.pdf",
+                "version": 2,
+                "chunk_count": 40,
+                "token_count": 9120,
+                "ingestion_seconds": 1.84,
+                "ingested_at": "2024-01-01T12:00:05Z",
+                "created_at": "2024-01-01T11:58:00Z",
+                "updated_at": "2024-01-01T12:00:05Z",
+                "pages": 12,
+                "chunk_tokens": {"total": 9120, "min": 31, "max": 250, "mean": 228.0},
+                "chunk_characters": {"total": 36480, "mean": 912.0},
+                "ingestion_stage_seconds": {"hash": 0.002, "extract": 0.21, "chunk": 0.05, "embed": 1.3, "store": 0.2}
             }
         }
 
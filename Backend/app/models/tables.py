@@ -1,14 +1,77 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import JSON, Column, Float, Index, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy.orm import relationship
 from app.models.database import Base
 
 class Document(Base):
     """SQLAlchemy model for storing document metadata."""
     
     __tablename__ = "documents"
+    __table_args__ = (
+        # One document per file name; re-uploads become new versions of it
+        Index("uq_documents_file_name", "file_name", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     file_name = Column(String, nullable=False)
+    # Server defaults let _add_missing_columns add these NOT NULL columns to existing tables
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    file_hash = Column(String(64), nullable=True)
+    chunk_count = Column(Integer, nullable=False, default=0, server_default="0")
+    token_count = Column(Integer, nullable=True)
+    ingestion_seconds = Column(Float, nullable=True)
+    ingestion_stage_seconds = Column(JSON, nullable=True)
+    ingested_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    jobs = relationship("IngestionJob", back_populates="document")
+    chunks = relationship("Chunk", back_populates="document", passive_deletes=True)
+    
+    def __repr__(self):
+        return f"<Document(id={self.id}, file_name='{self.file_name}', version={self.version})>"
+
+class Chunk(Base):
+    """SQLAlchemy model for the chunk manifest of a document (one row per stored chunk)."""
+    
+    __tablename__ = "chunks"
+    __table_args__ = (
+        # Per-document lookups, stats and ordered listing all use this index
+        Index("ix_chunks_document_chunk_num", "document_id", "chunk_num"),
+    )
+    
+    id = Column(String(80), primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    chunk_num = Column(Integer, nullable=False)
+    page = Column(Integer, nullable=True)
+    start_offset = Column(Integer, nullable=True)
+    end_offset = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    # Latest document version containing the chunk; rows of older versions are pending removal.
+    # Rows written before versions existed get 0, which is older than any ingested version.
+    version = Column(Integer, nullable=False, server_default="0")
+    
+    document = relationship("Document", back_populates="chunks")
+    
+    def __repr__(self):
+        return f"<Chunk(id='{self.id}', document_id={self.document_id}, chunk_num={self.chunk_num})>"
+
+class IngestionJob(Base):
+    """SQLAlchemy model tracking background ingestion of an uploaded document."""
+    
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    stage = Column(String(32), nullable=False, default="queued")
+    file_path = Column(String, nullable=True)
+    chunks_stored = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    document = relationship("Document", back_populates="jobs")
     
     def __repr__(self):
-        return f"<Document(id={self.id}, file_name='{self.file_name}')>" 
\ No newline at end of file
+        return f"<IngestionJob(id='{self.id}', document_id={self.document_id}, status='{self.status}', stage='{self.stage}')>"
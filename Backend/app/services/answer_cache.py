@@ -0,0 +1,201 @@
+import fcntl
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+from app.core.config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# File holding the current collection version, next to the ChromaDB data
+VERSION_FILE_NAME = "collection_version"
+
+_version_lock = threading.Lock()
+
+def _version_path() -> Path:
+    return Path(settings.CHROMA_DB_PATH) / VERSION_FILE_NAME
+
+def get_collection_version() -> str:
+    """
+    Get the current version of the document collection.
+
+    The version is a counter in a small file, so every process sharing the
+    ChromaDB directory sees the same value. The file is read on every call:
+    its modification time can stay the same across two quick bumps, so it
+    cannot tell whether a cached value is still current.
+
+    Returns:
+        Opaque version string ("" before the first ingestion)
+    """
+    try:
+        return _version_path().read_text().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_collection_version() -> str:
+    """
+    Mark the collection as changed, invalidating every cached answer.
+
+    The counter is incremented under an exclusive lock on a file next to
+    it and replaced atomically (via rename), so concurrent bumps from
+    several processes each get a new, never reused version.
+
+    Returns:
+        The new version
+    """
+    path = _version_path()
+    with _version_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_name(f"{VERSION_FILE_NAME}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                current = int(path.read_text().strip() or 0)
+            except (FileNotFoundError, ValueError):
+                # No version yet, or a random token written by an older release
+                current = 0
+            version = str(current + 1)
+            tmp = path.with_name(f"{VERSION_FILE_NAME}.{os.getpid()}.tmp")
+            tmp.write_text(version)
+            os.replace(tmp, path)
+    logger.info(f"Collection version bumped to {version}")
+    return version
+
+@dataclass
+class CachedAnswer:
+    """An answer served from the semantic cache."""
+    answer: str
+    query: str
+    similarity: float
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers matched by query-embedding cosine similarity.
+
+    Vectors are kept L2-normalized in a preallocated float32 matrix, so a
+    lookup is a single matrix-vector product. Entries are scoped to the
+    collection version they were generated against and expire after a TTL;
+    when the cache is full the least recently used entry is replaced.
+    """
+
+    def __init__(self, max_entries: int, threshold: float, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._entries: List[Optional[Tuple[str, str, List[Dict[str, Any]]]]] = [None] * max_entries
+        self._version = ""
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, version: str):
+        """Drop every entry when the collection version changed. Caller holds the lock."""
+        if version != self._version:
+            if self._valid.any():
+                logger.info("Collection changed, clearing semantic answer cache")
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+            self._version = version
+
+    def lookup(self, embedding: List[float], version: Optional[str] = None) -> Optional[CachedAnswer]:
+        """
+        Find a cached answer for a semantically equivalent query.
+
+        Args:
+            embedding: Query embedding
+            version: Collection version (defaults to the current one)
+
+        Returns:
+            The best cached answer above the similarity threshold, or None
+        """
+        version = get_collection_version() if version is None else version
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            self._sync_version(version)
+            self._valid &= self._expires > now
+            if self._vectors is None or not self._valid.any() or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[~self._valid] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            answer, original_query, sources = self._entries[best]
+            return CachedAnswer(answer=answer, query=original_query, similarity=similarity, sources=sources)
+
+    def store(
+        self,
+        embedding: List[float],
+        query: str,
+        answer: str,
+        version: str,
+        sources: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        Cache an answer.
+
+        Args:
+            embedding: Query embedding
+            query: Original query text
+            answer: Generated answer
+            version: Collection version the answer was generated against
+            sources: Metadata of the chunks the answer was based on
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            if version != get_collection_version():
+                # Documents arrived while this answer was being generated
+                return
+            self._sync_version(version)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+
+            free = np.flatnonzero(~self._valid | (self._expires <= now))
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._entries[slot] = (answer, query, sources or [])
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": int(self._valid.sum())}
+
+# Process-wide answer cache
+answer_cache = SemanticAnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,414 @@
+import queue
+import threading
+import time
+import zipfile
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.resources import resources
+from app.models.database import SessionLocal, bulk_insert
+from app.models.tables import Chunk, Document
+from app.services.answer_cache import bump_collection_version
+from app.services.document_service import (
+    ChunkRecord,
+    chunk_metadata,
+    chunk_pages,
+    file_sha256,
+    iter_chunk_records,
+    manifest_row,
+    process_document,
+    store_window
+)
+from app.services.ingestion_queue import (
+    UploadTooLargeError,
+    ingestion_queue,
+    remove_spooled_file,
+    spool_upload
+)
+from app.services.pdf_extraction import iter_pdf_pages, pdf_page_count
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Records handed from the extraction thread to the embedding loop per queue item
+RECORDS_PER_ITEM = 64
+
+@dataclass
+class BulkItem:
+    """One file of a bulk upload and the outcome of ingesting it."""
+    file_name: str
+    file_path: Optional[str] = None
+    document_id: Optional[int] = None
+    status: str = "pending"
+    version: Optional[int] = None
+    pages: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    file_hash: Optional[str] = None
+    started: float = 0.0
+    tokens: int = 0
+    stored_ids: List[str] = field(default_factory=list)
+
+    def fail(self, error: str):
+        self.status = "failed"
+        self.error = error
+
+    def fail_with(self, error: Exception):
+        """Fail with an error naming the uploaded file, never its path in the spool directory."""
+        message = str(error)
+        if self.file_path:
+            for spooled in (os.path.abspath(self.file_path), self.file_path, os.path.basename(self.file_path)):
+                message = message.replace(spooled, self.file_name)
+        self.fail(f"Failed to process {self.file_name}: {type(error).__name__}: {message}")
+
+@dataclass
+class BulkResult:
+    """Per-file outcomes and aggregate throughput of a bulk ingestion run."""
+    items: List[BulkItem]
+    pages: int
+    chunks: int
+    elapsed_seconds: float
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+def expand_archive(archive_path: str, max_files: int) -> List[BulkItem]:
+    """
+    Spool every PDF in a zip archive to the spool directory.
+
+    Members are copied in blocks with the per-file size limit enforced on
+    the decompressed bytes, and only their base names are used, so archive
+    paths can never escape the spool directory.
+
+    Args:
+        archive_path: Path of the spooled zip archive
+        max_files: Maximum number of PDFs to accept
+
+    Returns:
+        A BulkItem for each PDF member (failed items for oversized ones)
+
+    Raises:
+        ValueError: If the archive is invalid or holds too many PDFs
+    """
+    items = []
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".pdf")
+                and not PurePosixPath(info.filename).name.startswith(".")
+            ]
+            if len(members) > max_files:
+                raise ValueError(f"Archive holds {len(members)} PDFs, the limit is {max_files}")
+            for info in members:
+                item = BulkItem(file_name=PurePosixPath(info.filename).name)
+                try:
+                    with archive.open(info) as source:
+                        item.file_path = spool_upload(source, item.file_name)
+                except UploadTooLargeError as e:
+                    item.fail(str(e))
+                items.append(item)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid zip archive: {str(e)}")
+    except BaseException:
+        for item in items:
+            remove_spooled_file(item.file_path)
+        raise
+    return items
+
+def _extract(items: List[BulkItem], out: "queue.Queue", stop: threading.Event):
+    """
+    Extraction stage: stream chunk records of each document into a bounded queue.
+
+    Runs in its own thread, so document N+1 is extracted and chunked while
+    the records of document N are still being embedded.
+    """
+    def put(message) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in items:
+            if stop.is_set():
+                return
+            item.started = time.perf_counter()
+            try:
+                item.file_hash = file_sha256(item.file_path)
+
+                def pages():
+                    for page in iter_pdf_pages(item.file_path):
+                        item.pages += 1
+                        yield page
+
+                batch: List[ChunkRecord] = []
+                for record in iter_chunk_records(chunk_pages(pages()), item.document_id):
+                    batch.append(record)
+                    if len(batch) >= RECORDS_PER_ITEM:
+                        if not put(("records", item, batch)):
+                            return
+                        batch = []
+                if batch and not put(("records", item, batch)):
+                    return
+                if not put(("done", item, None)):
+                    return
+            except Exception as e:
+                if not put(("error", item, e)):
+                    return
+    finally:
+        put(None)
+
+def ingest_bulk(items: List[BulkItem], db_session: Session) -> BulkResult:
+    """
+    Ingest many spooled PDFs as one pipelined run.
+
+    New documents flow through a single pipeline: one thread extracts and
+    chunks documents in order while the calling thread embeds and stores
+    windows of INGESTION_WINDOW_CHUNKS chunks. Windows are filled across
+    document boundaries, so many small documents still produce full
+    embedding batches and few vector store writes. Document rows are
+    written with bulk inserts, and the collection version is bumped once.
+    Each window's chunk manifest rows are bulk-inserted and committed as
+    soon as it is stored, at version 1 while the document is still at
+    version 0, so they stay invisible until the document row is updated
+    and memory does not grow with the size of the upload.
+
+    Files whose name matches an existing document are re-ingested
+    incrementally with process_document after the pipeline finishes.
+
+    A file that cannot be extracted is reported as failed without affecting
+    the others. If embedding or storing fails, the whole run is rolled back.
+
+    Args:
+        items: Spooled files to ingest (items already marked failed are skipped)
+        db_session: Database session
+
+    Returns:
+        BulkResult with the outcome of every file and aggregate throughput
+    """
+    started = time.perf_counter()
+    store = resources.ensure().vector_store
+    pending = [item for item in items if item.status != "failed"]
+
+    # Duplicate names within one upload would race for the same document
+    names = set()
+    for item in pending:
+        if item.file_name in names:
+            item.fail("Duplicate file name in this upload")
+        names.add(item.file_name)
+    pending = [item for item in pending if item.status != "failed"]
+
+    # Resolve documents: latest row per file name, one bulk insert for the rest. File
+    # names are unique, so if another upload creates one of the new names first, resolve again
+    for attempt in range(3):
+        existing: Dict[str, Document] = {}
+        if names:
+            for document in (
+                db_session.query(Document)
+                .filter(Document.file_name.in_(names))
+                .order_by(Document.id)
+            ):
+                existing[document.file_name] = document
+        new_items = [item for item in pending if item.file_name not in existing]
+        update_items = [item for item in pending if item.file_name in existing]
+        if not new_items:
+            break
+        try:
+            rows = db_session.execute(
+                insert(Document).returning(Document.id, Document.file_name),
+                [{"file_name": item.file_name, "version": 0, "chunk_count": 0} for item in new_items]
+            ).all()
+        except IntegrityError:
+            db_session.rollback()
+            if attempt == 2:
+                raise
+            continue
+        ids = {file_name: document_id for document_id, file_name in rows}
+        for item in new_items:
+            item.document_id = ids[item.file_name]
+        db_session.commit()
+        break
+    for item in update_items:
+        item.document_id = existing[item.file_name].id
+
+    logger.info(
+        f"Bulk ingesting {len(new_items)} new and {len(update_items)} existing documents "
+        f"in windows of {settings.INGESTION_WINDOW_CHUNKS} chunks"
+    )
+
+    with ExitStack() as locks:
+        for item in new_items:
+            locks.enter_context(ingestion_queue.document_lock(item.document_id))
+
+        stop = threading.Event()
+        messages: "queue.Queue" = queue.Queue(
+            maxsize=max(2, 2 * settings.INGESTION_WINDOW_CHUNKS // RECORDS_PER_ITEM)
+        )
+        extractor = threading.Thread(
+            target=_extract, args=(new_items, messages, stop), name="bulk-extract", daemon=True
+        )
+        window: List[Tuple[BulkItem, ChunkRecord]] = []
+
+        def flush(part: List[Tuple[BulkItem, ChunkRecord]]):
+            # Records of documents that failed extraction meanwhile are dropped
+            part = [(item, record) for item, record in part if item.status != "failed"]
+            if not part:
+                return
+            ids = store_window(
+                store,
+                [record for _, record in part],
+                [chunk_metadata(record, item.file_name, item.document_id) for item, record in part]
+            )
+            for (item, _), chunk_id in zip(part, ids):
+                item.stored_ids.append(chunk_id)
+            bulk_insert(db_session, Chunk, [manifest_row(record, item.document_id, 1) for item, record in part])
+            db_session.commit()
+
+        try:
+            extractor.start()
+            while True:
+                message = messages.get()
+                if message is None:
+                    break
+                kind, item, payload = message
+                if kind == "records":
+                    for record in payload:
+                        item.chunks += 1
+                        item.tokens += record.tokens
+                        window.append((item, record))
+                    while len(window) >= settings.INGESTION_WINDOW_CHUNKS:
+                        flush(window[:settings.INGESTION_WINDOW_CHUNKS])
+                        window = window[settings.INGESTION_WINDOW_CHUNKS:]
+                elif kind == "done":
+                    if item.chunks:
+                        item.status = "completed"
+                    else:
+                        item.fail("No text could be extracted from the PDF")
+                else:
+                    logger.error(f"Failed to extract {item.file_name}: {str(payload)}")
+                    item.fail_with(payload)
+            flush(window)
+
+            # Step 4: Publish the documents; their manifest rows were written window by window
+            completed = [item for item in new_items if item.status == "completed"]
+            failed = [item for item in new_items if item.status == "failed"]
+            orphaned = [chunk_id for item in failed for chunk_id in item.stored_ids]
+            if orphaned:
+                store.delete(orphaned)
+            if completed:
+                # Documents share the pipeline, so only their wall-clock time is recorded
+                finished = time.perf_counter()
+                ingested_at = datetime.now(timezone.utc)
+                db_session.execute(update(Document), [
+                    {
+                        "id": item.document_id,
+                        "version": 1,
+                        "file_hash": item.file_hash,
+                        "chunk_count": item.chunks,
+                        "token_count": item.tokens,
+                        "ingestion_seconds": finished - item.started,
+                        "ingested_at": ingested_at
+                    }
+                    for item in completed
+                ])
+            if failed:
+                failed_ids = [item.document_id for item in failed]
+                db_session.query(Chunk).filter(Chunk.document_id.in_(failed_ids)).delete(synchronize_session=False)
+                db_session.query(Document).filter(Document.id.in_(failed_ids)).delete(synchronize_session=False)
+            db_session.commit()
+        except BaseException:
+            stop.set()
+            db_session.rollback()
+            added = [chunk_id for item in new_items for chunk_id in item.stored_ids]
+            try:
+                if added:
+                    store.delete(added)
+                new_ids = [item.document_id for item in new_items]
+                db_session.query(Chunk).filter(Chunk.document_id.in_(new_ids)).delete(synchronize_session=False)
+                db_session.query(Document).filter(Document.id.in_(new_ids)).delete(synchronize_session=False)
+                db_session.commit()
+            except Exception as cleanup_error:
+                logger.error(f"Failed to clean up bulk ingestion: {str(cleanup_error)}")
+            raise
+        finally:
+            stop.set()
+            extractor.join()
+
+    for item in new_items:
+        if item.status == "completed":
+            item.version = 1
+        else:
+            item.document_id = None
+    if any(item.status == "completed" for item in new_items):
+        bump_collection_version()
+
+    # Existing documents get the incremental path, one at a time
+    for item in update_items:
+        previous_version = existing[item.file_name].version
+        try:
+            item.pages = pdf_page_count(item.file_path)
+            with ingestion_queue.document_lock(item.document_id):
+                process_document(
+                    file_path=item.file_path,
+                    file_name=item.file_name,
+                    db_session=db_session,
+                    document_id=item.document_id
+                )
+            document = db_session.get(Document, item.document_id)
+            item.version = document.version
+            item.chunks = document.chunk_count
+            item.status = "unchanged" if document.version == previous_version else "completed"
+        except Exception as e:
+            item.fail_with(e)
+
+    elapsed = time.perf_counter() - started
+    result = BulkResult(
+        items=items,
+        pages=sum(item.pages for item in items),
+        chunks=sum(item.chunks for item in items if item.status == "completed"),
+        elapsed_seconds=elapsed
+    )
+    logger.info(
+        f"Bulk ingestion of {len(items)} files finished in {elapsed:.2f}s: "
+        f"{result.pages_per_second:.1f} pages/s, {result.chunks_per_second:.1f} chunks/s"
+    )
+    return result
+
+def run_bulk_ingestion(items: List[BulkItem]) -> BulkResult:
+    """
+    Run ingest_bulk with a database session owned by the calling thread.
+
+    Bulk ingestion is synchronous like the ingestion workers it shares
+    process_document with, so the API runs it on a worker thread; the
+    session is opened and closed on that thread rather than injected
+    into the request.
+
+    Args:
+        items: Spooled files to ingest
+
+    Returns:
+        BulkResult of the run
+    """
+    db = SessionLocal()
+    try:
+        return ingest_bulk(items, db)
+    finally:
+        db.close()
@@ -0,0 +1,170 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+# One or more blank lines between paragraphs
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# A line without its leading and trailing whitespace
+_LINE = re.compile(r"\S(?:[^\n]*\S)?")
+
+# Words (runs of non-whitespace), used to split lines longer than a chunk
+_WORD = re.compile(r"\S+")
+
+# Distinct words of long lines whose token counts are remembered per chunking run
+WORD_COST_CACHE_SIZE = 65536
+
+@dataclass
+class TextChunk:
+    """A chunk of a page with its position: text == page_text[start:end]."""
+    page: int
+    start: int
+    end: int
+    text: str
+    tokens: int
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token, at least 1)."""
+    return (len(text) + 3) // 4 or 1
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    chunk_tokens: int,
+    overlap_tokens: int,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> Iterator[TextChunk]:
+    """
+    Split a stream of page texts into token-sized chunks, lazily.
+
+    Each page is split on its own, so a chunk never spans pages and its
+    (page, start, end) offsets point straight into the page text. Like a
+    recursive splitter, chunks are packed from whole paragraphs, falling
+    back to lines and then words only where a paragraph or line is longer
+    than a chunk; a chunk ends at the last paragraph break in its second
+    half when there is one. Consecutive chunks share up to `overlap_tokens`
+    tokens of trailing pieces.
+
+    Args:
+        pages: (page_number, text) tuples in page order
+        chunk_tokens: Maximum tokens per chunk
+        overlap_tokens: Tokens repeated at the start of the next chunk
+        count_tokens: Token counter (results for words of long lines are cached)
+
+    Yields:
+        TextChunk for each chunk, in document order
+    """
+    if chunk_tokens < 1:
+        raise ValueError("chunk_tokens must be at least 1")
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be between 0 and chunk_tokens - 1")
+
+    count_word = lru_cache(maxsize=WORD_COST_CACHE_SIZE)(count_tokens)
+    for page, text in pages:
+        yield from _chunk_page(page, text, chunk_tokens, overlap_tokens, count_tokens, count_word)
+
+def _units(text: str, chunk_tokens: int, count_tokens: Callable[[str], int],
+           count_word: Callable[[str], int]) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    Offsets and token counts of the pieces a page's chunks are built from.
+
+    Paragraphs that fit in a chunk are kept whole; longer ones are split
+    into lines, and lines longer than a chunk into words.
+    """
+    spans: List[Tuple[int, int]] = []
+    costs: List[int] = []
+    position = 0
+    for boundary in _PARAGRAPH_BREAK.finditer(text):
+        _add_paragraph(text, position, boundary.start(), chunk_tokens, count_tokens, count_word, spans, costs)
+        position = boundary.end()
+    _add_paragraph(text, position, len(text), chunk_tokens, count_tokens, count_word, spans, costs)
+    return spans, costs
+
+def _add_paragraph(text: str, start: int, end: int, chunk_tokens: int, count_tokens: Callable[[str], int],
+                   count_word: Callable[[str], int], spans: List[Tuple[int, int]], costs: List[int]):
+    paragraph = text[start:end]
+    stripped = paragraph.strip()
+    if not stripped:
+        return
+    tokens = count_tokens(stripped)
+    if tokens <= chunk_tokens:
+        start += len(paragraph) - len(paragraph.lstrip())
+        spans.append((start, start + len(stripped)))
+        costs.append(tokens)
+        return
+    for line in _LINE.finditer(text, start, end):
+        tokens = count_tokens(line.group())
+        if tokens <= chunk_tokens:
+            spans.append(line.span())
+            costs.append(tokens)
+        else:
+            _split_line(text, line.start(), line.end(), chunk_tokens, count_word, spans, costs)
+
+def _split_line(text: str, start: int, end: int, chunk_tokens: int, count_word: Callable[[str], int],
+                spans: List[Tuple[int, int]], costs: List[int]):
+    """Split a line longer than a chunk into words, and words longer than a chunk into pieces."""
+    for match in _WORD.finditer(text, start, end):
+        word_start, word_end = match.span()
+        tokens = count_word(match.group())
+        if tokens <= chunk_tokens:
+            spans.append((word_start, word_end))
+            costs.append(tokens)
+            continue
+        width = max(1, (word_end - word_start) * chunk_tokens // tokens)
+        for piece_start in range(word_start, word_end, width):
+            piece_end = min(word_end, piece_start + width)
+            spans.append((piece_start, piece_end))
+            costs.append(min(chunk_tokens, count_word(text[piece_start:piece_end])))
+
+def _chunk_page(
+    page: int,
+    text: str,
+    chunk_tokens: int,
+    overlap_tokens: int,
+    count_tokens: Callable[[str], int],
+    count_word: Callable[[str], int]
+) -> Iterator[TextChunk]:
+    spans, costs = _units(text, chunk_tokens, count_tokens, count_word)
+    prefix = list(accumulate(costs, initial=0))
+    count = len(spans)
+
+    first = 0
+    while first < count:
+        # Take as many pieces as fit, then back off to a natural break
+        end = first + 1
+        while end < count and prefix[end + 1] - prefix[first] <= chunk_tokens:
+            end += 1
+        if end < count:
+            end = _best_break(text, spans, prefix, first, end)
+
+        start_offset, end_offset = spans[first][0], spans[end - 1][1]
+        yield TextChunk(
+            page=page,
+            start=start_offset,
+            end=end_offset,
+            text=text[start_offset:end_offset],
+            tokens=prefix[end] - prefix[first]
+        )
+        if end >= count:
+            break
+
+        # Start the next chunk with trailing pieces worth at most overlap_tokens
+        following = end
+        while following - 1 > first and prefix[end] - prefix[following - 1] <= overlap_tokens:
+            following -= 1
+        first = following
+
+def _best_break(text: str, spans: List[Tuple[int, int]], prefix: List[int], first: int, end: int) -> int:
+    """Last piece index in (first, end] preceded by a paragraph break, else a line break, else end."""
+    floor = prefix[first] + (prefix[end] - prefix[first]) // 2
+    line_break = 0
+    index = end
+    while index > first + 1 and prefix[index] >= floor:
+        newlines = text.count("\n", spans[index - 1][1], spans[index][0])
+        if newlines >= 2:
+            return index
+        if newlines and not line_break:
+            line_break = index
+        index -= 1
+    return line_break or end
@@ -0,0 +1,261 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+import logging
+from app.core.config import settings
+from app.services.embedding_service import estimate_tokens
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Separator between passages in the prompt context
+PASSAGE_SEPARATOR = "\n---\n"
+
+# Neighbouring chunks share at most CHUNK_OVERLAP_TOKENS tokens; the overlap is looked for in the last
+# CHUNK_OVERLAP_TOKENS * OVERLAP_CHARS_PER_TOKEN characters (tokens average ~4, so this is generous).
+# An overlap longer than that is not found and only costs its repetition in the context.
+OVERLAP_CHARS_PER_TOKEN = 16
+
+# Characters of the next chunk used to find where it overlaps the previous one
+OVERLAP_PROBE_CHARS = 32
+
+@dataclass
+class Passage:
+    """A run of consecutive chunks of one file, merged into one piece of text."""
+    file_name: Optional[str]
+    chunk_nums: List[int]
+    text: str
+    distance: Optional[float]
+    tokens: int = 0
+
+@dataclass
+class PackedContext:
+    """Context assembled for a prompt."""
+    text: str
+    passages: List[Passage] = field(default_factory=list)
+    tokens: int = 0
+    dropped_duplicates: int = 0
+
+# Seconds before a failed tokenizer load is retried, doubled after each failure up to the maximum
+TOKENIZER_RETRY_SECONDS = 30.0
+TOKENIZER_RETRY_MAX_SECONDS = 1800.0
+
+_tokenizer_lock = threading.Lock()
+_tokenizer: Any = None
+_tokenizer_retry_at = 0.0
+_tokenizer_retry_delay = TOKENIZER_RETRY_SECONDS
+
+def get_tokenizer():
+    """
+    Load the tokenizer of the chat model.
+
+    Uses tiktoken when it is installed and its encoding can be loaded. The
+    encoding file is read from TIKTOKEN_CACHE_DIR when that holds a copy
+    (so offline deployments can ship one), otherwise it is downloaded.
+    A loaded tokenizer is kept for the life of the process; a failed load
+    is retried after TOKENIZER_RETRY_SECONDS, doubling up to
+    TOKENIZER_RETRY_MAX_SECONDS. Until it loads, and while another thread
+    is loading it, token counts fall back to the ~4 characters per token
+    estimate.
+
+    Returns:
+        A tiktoken Encoding, or None if unavailable
+    """
+    global _tokenizer, _tokenizer_retry_at, _tokenizer_retry_delay
+    if _tokenizer is not None or time.monotonic() < _tokenizer_retry_at:
+        return _tokenizer
+    # Callers never wait for a download: they estimate until it finishes
+    if not _tokenizer_lock.acquire(blocking=False):
+        return _tokenizer
+    try:
+        if _tokenizer is not None or time.monotonic() < _tokenizer_retry_at:
+            return _tokenizer
+        try:
+            import tiktoken
+        except ImportError:
+            logger.warning("tiktoken is not installed; estimating context tokens from text length")
+            _tokenizer_retry_at = float("inf")
+            return None
+        if settings.TIKTOKEN_CACHE_DIR:
+            os.environ["TIKTOKEN_CACHE_DIR"] = settings.TIKTOKEN_CACHE_DIR
+        try:
+            _tokenizer = tiktoken.encoding_for_model(settings.CONTEXT_TOKENIZER_MODEL)
+        except Exception as e:
+            logger.warning(f"Could not load the tokenizer for {settings.CONTEXT_TOKENIZER_MODEL}, "
+                           f"estimating context tokens from text length and retrying in "
+                           f"{_tokenizer_retry_delay:.0f}s: {str(e)}")
+            _tokenizer_retry_at = time.monotonic() + _tokenizer_retry_delay
+            _tokenizer_retry_delay = min(_tokenizer_retry_delay * 2, TOKENIZER_RETRY_MAX_SECONDS)
+        return _tokenizer
+    finally:
+        _tokenizer_lock.release()
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the chat model's tokenizer.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count (estimated if the tokenizer is unavailable)
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text down to at most max_tokens tokens.
+
+    Args:
+        text: Text to cut
+        max_tokens: Token limit
+
+    Returns:
+        The longest prefix of text within the limit
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return text[:max_tokens * 4]
+    return tokenizer.decode(tokenizer.encode(text, disallowed_special=())[:max_tokens])
+
+def merge_overlapping(first: str, second: str) -> str:
+    """
+    Join two consecutive chunks, keeping their shared overlap only once.
+
+    The splitter starts each chunk with the tail of the previous one, so
+    the overlap is the longest suffix of `first` that `second` starts with.
+
+    Args:
+        first: Earlier chunk
+        second: Following chunk
+
+    Returns:
+        The joined text
+    """
+    probe = second[:OVERLAP_PROBE_CHARS]
+    if probe:
+        max_overlap = settings.CHUNK_OVERLAP_TOKENS * OVERLAP_CHARS_PER_TOKEN
+        start = first.find(probe, max(0, len(first) - max_overlap))
+        while start != -1:
+            if second.startswith(first[start:]):
+                return first + second[len(first) - start:]
+            start = first.find(probe, start + 1)
+    return f"{first}\n{second}"
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> List[Passage]:
+    """
+    Merge retrieved chunks that are consecutive in the same file.
+
+    Args:
+        chunks: Retrieved chunks (dicts with text, file_name, chunk_num and distance)
+
+    Returns:
+        Passages, each scored by the best distance among its chunks
+    """
+    by_file: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    loose: List[Passage] = []
+    for chunk in chunks:
+        if chunk.get("chunk_num") is None:
+            loose.append(Passage(chunk.get("file_name"), [], chunk["text"], chunk.get("distance")))
+        else:
+            by_file.setdefault(chunk.get("file_name"), []).append(chunk)
+
+    passages = []
+    for file_name, file_chunks in by_file.items():
+        current: Optional[Passage] = None
+        seen = set()
+        for chunk in sorted(file_chunks, key=lambda item: item["chunk_num"]):
+            chunk_num = chunk["chunk_num"]
+            if chunk_num in seen:
+                continue
+            seen.add(chunk_num)
+            distance = chunk.get("distance")
+            if current is not None and chunk_num == current.chunk_nums[-1] + 1:
+                current.text = merge_overlapping(current.text, chunk["text"])
+                current.chunk_nums.append(chunk_num)
+                if distance is not None and (current.distance is None or distance < current.distance):
+                    current.distance = distance
+                continue
+            current = Passage(file_name, [chunk_num], chunk["text"], distance)
+            passages.append(current)
+    return passages + loose
+
+def assemble_context(
+    chunks: List[Dict[str, Any]],
+    token_budget: Optional[int] = None,
+    duplicate_threshold: Optional[float] = None
+) -> PackedContext:
+    """
+    Assemble prompt context from retrieved chunks within a token budget.
+
+    Consecutive chunks of the same file are merged so their overlap
+    appears once, passages that are near-duplicates of a better-scoring
+    passage (at least `threshold` of their word trigrams already kept)
+    are dropped, and the best-scoring passages are packed until the budget
+    is spent. Passages that do not fit are skipped in favour of smaller
+    ones further down; if not even the best passage fits, it is truncated.
+
+    Args:
+        chunks: Retrieved chunks, best match first
+        token_budget: Maximum context tokens (defaults to CONTEXT_TOKEN_BUDGET)
+        duplicate_threshold: Share of a passage's word trigrams already kept at
+            which it counts as a duplicate (defaults to CONTEXT_DUPLICATE_THRESHOLD)
+
+    Returns:
+        The packed context
+    """
+    budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    threshold = settings.CONTEXT_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+
+    passages = sorted(
+        merge_chunks(chunks),
+        key=lambda passage: float("inf") if passage.distance is None else passage.distance
+    )
+
+    kept: List[Passage] = []
+    kept_shingles: List[Set[str]] = []
+    dropped = 0
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        # Containment rather than Jaccard, so a chunk already inside a merged passage counts too
+        if any(len(shingles & other) / len(shingles) >= threshold for other in kept_shingles):
+            dropped += 1
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    packed: List[Passage] = []
+    used = 0
+    for passage in kept:
+        passage.tokens = count_tokens(passage.text)
+        cost = passage.tokens + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(passage)
+            used += cost
+    if not packed and kept and budget > 0:
+        best = kept[0]
+        best.text = truncate_to_tokens(best.text, budget)
+        best.tokens = count_tokens(best.text)
+        packed.append(best)
+        used = best.tokens
+
+    return PackedContext(
+        text=PASSAGE_SEPARATOR.join(passage.text for passage in packed),
+        passages=packed,
+        tokens=used,
+        dropped_duplicates=dropped
+    )
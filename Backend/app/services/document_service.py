@@ -1,32 +1,30 @@
-import fitz  # PyMuPDF
-import openai
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from fastapi import UploadFile
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any, Callable, Optional, Tuple
 import logging
+import time
 from app.core.config import settings
-from app.models.tables import Document
+from app.core.metrics import ERRORS, StageTimer
+from app.core.resources import resources
+from app.core.vector_store import VectorStore
+from app.models.database import bulk_insert
+from app.models.tables import Chunk, Document
+from app.services.answer_cache import bump_collection_version
+from app.services.chunking import TextChunk, iter_chunks
+from app.services.context_service import count_tokens
+from app.services.embedding_service import embed_query, generate_embeddings
+from app.services.pdf_extraction import iter_pdf_pages
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# ChromaDB collection name
-COLLECTION_NAME = "document_collection"
-
-def get_chroma_client():
-    """Get or create ChromaDB persistent client."""
-    return chromadb.PersistentClient(
-        path=settings.CHROMA_DB_PATH,
-        settings=ChromaSettings(anonymized_telemetry=False)
-    )
-
 def extract_text_from_pdf(file_content: bytes) -> str:
     """
     Extract text from PDF file content using PyMuPDF.
@@ -37,15 +35,13 @@ def extract_text_from_pdf(file_content: bytes) -> str:
     Returns:
         Extracted text from all pages
     """
+    import fitz  # PyMuPDF
     try:
         # Open PDF from bytes
         pdf_document = fitz.open(stream=file_content, filetype="pdf")
         
         # Extract text from all pages
-        full_text = ""
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            full_text += page.get_text()
+        full_text = "".join(page.get_text() for page in pdf_document)
         
         pdf_document.close()
         
@@ -56,7 +52,7 @@ def extract_text_from_pdf(file_content: bytes) -> str:
 
 def chunk_text(text: str) -> List[str]:
     """
-    Split text into chunks using RecursiveCharacterTextSplitter.
+    Split text into token-sized chunks.
     
     Args:
         text: Full text to split
@@ -64,15 +60,29 @@ def chunk_text(text: str) -> List[str]:
     Returns:
         List of text chunks
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    return [chunk.text for chunk in chunk_pages([(1, text)])]
+
+def chunk_pages(pages: Iterable[Tuple[int, str]]) -> Iterator[TextChunk]:
+    """
+    Split a stream of page texts into chunks, keeping each chunk's position.
+    
+    Pages are consumed one at a time and chunks are produced lazily, so the
+    full document text is never held in memory. Chunks hold at most
+    CHUNK_TOKENS tokens (counted with the chat model's tokenizer when it is
+    available) and overlap by CHUNK_OVERLAP_TOKENS.
     
-    chunks = text_splitter.split_text(text)
-    return chunks
+    Args:
+        pages: (page_number, text) tuples in page order
+        
+    Yields:
+        TextChunk with the page number and the chunk's offsets in the page text
+    """
+    return iter_chunks(
+        pages,
+        chunk_tokens=settings.CHUNK_TOKENS,
+        overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+        count_tokens=count_tokens
+    )
 
 def generate_embedding(text: str) -> List[float]:
     """
@@ -85,100 +95,470 @@ def generate_embedding(text: str) -> List[float]:
         Embedding vector
     """
     try:
-        response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return embed_query(text)
     except Exception as e:
         logger.error(f"Error generating embedding: {str(e)}")
         raise
 
+def iter_windows(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Group a stream of items into lists of at most `size` items.
+    
+    Args:
+        items: Items to group
+        size: Maximum window size
+        
+    Yields:
+        Consecutive windows of items
+    """
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def file_sha256(file_path: str) -> str:
+    """
+    Hash a file in fixed-size blocks.
+    
+    Args:
+        file_path: Path of the file
+        
+    Returns:
+        SHA-256 hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@dataclass
+class ChunkRecord:
+    """A chunk with its content-derived ID and position in the document."""
+    id: str
+    content_hash: str
+    chunk_num: int
+    page: int
+    text: str
+    start: int = 0
+    end: int = 0
+    tokens: int = 0
+
+def iter_chunk_records(page_chunks: Iterable[TextChunk], document_id: int) -> Iterator[ChunkRecord]:
+    """
+    Assign content-derived IDs to a stream of chunks.
+    
+    The ID is "<document_id>:<sha256 prefix>:<occurrence>", so an unchanged
+    chunk keeps its ID across re-uploads even when it moves, and repeated
+    identical chunks within a document still get distinct IDs.
+    
+    Args:
+        page_chunks: Chunks in document order
+        document_id: ID of the document the chunks belong to
+        
+    Yields:
+        ChunkRecord for each chunk
+    """
+    occurrences: Dict[str, int] = {}
+    for chunk_num, chunk in enumerate(page_chunks):
+        content_hash = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()
+        occurrence = occurrences.get(content_hash, 0)
+        occurrences[content_hash] = occurrence + 1
+        yield ChunkRecord(
+            id=f"{document_id}:{content_hash[:32]}:{occurrence}",
+            content_hash=content_hash,
+            chunk_num=chunk_num,
+            page=chunk.page,
+            text=chunk.text,
+            start=chunk.start,
+            end=chunk.end,
+            tokens=chunk.tokens
+        )
+
+def chunk_metadata(record: ChunkRecord, file_name: str, document_id: int) -> Dict[str, Any]:
+    """Vector store metadata stored with a chunk."""
+    return {
+        "file_name": file_name,
+        "document_id": document_id,
+        "chunk_num": record.chunk_num,
+        "page": record.page,
+        "start": record.start,
+        "end": record.end,
+        "content_hash": record.content_hash
+    }
+
+def manifest_row(record: ChunkRecord, document_id: int, version: int) -> Dict[str, Any]:
+    """Row of the chunks table describing a chunk of the given document version."""
+    return {
+        "id": record.id,
+        "document_id": document_id,
+        "version": version,
+        "content_hash": record.content_hash,
+        "chunk_num": record.chunk_num,
+        "page": record.page,
+        "start_offset": record.start,
+        "end_offset": record.end,
+        "token_count": record.tokens
+    }
+
+def store_window(
+    store: VectorStore,
+    records: List[ChunkRecord],
+    metadatas: List[Dict[str, Any]],
+    timer: Optional[StageTimer] = None
+) -> List[str]:
+    """
+    Embed one window of new or changed chunks and upsert it into the vector store.
+    
+    Args:
+        store: Vector store
+        records: Chunks to store (may span several documents)
+        metadatas: Vector store metadata for each chunk
+        timer: Optional stage timer charged with the "embed" and "store" time
+        
+    Returns:
+        IDs of the stored chunks
+    """
+    # Generate embeddings in token-bounded, concurrent batches (cached chunks are reused)
+    with timer.stage("embed") if timer else nullcontext():
+        embeddings = generate_embeddings([record.text for record in records])
+    
+    ids = [record.id for record in records]
+    with timer.stage("store") if timer else nullcontext():
+        store.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=[record.text for record in records],
+            metadatas=metadatas
+        )
+    return ids
+
+def record_timings(db_session: Session, document_id: int, seconds: float, stage_seconds: Dict[str, float]):
+    """
+    Store a document's final ingestion timings.
+    
+    Runs after the new version is committed, so the manifest commit and the
+    removal of old chunks are included. A failure is only logged.
+    
+    Args:
+        db_session: Database session
+        document_id: ID of the ingested document
+        seconds: Total ingestion time
+        stage_seconds: Time spent in each ingestion stage
+    """
+    try:
+        db_session.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(
+                ingestion_seconds=seconds,
+                ingestion_stage_seconds={name: round(value, 4) for name, value in stage_seconds.items()}
+            )
+        )
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        logger.error(f"Failed to record ingestion timings of document {document_id}: {str(e)}")
 
+def remove_stale_chunks(db_session: Session, store: VectorStore, document_id: int, version: int) -> int:
+    """
+    Remove chunks that are not part of a document's current version.
+    
+    Stale manifest rows are found in the chunks table by their version
+    stamp. Each batch is deleted from the vector store first and its rows
+    only afterwards, so a failure leaves the rest to be removed next time.
+    
+    Args:
+        db_session: Database session
+        store: Vector store
+        document_id: ID of the document
+        version: Current version of the document
+        
+    Returns:
+        Number of chunks removed
+    """
+    removed = 0
+    while True:
+        ids = [
+            chunk_id for (chunk_id,) in db_session.query(Chunk.id)
+            .filter(Chunk.document_id == document_id, Chunk.version < version)
+            .limit(500)
+        ]
+        if not ids:
+            return removed
+        store.delete(ids)
+        db_session.query(Chunk).filter(Chunk.id.in_(ids)).delete(synchronize_session=False)
+        db_session.commit()
+        removed += len(ids)
 
+def remove_unlisted_chunks(
+    db_session: Session,
+    store: VectorStore,
+    file_name: str,
+    document_id: int,
+    prefix: str = ""
+) -> int:
+    """
+    Remove a file's chunks that have no row in the document's committed manifest.
+    
+    These are chunks of a run that failed before committing, or chunks
+    stored before the manifest existed.
+    
+    Args:
+        db_session: Database session
+        store: Vector store
+        file_name: Name of the file
+        document_id: ID of the document
+        prefix: Only consider chunk IDs starting with this prefix
+        
+    Returns:
+        Number of chunks removed
+    """
+    ids = [chunk_id for chunk_id in store.ids_for_file(file_name) if chunk_id.startswith(prefix)]
+    removed = 0
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        listed = {
+            chunk_id for (chunk_id,) in db_session.query(Chunk.id)
+            .filter(Chunk.document_id == document_id, Chunk.id.in_(part))
+        }
+        unlisted = [chunk_id for chunk_id in part if chunk_id not in listed]
+        if unlisted:
+            store.delete(unlisted)
+            removed += len(unlisted)
+    return removed
 
-def process_document(file: UploadFile, file_name: str, db_session: Session) -> int:
+def process_document(
+    file_path: str,
+    file_name: str,
+    db_session: Session,
+    document_id: Optional[int] = None,
+    on_progress: Optional[Callable[[str, int], None]] = None
+) -> int:
     """
     Process uploaded PDF document through the entire ingestion pipeline.
     
+    Text flows page -> chunk -> embedding batch -> vector store in fixed-size
+    windows of INGESTION_WINDOW_CHUNKS chunks. While one window is being
+    embedded and stored, the next one is extracted, so at most two windows
+    are held in memory regardless of document size. The chunk manifest is
+    looked up and written one window at a time as well.
+    
+    Re-ingestion is incremental: chunk IDs are derived from chunk content,
+    so only chunks that are new or changed since the previous version are
+    embedded and upserted, moved chunks only get their metadata updated, and
+    chunks that disappeared are deleted. Every manifest row of the new
+    version is stamped with it, so the rows left with an older stamp are
+    the chunks to delete once the new version is committed. An upload
+    identical to the stored version is skipped entirely. If ingestion fails
+    before the new version is committed, chunks added by this run are
+    removed again; once it is committed, removing old chunks is best-effort.
+    
     Args:
-        file: Uploaded PDF file
+        file_path: Path of the spooled PDF file
         file_name: Name of the file
         db_session: Database session
+        document_id: ID of an existing Document row to fill in; otherwise
+            the latest document with the same file name is updated, or a
+            new row is created
+        on_progress: Optional callback invoked with the current stage
+            ("extracting", "embedding", "storing") and the number of chunks
+            stored so far
         
     Returns:
         Document ID from database
     """
+    stored = 0
+    committed = False
+    timer = StageTimer()
+    started = time.perf_counter()
+    
+    def report(stage: str):
+        if on_progress:
+            on_progress(stage, stored)
+    
+    # Shared vector store
+    store = resources.ensure().vector_store
+    
     try:
-        # Read file content
-        file_content = file.file.read()
+        # Resolve the document row this upload is a version of
+        if document_id is not None:
+            document = db_session.get(Document, document_id)
+            if document is None:
+                raise ValueError(f"Document {document_id} not found")
+        else:
+            document = (
+                db_session.query(Document)
+                .filter(Document.file_name == file_name)
+                .order_by(Document.id.desc())
+                .first()
+            )
+            if document is None:
+                document = Document(file_name=file_name)
+                db_session.add(document)
+                try:
+                    db_session.flush()
+                except IntegrityError:
+                    # Another upload of the same file name created the document first
+                    db_session.rollback()
+                    document = db_session.query(Document).filter(Document.file_name == file_name).one()
+        document_id = document.id
+        previous_version = document.version or 0
         
-        # Step 1: Extract text from PDF
-        logger.info(f"Extracting text from {file_name}")
-        full_text = extract_text_from_pdf(file_content)
+        with timer.stage("hash"):
+            file_hash = file_sha256(file_path)
+        if previous_version and document.file_hash == file_hash:
+            logger.info(f"{file_name} is unchanged since version {previous_version}, skipping ingestion")
+            db_session.commit()
+            # Finish removing chunks a previous run could not delete
+            try:
+                if remove_stale_chunks(db_session, store, document_id, previous_version):
+                    bump_collection_version()
+            except Exception as e:
+                db_session.rollback()
+                logger.error(f"Failed to remove old chunks of {file_name}: {str(e)}")
+            return document_id
         
-        if not full_text:
-            raise ValueError("No text could be extracted from the PDF")
-        
-        # Step 2: Chunk the text
-        logger.info(f"Chunking text for {file_name}")
-        chunks = chunk_text(full_text)
-        logger.info(f"Created {len(chunks)} chunks")
+        # Steps 1-3: Extract, chunk, embed and store new chunks in windows
+        version = previous_version + 1
+        report("extracting")
+        logger.info(f"Ingesting {file_name} (version {version}) in windows of {settings.INGESTION_WINDOW_CHUNKS} chunks")
+        pages = timer.timed("extract", iter_pdf_pages(file_path))
+        records = iter_chunk_records(timer.timed("chunk", chunk_pages(pages)), document_id)
         
-        # Step 3: Generate embeddings and store in ChromaDB
-        logger.info(f"Generating embeddings for {file_name}")
+        chunk_count = 0
+        token_count = 0
+        moved_count = 0
         
-        # Get ChromaDB client and collection
-        chroma_client = get_chroma_client()
+        def store_changes(fresh: List[ChunkRecord], moved: List[ChunkRecord]):
+            nonlocal stored
+            if fresh:
+                metadatas = [chunk_metadata(record, file_name, document_id) for record in fresh]
+                store_window(store, fresh, metadatas, timer)
+                stored += len(fresh)
+            # Moved chunks keep their embeddings; only their position changes
+            if moved:
+                with timer.stage("store"):
+                    store.update_metadata(
+                        ids=[record.id for record in moved],
+                        metadatas=[chunk_metadata(record, file_name, document_id) for record in moved]
+                    )
         
-        # Get or create collection
-        try:
-            collection = chroma_client.get_collection(name=COLLECTION_NAME)
-        except:
-            collection = chroma_client.create_collection(name=COLLECTION_NAME)
-        
-        # Prepare data for ChromaDB
-        embeddings = []
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for index, chunk in enumerate(chunks):
-            # Generate embedding
-            embedding = generate_embedding(chunk)
-            
-            # Prepare data
-            embeddings.append(embedding)
-            documents.append(chunk)
-            metadatas.append({
-                "file_name": file_name,
-                "chunk_num": index
-            })
-            ids.append(f"{file_name}_{index}")
-        
-        # Store in ChromaDB
-        collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        pending = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-store") as store_executor:
+            for window in iter_windows(records, settings.INGESTION_WINDOW_CHUNKS):
+                chunk_count += len(window)
+                token_count += sum(record.tokens for record in window)
+                
+                # Look up and update this window's manifest rows in the open transaction
+                with timer.stage("manifest"):
+                    known = {
+                        row.id: (row.chunk_num, row.page, row.start_offset, row.end_offset)
+                        for row in db_session.query(
+                            Chunk.id, Chunk.chunk_num, Chunk.page, Chunk.start_offset, Chunk.end_offset
+                        ).filter(Chunk.id.in_([record.id for record in window]))
+                    }
+                    fresh = [record for record in window if record.id not in known]
+                    moved = [
+                        record for record in window
+                        if record.id in known and known[record.id] != (record.chunk_num, record.page, record.start, record.end)
+                    ]
+                    bulk_insert(db_session, Chunk, [manifest_row(record, document_id, version) for record in fresh])
+                    kept = [
+                        {
+                            "id": record.id,
+                            "version": version,
+                            "chunk_num": record.chunk_num,
+                            "page": record.page,
+                            "start_offset": record.start,
+                            "end_offset": record.end,
+                            "token_count": record.tokens
+                        }
+                        for record in window if record.id in known
+                    ]
+                    if kept:
+                        db_session.execute(update(Chunk), kept)
+                moved_count += len(moved)
+                
+                if not fresh and not moved:
+                    continue
+                if pending is not None:
+                    pending.result()
+                report("embedding")
+                pending = store_executor.submit(store_changes, fresh, [
+                    ChunkRecord(
+                        record.id, record.content_hash, record.chunk_num, record.page, "",
+                        record.start, record.end, record.tokens
+                    )
+                    for record in moved
+                ])
+            if pending is not None:
+                pending.result()
         
-        logger.info(f"Stored {len(chunks)} chunks in ChromaDB")
+        if not chunk_count:
+            raise ValueError("No text could be extracted from the PDF")
         
-        # Step 4: Store metadata in PostgreSQL
+        # Step 4: Commit the manifest and document version in PostgreSQL
+        report("storing")
         logger.info(f"Storing metadata in PostgreSQL for {file_name}")
+        with timer.stage("manifest"):
+            # Provisional timings; the final ones are written once every stage has finished
+            document.version = version
+            document.file_hash = file_hash
+            document.chunk_count = chunk_count
+            document.token_count = token_count
+            document.ingestion_seconds = time.perf_counter() - started
+            document.ingestion_stage_seconds = {name: round(seconds, 4) for name, seconds in timer.totals.items()}
+            document.ingested_at = datetime.now(timezone.utc)
+            db_session.commit()
+        committed = True
         
-        document = Document(file_name=file_name)
-        db_session.add(document)
-        db_session.commit()
-        db_session.refresh(document)
+        # The new version is committed: from here on nothing may undo it. Chunks
+        # that could not be dropped keep their stale manifest rows and are
+        # removed by the next upload of the document.
+        removed = 0
+        try:
+            with timer.stage("store"):
+                removed = remove_stale_chunks(db_session, store, document_id, version)
+                if not previous_version:
+                    # Chunks stored before the document had a manifest (or by a failed run)
+                    removed += remove_unlisted_chunks(db_session, store, file_name, document_id)
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Failed to remove old chunks of {file_name}, leaving them for the next upload: {str(e)}")
+        logger.info(
+            f"{file_name}: {stored} new or changed chunks, {moved_count} moved, "
+            f"{removed} removed, {chunk_count - stored - moved_count} unchanged"
+        )
         
-        logger.info(f"Document processed successfully with ID: {document.id}")
+        # New content invalidates cached answers
+        if stored or removed:
+            try:
+                bump_collection_version()
+            except Exception as e:
+                logger.error(f"Failed to invalidate cached answers after ingesting {file_name}: {str(e)}")
         
-        return document.id
+        timer.finish()
+        record_timings(db_session, document_id, time.perf_counter() - started, timer.totals)
+        logger.info(f"Document processed successfully with ID: {document_id} (version {version})")
+        
+        return document_id
         
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
+        ERRORS.labels("ingestion", "document").inc()
+        if committed:
+            raise
         db_session.rollback()
-        raise
\ No newline at end of file
+        if stored:
+            # This document's chunks that are not in the committed manifest were added by this run
+            try:
+                removed = remove_unlisted_chunks(db_session, store, file_name, document_id, prefix=f"{document_id}:")
+                logger.info(f"Removed {removed} partially ingested chunks of {file_name}")
+            except Exception as cleanup_error:
+                logger.error(f"Failed to remove partial chunks of {file_name}: {str(cleanup_error)}")
+        raise
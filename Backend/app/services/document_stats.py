@@ -0,0 +1,94 @@
+from sqlalchemy import distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, Optional
+from app.models.tables import Chunk, Document
+
+def document_summary(document: Document) -> Dict[str, Any]:
+    """Fields of a document row shown in listings."""
+    return {
+        "document_id": document.id,
+        "file_name": document.file_name,
+        "version": document.version or 0,
+        "chunk_count": document.chunk_count or 0,
+        "token_count": document.token_count,
+        "ingestion_seconds": document.ingestion_seconds,
+        "ingested_at": document.ingested_at,
+        "created_at": document.created_at,
+        "updated_at": document.updated_at
+    }
+
+async def list_documents(db_session: AsyncSession, limit: int, offset: int) -> Dict[str, Any]:
+    """
+    Page through documents with their stored counts and timings.
+
+    Only the documents table is read: counts and timings are written to
+    each row at the end of ingestion, so listing never scans chunks.
+
+    Args:
+        db_session: Async database session
+        limit: Maximum number of documents to return
+        offset: Number of documents to skip (in ID order)
+
+    Returns:
+        Dict with the page of documents and the total number of documents
+    """
+    total = await db_session.scalar(select(func.count()).select_from(Document))
+    documents = await db_session.scalars(
+        select(Document).order_by(Document.id).limit(limit).offset(offset)
+    )
+    return {
+        "documents": [document_summary(document) for document in documents],
+        "total": total or 0
+    }
+
+async def get_document_stats(db_session: AsyncSession, document_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Chunk statistics and ingestion timings of one document.
+
+    The chunk aggregates are computed over the document's rows of the
+    chunks table, found through the (document_id, chunk_num) index.
+
+    Args:
+        db_session: Async database session
+        document_id: ID of the document
+
+    Returns:
+        Dict of statistics, or None if the document does not exist
+    """
+    document = await db_session.get(Document, document_id)
+    if document is None:
+        return None
+
+    characters = Chunk.end_offset - Chunk.start_offset
+    row = (await db_session.execute(
+        select(
+            func.count(distinct(Chunk.page)).label("pages"),
+            func.sum(Chunk.token_count).label("tokens"),
+            func.min(Chunk.token_count).label("min_tokens"),
+            func.max(Chunk.token_count).label("max_tokens"),
+            func.avg(Chunk.token_count).label("avg_tokens"),
+            func.sum(characters).label("characters"),
+            func.avg(characters).label("avg_characters")
+        ).where(
+            Chunk.document_id == document_id,
+            # Rows of older versions may still be waiting to be removed
+            Chunk.version == document.version
+        )
+    )).one()
+
+    stats = document_summary(document)
+    stats.update({
+        "pages": row.pages,
+        "chunk_tokens": {
+            "total": int(row.tokens or 0),
+            "min": row.min_tokens,
+            "max": row.max_tokens,
+            "mean": round(float(row.avg_tokens), 1) if row.avg_tokens is not None else None
+        },
+        "chunk_characters": {
+            "total": int(row.characters or 0),
+            "mean": round(float(row.avg_characters), 1) if row.avg_characters is not None else None
+        },
+        "ingestion_stage_seconds": document.ingestion_stage_seconds or {}
+    })
+    return stats
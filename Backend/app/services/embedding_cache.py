@@ -0,0 +1,248 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing so trivially different copies share a key.
+
+    Applies Unicode NFC normalization and collapses runs of whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed cache of embedding vectors.
+
+    Entries are keyed by (model, sha256 of the normalized text). Vectors are
+    stored as packed float32. The first tier is an in-memory LRU bounded by
+    bytes; the second is a SQLite file on disk, also bounded by bytes and
+    evicted least-recently-used first.
+    """
+
+    def __init__(self, path: str, memory_bytes: int, disk_bytes: int):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._db.commit()
+        self._disk_used = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: Tuple[str, str], blob: bytes):
+        """Insert into the memory tier and evict down to the byte budget. Caller holds the lock."""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        if len(blob) > self.memory_bytes:
+            return
+        self._memory[key] = blob
+        self._memory_used += len(blob)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self.evictions += 1
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached vectors for texts.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            A vector for each cached text and None for each miss, in input order
+        """
+        keys = [(model, text_hash(text)) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        disk_lookups: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                blob = self._memory.get(key)
+                if blob is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = _unpack(blob)
+                    self.memory_hits += 1
+                else:
+                    disk_lookups.setdefault(key[1], []).append(i)
+
+            if disk_lookups:
+                hashes = list(disk_lookups)
+                now = time.time()
+                found = {}
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows = self._db.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                        [model, *part]
+                    ).fetchall()
+                    found.update(rows)
+                if found:
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, h) for h in found]
+                    )
+                    self._db.commit()
+
+                for h, indices in disk_lookups.items():
+                    blob = found.get(h)
+                    if blob is None:
+                        self.misses += len(indices)
+                        continue
+                    self._remember((model, h), blob)
+                    vector = _unpack(blob)
+                    for i in indices:
+                        results[i] = vector
+                    self.disk_hits += len(indices)
+
+        misses = results.count(None)
+        CACHE_LOOKUPS.labels("embedding", "hit").inc(len(texts) - misses)
+        CACHE_LOOKUPS.labels("embedding", "miss").inc(misses)
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Store vectors for texts in both tiers.
+
+        Args:
+            model: Embedding model name
+            texts: Texts that were embedded
+            vectors: Their embedding vectors, in the same order
+        """
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            rows[text_hash(text)] = _pack(vector)
+
+        with self._lock:
+            for h, blob in rows.items():
+                self._remember((model, h), blob)
+
+            hashes = list(rows)
+            replaced = 0
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                replaced += self._db.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchone()[0]
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                [(model, h, blob, len(blob), now) for h, blob in rows.items()]
+            )
+            self._disk_used += sum(len(blob) for blob in rows.values()) - replaced
+            self._evict_disk()
+            self._db.commit()
+
+    def _evict_disk(self):
+        """Delete least recently used rows until the disk tier fits its budget. Caller holds the lock."""
+        while self._disk_used > self.disk_bytes:
+            rows = self._db.execute(
+                "SELECT model, text_hash, size FROM embeddings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for model, h, size in rows:
+                if self._disk_used <= self.disk_bytes:
+                    break
+                victims.append((model, h))
+                self._disk_used -= size
+            self._db.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+            self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used
+            }
+
+    def close(self):
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self._db.close()
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Get the process-wide embedding cache, creating it on first use.
+
+    Returns:
+        The shared EmbeddingCache, or None if caching is disabled
+    """
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=settings.EMBEDDING_CACHE_PATH,
+                    memory_bytes=settings.EMBEDDING_CACHE_MEMORY_BYTES,
+                    disk_bytes=settings.EMBEDDING_CACHE_DISK_BYTES
+                )
+                logger.info(f"Embedding cache opened at {settings.EMBEDDING_CACHE_PATH}")
+    return _cache
@@ -0,0 +1,297 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+import logging
+from app.core.config import settings
+from app.core.metrics import record_usage
+from app.core.resources import resources
+from app.core.single_flight import AsyncSingleFlight, SingleFlight
+from app.services.embedding_cache import get_embedding_cache, normalize_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Concurrent requests for the same text share one in-flight embedding call
+query_embedding_flight = SingleFlight("query_embedding")
+async_query_embedding_flight = AsyncSingleFlight("query_embedding")
+ingestion_embedding_flight = SingleFlight("ingestion_embedding")
+
+@dataclass
+class BatchTiming:
+    """Timing information for a single embeddings API call."""
+    batch_index: int
+    size: int
+    tokens: int
+    seconds: float
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheaply estimate the number of tokens in a text.
+
+    Uses the common ~4 characters per token heuristic for English text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count (at least 1)
+    """
+    return max(1, len(text) // 4)
+
+def billed_tokens(response) -> Optional[int]:
+    """Tokens an embeddings response was billed for, if it reports usage."""
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+def make_batches(texts: List[str], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Pack texts into token-bounded batches, preserving their order.
+
+    A text that alone exceeds max_tokens is placed in a batch of its own.
+
+    Args:
+        texts: Texts to pack
+        max_tokens: Maximum estimated tokens per batch
+        max_items: Maximum number of texts per batch
+
+    Returns:
+        List of batches, each a list of indices into texts
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Generate embeddings for a list of texts with a single API call.
+
+    The call goes to the fastest provider serving EMBEDDING_MODEL and is
+    paced and retried by that provider's embedding scheduler.
+
+    Args:
+        texts: Texts to embed
+
+    Returns:
+        Embedding vectors in the same order as texts
+    """
+    response, route = resources.ensure().router.call(
+        "embedding",
+        lambda route: route.client.embeddings.create(model=route.model, input=texts),
+        tokens=sum(estimate_tokens(text) for text in texts),
+        usage=billed_tokens
+    )
+    record_usage(route.model, response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def generate_embeddings(
+    texts: List[str],
+    batch_max_tokens: Optional[int] = None,
+    batch_max_items: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    timings: Optional[List[BatchTiming]] = None
+) -> List[List[float]]:
+    """
+    Generate embeddings for many texts using batched, concurrent API calls.
+
+    Cached vectors are reused; the remaining texts are packed into
+    token-bounded batches and up to `concurrency` batches are in flight at
+    once. Results are returned in input order.
+
+    Args:
+        texts: Texts to embed
+        batch_max_tokens: Token budget per batch (defaults to settings)
+        batch_max_items: Maximum texts per batch (defaults to settings)
+        concurrency: Number of batches in flight (defaults to settings)
+        timings: Optional list that receives a BatchTiming per batch
+
+    Returns:
+        Embedding vectors in the same order as texts
+    """
+    if not texts:
+        return []
+
+    # Serve what we can from the cache and embed each distinct miss once
+    cache = get_embedding_cache()
+    cached = cache.get_many(settings.EMBEDDING_MODEL, texts) if cache else [None] * len(texts)
+    embeddings: List[Optional[List[float]]] = list(cached)
+
+    positions = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            positions.setdefault(texts[i], []).append(i)
+    if not positions:
+        logger.info(f"All {len(texts)} embeddings served from cache")
+        return embeddings
+
+    # Texts another ingestion is already embedding are awaited rather than embedded again
+    owned, shared = ingestion_embedding_flight.claim(
+        [(settings.EMBEDDING_MODEL, text) for text in positions]
+    )
+    missing = [text for _, text in owned]
+    try:
+        missing_vectors = _embed_uncached(missing, batch_max_tokens, batch_max_items, concurrency, timings) \
+            if missing else []
+        if cache and missing:
+            cache.put_many(settings.EMBEDDING_MODEL, missing, missing_vectors)
+    except BaseException as e:
+        ingestion_embedding_flight.fail(owned, e)
+        raise
+    ingestion_embedding_flight.resolve(owned, missing_vectors)
+
+    for text, vector in zip(missing, missing_vectors):
+        for i in positions[text]:
+            embeddings[i] = vector
+    for (_, text), future in shared.items():
+        vector = future.result()
+        for i in positions[text]:
+            embeddings[i] = vector
+
+    if cache:
+        logger.info(f"Embedding cache: {len(texts) - sum(map(len, positions.values()))} hits, "
+                    f"{len(missing)} texts embedded, {len(shared)} shared with in-flight calls")
+
+    return embeddings
+
+def embed_query(text: str) -> List[float]:
+    """
+    Generate the embedding for a single query text, using the cache.
+
+    Concurrent calls for the same text share one cache lookup and API call.
+
+    Args:
+        text: Text to embed
+
+    Returns:
+        Embedding vector
+    """
+    return query_embedding_flight.do(
+        (settings.EMBEDDING_MODEL, normalize_text(text)),
+        lambda: _embed_query(text)
+    )
+
+def _embed_query(text: str) -> List[float]:
+    cache = get_embedding_cache()
+    if cache:
+        vector = cache.get_many(settings.EMBEDDING_MODEL, [text])[0]
+        if vector is not None:
+            return vector
+
+    vector = embed_batch([text])[0]
+    if cache:
+        cache.put_many(settings.EMBEDDING_MODEL, [text], [vector])
+    return vector
+
+async def embed_query_async(text: str) -> List[float]:
+    """
+    Async variant of embed_query using the shared async embeddings client.
+
+    Cache lookups run in a worker thread so disk reads never block the
+    event loop. Concurrent calls for the same text share one in-flight call.
+
+    Args:
+        text: Text to embed
+
+    Returns:
+        Embedding vector
+    """
+    return await async_query_embedding_flight.do(
+        (settings.EMBEDDING_MODEL, normalize_text(text)),
+        lambda: _embed_query_async(text)
+    )
+
+async def _embed_query_async(text: str) -> List[float]:
+    cache = get_embedding_cache()
+    if cache:
+        vector = (await asyncio.to_thread(cache.get_many, settings.EMBEDDING_MODEL, [text]))[0]
+        if vector is not None:
+            return vector
+
+    response, route = await resources.ensure().router.call_async(
+        "embedding",
+        lambda route: route.async_client.embeddings.create(model=route.model, input=[text]),
+        tokens=estimate_tokens(text),
+        usage=billed_tokens
+    )
+    record_usage(route.model, response.usage)
+    vector = response.data[0].embedding
+    if cache:
+        await asyncio.to_thread(cache.put_many, settings.EMBEDDING_MODEL, [text], [vector])
+    return vector
+
+def _embed_uncached(
+    texts: List[str],
+    batch_max_tokens: Optional[int],
+    batch_max_items: Optional[int],
+    concurrency: Optional[int],
+    timings: Optional[List[BatchTiming]]
+) -> List[List[float]]:
+    """Embed texts via the API in concurrent, token-bounded batches."""
+    batches = make_batches(
+        texts,
+        max_tokens=batch_max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS,
+        max_items=batch_max_items or settings.EMBEDDING_BATCH_MAX_ITEMS
+    )
+    workers = max(1, min(concurrency or settings.EMBEDDING_CONCURRENCY, len(batches)))
+    embeddings: List[Optional[List[float]]] = [None] * len(texts)
+
+    def run_batch(batch_index: int) -> BatchTiming:
+        indices = batches[batch_index]
+        batch_texts = [texts[i] for i in indices]
+        started = time.perf_counter()
+        vectors = embed_batch(batch_texts)
+        elapsed = time.perf_counter() - started
+
+        if len(vectors) != len(indices):
+            raise ValueError(
+                f"Embedding batch {batch_index} returned {len(vectors)} vectors for {len(indices)} inputs"
+            )
+        for i, vector in zip(indices, vectors):
+            embeddings[i] = vector
+
+        timing = BatchTiming(
+            batch_index=batch_index,
+            size=len(indices),
+            tokens=sum(estimate_tokens(text) for text in batch_texts),
+            seconds=elapsed
+        )
+        logger.info(
+            f"Embedding batch {batch_index + 1}/{len(batches)}: "
+            f"{timing.size} chunks, ~{timing.tokens} tokens in {elapsed:.3f}s"
+        )
+        return timing
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+            batch_timings = list(executor.map(run_batch, range(len(batches))))
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        logger.error(f"Error generating embeddings: {str(e)}")
+        raise
+
+    logger.info(
+        f"Embedded {len(texts)} chunks in {len(batches)} batches "
+        f"(concurrency={workers}) in {elapsed:.3f}s"
+    )
+
+    if timings is not None:
+        timings.extend(batch_timings)
+
+    return embeddings
@@ -0,0 +1,415 @@
+import fcntl
+import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+import logging
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.database import SessionLocal, engine
+from app.models.tables import Document, IngestionJob
+from app.services.document_service import process_document
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room for another job."""
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE_MB."""
+
+def spool_upload(source: BinaryIO, file_name: str, max_bytes: Optional[int] = None) -> str:
+    """
+    Copy an uploaded file to the spool directory in fixed-size blocks.
+
+    The upload is never held in memory as a whole, and copying stops as
+    soon as it exceeds max_bytes.
+
+    Args:
+        source: File-like object of the upload
+        file_name: Original file name (used for the suffix only)
+        max_bytes: Size limit (defaults to MAX_UPLOAD_SIZE_MB)
+
+    Returns:
+        Path of the spooled file
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than max_bytes
+    """
+    max_bytes = max_bytes or settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    suffix = Path(file_name).suffix or ".pdf"
+    path = Path(settings.UPLOAD_SPOOL_DIR) / f"{uuid.uuid4().hex}{suffix}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    try:
+        with open(path, "wb") as target:
+            while True:
+                block = source.read(1024 * 1024)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLargeError(
+                        f"File size must be less than {max_bytes // (1024 * 1024)}MB"
+                    )
+                target.write(block)
+    except BaseException:
+        remove_spooled_file(str(path))
+        raise
+    return str(path)
+
+def remove_spooled_file(path: Optional[str]):
+    """Delete a spooled upload, ignoring files that are already gone."""
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class IngestionQueue:
+    """
+    Bounded queue of ingestion jobs processed by a fixed pool of worker threads.
+
+    Job state lives in the ingestion_jobs table so it can be polled from any
+    request and survives the worker that processed it. Every process sharing
+    the spool directory accepts uploads, but only the one holding the
+    queue's lock file runs and recovers jobs: it picks up jobs queued by the
+    others every INGESTION_POLL_SECONDS, and another process takes over
+    when it exits.
+    """
+
+    # Lock file in the spool directory held by the process that runs jobs
+    LEADER_LOCK_NAME = "ingestion_queue.lock"
+
+    def __init__(self, workers: int, max_size: int):
+        self.workers = workers
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_size)
+        self._threads: List[threading.Thread] = []
+        self._document_locks: Dict[int, threading.Lock] = {}
+        self._document_locks_guard = threading.Lock()
+        # (stage, chunks_stored) of jobs running in this process
+        self._progress: Dict[str, Tuple[str, int]] = {}
+        # IDs waiting in self._queue, so the poller does not queue them twice
+        self._queued: Set[str] = set()
+        self._queued_guard = threading.Lock()
+        self._leader_file: Optional[TextIO] = None
+        self._poller: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Try to become the process that runs jobs, then keep polling for jobs (or for the lock)."""
+        if self._poller is not None:
+            return
+        self._stopping.clear()
+        self._try_lead()
+        self._poller = threading.Thread(target=self._poll, name="ingest-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Ask workers to finish their current job and exit, then give up running jobs."""
+        self._stopping.set()
+        if self._poller is not None:
+            self._poller.join(timeout=timeout)
+            self._poller = None
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        if self._leader_file is not None:
+            # Jobs still waiting in memory are queued in the table for the next process
+            self._leader_file.close()
+            self._leader_file = None
+        logger.info("Ingestion queue stopped")
+
+    def is_leader(self) -> bool:
+        """Whether this process runs ingestion jobs."""
+        return self._leader_file is not None
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker of this process."""
+        return self._queue.qsize()
+
+    def _try_lead(self) -> bool:
+        """
+        Take the queue's lock file if no other process holds it.
+
+        The lock is released by the operating system when its holder exits,
+        so a crashed process never keeps the others from taking over.
+        """
+        path = Path(settings.UPLOAD_SPOOL_DIR) / self.LEADER_LOCK_NAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._leader_file = lock_file
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._recover()
+        self._fill()
+        logger.info(f"Ingestion queue running jobs in this process with {self.workers} workers")
+        return True
+
+    def _poll(self):
+        while not self._stopping.wait(settings.INGESTION_POLL_SECONDS):
+            try:
+                if self._leader_file is not None:
+                    self._fill()
+                else:
+                    self._try_lead()
+            except Exception as e:
+                logger.warning(f"Ingestion queue poll failed: {str(e)}")
+
+    def _offer(self, job_id: str) -> bool:
+        """Put a job in this process's queue unless it is already waiting there; False if full."""
+        with self._queued_guard:
+            if job_id in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                return False
+            self._queued.add(job_id)
+            return True
+
+    def _fill(self):
+        """Queue the oldest jobs of the table's queue that fit in this process's queue."""
+        free = self._queue.maxsize - self._queue.qsize()
+        if free <= 0:
+            return
+        db = SessionLocal()
+        try:
+            job_ids = [
+                job_id for (job_id,) in db.query(IngestionJob.id)
+                .filter(IngestionJob.status == "queued")
+                .order_by(IngestionJob.created_at)
+                .limit(free + len(self._queued))
+            ]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            if not self._offer(job_id):
+                break
+
+    async def enqueue(self, db_session: AsyncSession, file_path: str, file_name: str) -> IngestionJob:
+        """
+        Queue a spooled upload as an IngestionJob.
+
+        An upload with the same file name as an existing document becomes a
+        new version of that document; otherwise a Document row is created.
+        File names are unique, so when concurrent uploads of a new file race
+        to create its row, the losers use the winner's row. The process
+        running jobs starts it at once; other processes leave it to that
+        process's poller.
+
+        Args:
+            db_session: Async database session
+            file_path: Path of the spooled PDF
+            file_name: Original file name
+
+        Returns:
+            The queued IngestionJob
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        if self._leader_file is not None:
+            full = self._queue.full()
+        else:
+            waiting = await db_session.scalar(
+                select(func.count()).select_from(IngestionJob).where(IngestionJob.status == "queued")
+            )
+            full = waiting >= self._queue.maxsize
+        if full:
+            raise QueueFullError("Ingestion queue is full, try again later")
+
+        find_document = (
+            select(Document.id)
+            .where(Document.file_name == file_name)
+            .order_by(Document.id.desc())
+            .limit(1)
+        )
+        document_id = await db_session.scalar(find_document)
+        if document_id is None:
+            document = Document(file_name=file_name, version=0, chunk_count=0)
+            db_session.add(document)
+            try:
+                await db_session.flush()
+                document_id = document.id
+            except IntegrityError:
+                # Another upload of the same file name created the document first
+                await db_session.rollback()
+                document_id = await db_session.scalar(find_document)
+                if document_id is None:
+                    raise
+
+        job = IngestionJob(
+            id=str(uuid.uuid4()),
+            document_id=document_id,
+            status="queued",
+            stage="queued",
+            file_path=file_path
+        )
+        db_session.add(job)
+        await db_session.commit()
+
+        # A job that does not fit right now stays queued in the table for the poller
+        if self._leader_file is not None:
+            self._offer(job.id)
+
+        logger.info(f"Queued ingestion job {job.id} for {file_name}")
+        return job
+
+    def _recover(self):
+        """
+        Re-queue jobs left running when the previous job-running process stopped.
+
+        Called once this process holds the lock file, so no other process
+        can still be running them.
+        """
+        db = SessionLocal()
+        try:
+            pending = db.query(IngestionJob).filter(IngestionJob.status.in_(["queued", "running"])).all()
+            lost = 0
+            for job in pending:
+                if job.file_path and os.path.exists(job.file_path):
+                    if job.status == "running":
+                        job.status = "queued"
+                        job.stage = "queued"
+                        lost += 1
+                else:
+                    job.status = "failed"
+                    job.error = "Interrupted by a restart and the uploaded file is gone"
+                    lost += 1
+                db.commit()
+            if lost:
+                logger.info(f"Recovered {lost} unfinished ingestion jobs")
+        finally:
+            db.close()
+
+    def progress(self, job_id: str) -> Optional[Tuple[str, int]]:
+        """(stage, chunks_stored) of a job running in this process, or None."""
+        return self._progress.get(job_id)
+
+    def _record_progress(self, job_id: str, stage: str, chunks_stored: int):
+        """
+        Record a running job's progress outside the session that ingests it.
+
+        The ingestion transaction stays open until the new document version
+        is committed, so progress is written with a short-lived session of
+        its own. SQLite allows a single writer, which the ingestion holds,
+        so there progress is only kept in memory until the job finishes.
+        """
+        self._progress[job_id] = (stage, chunks_stored)
+        if engine.dialect.name == "sqlite":
+            return
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id)
+                .values(stage=stage, chunks_stored=chunks_stored)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not record progress of ingestion job {job_id}: {str(e)}")
+        finally:
+            db.close()
+
+    @contextmanager
+    def document_lock(self, document_id: int) -> Iterator[None]:
+        """
+        Lock serializing ingestions of the same document.
+
+        Bulk uploads ingest in the process that received them, so besides a
+        thread lock this holds an exclusive lock on a per-document file in
+        the spool directory, which excludes every process sharing it.
+        """
+        with self._document_locks_guard:
+            thread_lock = self._document_locks.setdefault(document_id, threading.Lock())
+        with thread_lock:
+            path = Path(settings.UPLOAD_SPOOL_DIR) / "locks" / f"document-{document_id}.lock"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                with self._queued_guard:
+                    self._queued.discard(job_id)
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        job = None
+        try:
+            # Claim the job atomically; it may have been run already or have been re-queued twice
+            claimed = db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id, IngestionJob.status == "queued")
+                .values(status="running")
+            ).rowcount
+            db.commit()
+            if not claimed:
+                logger.info(f"Ingestion job {job_id} is no longer queued, skipping it")
+                return
+            job = db.get(IngestionJob, job_id)
+            if job is None:
+                logger.warning(f"Ingestion job {job_id} no longer exists")
+                return
+
+            def on_progress(stage: str, chunks_stored: int):
+                self._record_progress(job_id, stage, chunks_stored)
+
+            with self.document_lock(job.document_id):
+                process_document(
+                    file_path=job.file_path,
+                    file_name=job.document.file_name,
+                    db_session=db,
+                    document_id=job.document_id,
+                    on_progress=on_progress
+                )
+
+            job.status = "completed"
+            job.stage = "completed"
+            job.chunks_stored = self._progress.get(job_id, ("", job.chunks_stored or 0))[1]
+            db.commit()
+            logger.info(f"Ingestion job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+            db.rollback()
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e)
+                db.commit()
+        finally:
+            self._progress.pop(job_id, None)
+            if job is not None and job.status in ("completed", "failed"):
+                remove_spooled_file(job.file_path)
+            db.close()
+
+# Shared queue instance, started and stopped by the application lifespan
+ingestion_queue = IngestionQueue(
+    workers=settings.INGESTION_WORKERS,
+    max_size=settings.INGESTION_QUEUE_SIZE
+)
@@ -0,0 +1,118 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+import logging
+from app.core.config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF.
+
+    Runs inside extraction worker processes, so it only takes picklable
+    arguments and reopens the file itself.
+
+    Args:
+        file_path: Path of the PDF
+        start: First page number (0-based)
+        stop: Page number after the last page
+
+    Returns:
+        Text of each page in the range, in order
+    """
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(start, stop)]
+
+def get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Get the shared extraction process pool, (re)creating it for a new size.
+
+    Workers are started with the "spawn" method so they never inherit the
+    locks of the multi-threaded server process.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+            logger.info(f"Started PDF extraction pool with {workers} processes")
+        return _pool
+
+def shutdown_extraction_pool():
+    """Stop the shared extraction process pool, if it was started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages of a PDF, read without extracting any text."""
+    import fitz  # PyMuPDF, loaded on first use to keep start-up fast
+    with fitz.open(file_path) as pdf_document:
+        return pdf_document.page_count
+
+def iter_pdf_pages(
+    file_path: str,
+    workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Stream the text of a PDF page by page, extracting page ranges in parallel.
+
+    Page ranges are spread over a process pool and yielded in page order.
+    Only a few ranges per worker are in flight at once, so memory stays
+    bounded no matter how long the document is. Small documents, or
+    workers <= 1, are extracted in-process.
+
+    Args:
+        file_path: Path of the PDF
+        workers: Number of extraction processes (defaults to settings)
+        pages_per_task: Pages per task sent to a worker (defaults to settings)
+
+    Yields:
+        (page_number, text) tuples, with 1-based page numbers
+    """
+    workers = workers or settings.PDF_EXTRACTION_WORKERS
+    pages_per_task = pages_per_task or settings.PDF_PAGES_PER_TASK
+
+    import fitz  # PyMuPDF, loaded on first use to keep start-up fast
+    with fitz.open(file_path) as pdf_document:
+        page_count = pdf_document.page_count
+        if workers <= 1 or page_count <= pages_per_task:
+            for page_num in range(page_count):
+                yield page_num + 1, pdf_document[page_num].get_text()
+            return
+
+    pool = get_extraction_pool(workers)
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, stop = ranges.popleft()
+                in_flight.append((start, pool.submit(extract_page_range, file_path, start, stop)))
+            start, future = in_flight.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for _, future in in_flight:
+            future.cancel()
@@ -1,30 +1,46 @@
-import openai
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, List, Dict, Optional
 import logging
 from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS, TIME_TO_FIRST_TOKEN, query_stage, record_usage
+from app.core.resources import resources
+from app.core.single_flight import AsyncSingleFlight, SingleFlight
+from app.core.vector_store import VectorMatch, VectorStore
+from app.services.answer_cache import CachedAnswer, answer_cache, get_collection_version
+from app.services.context_service import assemble_context
+from app.services.embedding_cache import normalize_text
+from app.services.embedding_service import embed_query, embed_query_async, generate_embeddings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+# Dedicated thread pool for blocking vector store searches made from async code
+search_executor = ThreadPoolExecutor(
+    max_workers=settings.CHROMA_QUERY_THREADS,
+    thread_name_prefix="vector-search"
+)
 
-# ChromaDB collection name
-COLLECTION_NAME = "document_collection"
+# Caps how many queries run through the async pipeline at once
+query_semaphore = asyncio.Semaphore(settings.QUERY_CONCURRENCY)
 
-def get_chroma_client():
-    """Get or create ChromaDB persistent client."""
-    return chromadb.PersistentClient(
-        path=settings.CHROMA_DB_PATH,
-        settings=ChromaSettings(anonymized_telemetry=False)
-    )
+# Concurrent identical searches and questions share one in-flight computation
+retrieval_flight = SingleFlight("retrieval")
+answer_flight = SingleFlight("answer")
+async_answer_flight = AsyncSingleFlight("answer")
+
+# Chat completion settings
+CHAT_MODEL = settings.CHAT_MODEL
+SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on the provided context."
+NO_DOCUMENTS_ANSWER = "I don't have any documents to answer your question. Please upload a PDF document first."
 
 def generate_query_embedding(query: str) -> List[float]:
     """
     Generate embedding for query using OpenAI's text-embedding-3-small model.
+    Repeated queries are served from the shared embedding cache.
     
     Args:
         query: Query text to embed
@@ -33,55 +49,101 @@ def generate_query_embedding(query: str) -> List[float]:
         Embedding vector
     """
     try:
-        response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=query
-        )
-        return response.data[0].embedding
+        return embed_query(query)
     except Exception as e:
         logger.error(f"Error generating query embedding: {str(e)}")
         raise
 
-def retrieve_context(query_embedding: List[float], n_results: int = 3) -> str:
+def retrieve_chunks(
+    query_embedding: List[float],
+    n_results: int = 3,
+    store: Optional[VectorStore] = None,
+    file_names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
     """
-    Retrieve relevant context from ChromaDB based on query embedding.
+    Retrieve the most similar chunks from the vector store with their metadata.
     
     Args:
         query_embedding: Query embedding vector
         n_results: Number of results to retrieve
+        store: Vector store (defaults to the shared one)
+        file_names: Only search chunks of these files (default: all)
         
     Returns:
-        Combined context from retrieved chunks
+        List of dicts with text, file_name, chunk_num and distance, best match first
     """
     try:
-        # Get ChromaDB client and collection
-        chroma_client = get_chroma_client()
-        
-        try:
-            collection = chroma_client.get_collection(name=COLLECTION_NAME)
-        except:
-            # If collection doesn't exist, return empty context
-            logger.warning("Collection not found. No documents have been uploaded yet.")
-            return ""
-        
-        # Perform similarity search
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
+        store = store or resources.ensure().vector_store
         
-        # Extract and combine documents
-        if results and results['documents'] and results['documents'][0]:
-            context_chunks = results['documents'][0]
-            combined_context = "\n---\n".join(context_chunks)
-            return combined_context
+        # Perform similarity search, sharing it with identical searches in flight
+        key = (tuple(query_embedding), n_results, id(store), tuple(file_names) if file_names is not None else None)
+        matches = retrieval_flight.do(key, lambda: store.query([query_embedding], n_results, file_names)[0])
+        if not matches:
+            logger.warning("No matching chunks found. Have any documents been uploaded yet?")
+            return []
         
-        return ""
+        return [match_to_chunk(match) for match in matches]
         
     except Exception as e:
         logger.error(f"Error retrieving context: {str(e)}")
         raise
 
+def match_to_chunk(match: VectorMatch) -> Dict[str, Any]:
+    """Convert a vector store match into the chunk dict used by the pipeline."""
+    return {
+        "text": match.text,
+        "file_name": match.metadata.get("file_name"),
+        "chunk_num": match.metadata.get("chunk_num"),
+        "distance": match.distance
+    }
+
+def retrieve_chunks_batch(
+    query_embeddings: List[List[float]],
+    n_results: int = 3,
+    store: Optional[VectorStore] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Retrieve the most similar chunks for many query embeddings at once.
+    
+    Embeddings are searched in blocks of BATCH_QUERY_SEARCH_BLOCK, one
+    vector store query per block, which bounds the size of the distance
+    matrix the search builds.
+    
+    Args:
+        query_embeddings: Query embedding vectors
+        n_results: Number of results per query
+        store: Vector store (defaults to the shared one)
+        
+    Returns:
+        Chunk dicts for each query, in input order, best match first
+    """
+    store = store or resources.ensure().vector_store
+    block = max(1, settings.BATCH_QUERY_SEARCH_BLOCK)
+    results: List[List[Dict[str, Any]]] = []
+    for start in range(0, len(query_embeddings), block):
+        matches = store.query(query_embeddings[start:start + block], n_results)
+        results.extend([match_to_chunk(match) for match in query_matches] for query_matches in matches)
+    return results
+
+def retrieve_context(
+    query_embedding: List[float],
+    n_results: int = 3,
+    store: Optional[VectorStore] = None
+) -> str:
+    """
+    Retrieve relevant context from the vector store based on query embedding.
+    
+    Args:
+        query_embedding: Query embedding vector
+        n_results: Number of results to retrieve
+        store: Vector store (defaults to the shared one)
+        
+    Returns:
+        Context assembled from the retrieved chunks within the token budget
+    """
+    chunks = retrieve_chunks(query_embedding, n_results, store)
+    return assemble_context(chunks).text
+
 def construct_prompt(context: str, query: str) -> str:
     """
     Construct prompt for LLM using the specified template.
@@ -103,9 +165,35 @@ Question: {query}"""
     
     return prompt
 
+def build_messages(prompt: str) -> List[Dict[str, str]]:
+    """
+    Build the chat messages sent to the LLM for a prompt.
+    
+    Args:
+        prompt: Constructed prompt
+        
+    Returns:
+        System and user messages
+    """
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def chat_budget(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Tokens a chat completion counts against the rate limit: the prompt estimate plus max_tokens."""
+    return sum(len(message["content"]) for message in messages) // 4 + max_tokens
+
 def generate_response(prompt: str) -> str:
     """
-    Generate response using OpenAI's GPT-4o-mini model.
+    Generate response with the chat model (CHAT_MODEL), on the provider
+    the router currently finds fastest.
     
     Args:
         prompt: Constructed prompt
@@ -114,59 +202,538 @@ def generate_response(prompt: str) -> str:
         Generated response
     """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that answers questions based on the provided context."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=500
+        messages = build_messages(prompt)
+        response, route = resources.ensure().router.call(
+            "chat",
+            lambda route: route.client.chat.completions.create(
+                model=route.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500
+            ),
+            tokens=chat_budget(messages, 500)
         )
         
+        record_usage(route.model, response.usage)
         return response.choices[0].message.content
         
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         raise
 
-def answer_query(query: str) -> str:
+def lookup_cached_answer(query_embedding: List[float], version: str, use_cache: bool) -> Optional[CachedAnswer]:
+    """
+    Look up a cached answer to a semantically equivalent question.
+    
+    Args:
+        query_embedding: Query embedding vector
+        version: Collection version observed before retrieval
+        use_cache: Whether the caller allows cached answers
+        
+    Returns:
+        The cached answer, or None on a miss or when caching is bypassed
+    """
+    if not (use_cache and settings.ANSWER_CACHE_ENABLED):
+        return None
+    cached = answer_cache.lookup(query_embedding, version)
+    CACHE_LOOKUPS.labels("answer", "hit" if cached else "miss").inc()
+    if cached:
+        logger.info(f"Answer cache hit (similarity {cached.similarity:.3f}) for: {cached.query}")
+    return cached
+
+def store_answer(
+    query_embedding: List[float],
+    query: str,
+    answer: str,
+    version: str,
+    chunks: List[Dict[str, Any]]
+):
+    """
+    Remember a freshly generated answer in the semantic answer cache.
+    
+    Args:
+        query_embedding: Query embedding vector
+        query: User question
+        answer: Generated answer
+        version: Collection version observed before retrieval
+        chunks: Retrieved chunks the answer is based on
+    """
+    if settings.ANSWER_CACHE_ENABLED:
+        sources = [
+            {key: chunk[key] for key in ("file_name", "chunk_num", "distance")}
+            for chunk in chunks
+        ]
+        answer_cache.store(query_embedding, query, answer, version, sources)
+
+def answer_query(query: str, use_cache: bool = True) -> str:
     """
     Main function to answer user query using RAG pipeline.
     
+    Concurrent calls with the same question (against the same collection
+    version) share one run of the pipeline.
+    
     Args:
         query: User question
+        use_cache: Allow serving a cached answer to an equivalent question
         
     Returns:
         Generated answer
     """
+    key = (normalize_text(query), use_cache, get_collection_version())
+    return answer_flight.do(key, lambda: _answer_query(query, use_cache))
+
+def _answer_query(query: str, use_cache: bool) -> str:
     try:
         # Step 1: Generate query embedding
         logger.info(f"Processing query: {query}")
-        query_embedding = generate_query_embedding(query)
+        with query_stage("embed"):
+            query_embedding = generate_query_embedding(query)
+        
+        # Serve a cached answer generated against the same collection version
+        version = get_collection_version()
+        cached = lookup_cached_answer(query_embedding, version, use_cache)
+        if cached:
+            return cached.answer
         
         # Step 2: Retrieve context
         logger.info("Retrieving relevant context")
-        context = retrieve_context(query_embedding, n_results=3)
+        with query_stage("retrieve"):
+            chunks = retrieve_chunks(query_embedding, n_results=3)
         
-        if not context:
-            return "I don't have any documents to answer your question. Please upload a PDF document first."
+        if not chunks:
+            return NO_DOCUMENTS_ANSWER
         
         # Step 3: Construct prompt
-        prompt = construct_prompt(context, query)
+        with query_stage("prompt_build"):
+            prompt = construct_prompt(assemble_context(chunks).text, query)
         
         # Step 4: Generate response
         logger.info("Generating response")
-        response = generate_response(prompt)
+        with query_stage("generate"):
+            response = generate_response(prompt)
         
+        store_answer(query_embedding, query, response, version, chunks)
         return response
         
     except Exception as e:
         logger.error(f"Error answering query: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def generate_query_embedding_async(query: str) -> List[float]:
+    """
+    Async variant of generate_query_embedding.
+    
+    Args:
+        query: Query text to embed
+        
+    Returns:
+        Embedding vector
+    """
+    try:
+        return await embed_query_async(query)
+    except Exception as e:
+        logger.error(f"Error generating query embedding: {str(e)}")
+        raise
+
+async def retrieve_context_async(
+    query_embedding: List[float],
+    n_results: int = 3,
+    store: Optional[VectorStore] = None
+) -> str:
+    """
+    Async variant of retrieve_context.
+    
+    Vector store searches are synchronous, so the lookup runs in the
+    dedicated search thread pool instead of on the event loop.
+    
+    Args:
+        query_embedding: Query embedding vector
+        n_results: Number of results to retrieve
+        store: Vector store (defaults to the shared one)
+        
+    Returns:
+        Combined context from retrieved chunks
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, retrieve_context, query_embedding, n_results, store
+    )
+
+async def retrieve_chunks_async(
+    query_embedding: List[float],
+    n_results: int = 3,
+    store: Optional[VectorStore] = None,
+    file_names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Async variant of retrieve_chunks, run in the dedicated search thread pool.
+    
+    Args:
+        query_embedding: Query embedding vector
+        n_results: Number of results to retrieve
+        store: Vector store (defaults to the shared one)
+        file_names: Only search chunks of these files (default: all)
+        
+    Returns:
+        List of dicts with text, file_name, chunk_num and distance
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, retrieve_chunks, query_embedding, n_results, store, file_names
+    )
+
+async def generate_response_async(
+    prompt: str,
+    model: str = CHAT_MODEL,
+    temperature: float = 0.7,
+    max_tokens: int = 500
+) -> str:
+    """
+    Async variant of generate_response using the shared async LLM clients.
+    
+    Slow calls are hedged on a second provider when LLM_HEDGE_ENABLED is set.
+    
+    Args:
+        prompt: Constructed prompt
+        model: Chat model to use (CHAT_MODEL lets the router pick any provider's chat model)
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        
+    Returns:
+        Generated response
+    """
+    try:
+        messages = build_messages(prompt)
+        response, route = await resources.ensure().router.call_async(
+            "chat",
+            lambda route: route.async_client.chat.completions.create(
+                model=route.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ),
+            tokens=chat_budget(messages, max_tokens),
+            model=model
+        )
+        
+        record_usage(route.model, response.usage)
+        return response.choices[0].message.content
+        
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        raise
+
+async def answer_query_async(
+    query: str,
+    store: Optional[VectorStore] = None,
+    use_cache: bool = True
+) -> str:
+    """
+    Non-blocking variant of answer_query.
+    
+    At most QUERY_CONCURRENCY queries run through the pipeline at once;
+    further callers wait for a free slot. Concurrent calls with the same
+    question (against the same store and collection version) share one run.
+    
+    Args:
+        query: User question
+        store: Vector store (defaults to the shared one)
+        use_cache: Allow serving a cached answer to an equivalent question
+        
+    Returns:
+        Generated answer
+    """
+    key = (normalize_text(query), use_cache, get_collection_version(), id(store))
+    return await async_answer_flight.do(key, lambda: _answer_query_async(query, store, use_cache))
+
+async def _answer_query_async(query: str, store: Optional[VectorStore], use_cache: bool) -> str:
+    async with query_semaphore:
+        try:
+            # Step 1: Generate query embedding
+            logger.info(f"Processing query: {query}")
+            with query_stage("embed"):
+                query_embedding = await generate_query_embedding_async(query)
+            
+            # Serve a cached answer generated against the same collection version
+            version = get_collection_version()
+            cached = lookup_cached_answer(query_embedding, version, use_cache)
+            if cached:
+                return cached.answer
+            
+            # Step 2: Retrieve context
+            logger.info("Retrieving relevant context")
+            with query_stage("retrieve"):
+                chunks = await retrieve_chunks_async(query_embedding, n_results=3, store=store)
+            
+            if not chunks:
+                return NO_DOCUMENTS_ANSWER
+            
+            # Step 3: Construct prompt
+            with query_stage("prompt_build"):
+                prompt = construct_prompt(assemble_context(chunks).text, query)
+            
+            # Step 4: Generate response
+            logger.info("Generating response")
+            with query_stage("generate"):
+                response = await generate_response_async(prompt)
+            
+            store_answer(query_embedding, query, response, version, chunks)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error answering query: {str(e)}")
+            raise
+
+async def stream_answer(
+    query: str,
+    store: Optional[VectorStore] = None,
+    use_cache: bool = True
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer a query, streaming the generated tokens as they arrive.
+    
+    Yields events as dicts with "event" and "data" keys:
+    - "context": metadata of the retrieved chunks, sent before generation starts
+    - "token": a piece of generated text
+    - "done": timing summary once generation has finished
+    
+    The pipeline runs in a task of its own that hands events over through
+    a queue, so the query slot and the generate stage timer are released
+    as soon as the upstream completion finishes, however slowly the client
+    reads. Closing the generator early (e.g. because the client
+    disconnected) cancels that task, which closes the upstream completion
+    stream so the provider stops generating. Time-to-first-token is
+    recorded in the TIME_TO_FIRST_TOKEN histogram. A cached answer is sent
+    as a single token event.
+    
+    Args:
+        query: User question
+        store: Vector store (defaults to the shared one)
+        use_cache: Allow serving a cached answer to an equivalent question
+        
+    Yields:
+        Server-sent event payloads
+    """
+    # At most max_tokens token events, so the queue stays small without a bound
+    events: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+    
+    async def produce():
+        try:
+            await _stream_events(query, store, use_cache, events.put_nowait)
+        finally:
+            events.put_nowait(None)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        # Re-raise a failure of the pipeline
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except (Exception, asyncio.CancelledError):
+            # Already raised above, or the client went away first
+            pass
+
+async def _stream_events(
+    query: str,
+    store: Optional[VectorStore],
+    use_cache: bool,
+    emit: Callable[[Dict[str, Any]], None]
+):
+    """Run the streaming pipeline of stream_answer, passing its events to emit."""
+    started = time.perf_counter()
+    async with query_semaphore:
+        # Step 1: Generate query embedding
+        logger.info(f"Streaming answer for query: {query}")
+        with query_stage("embed"):
+            query_embedding = await generate_query_embedding_async(query)
+        
+        # Serve a cached answer generated against the same collection version
+        version = get_collection_version()
+        cached = lookup_cached_answer(query_embedding, version, use_cache)
+        if cached:
+            elapsed = time.perf_counter() - started
+            emit({"event": "context", "data": {"sources": cached.sources, "cached": True}})
+            emit({"event": "token", "data": {"text": cached.answer}})
+            emit({"event": "done", "data": {"time_to_first_token": elapsed, "total_time": elapsed}})
+            return
+        
+        # Step 2: Retrieve context and tell the client what was found
+        with query_stage("retrieve"):
+            chunks = await retrieve_chunks_async(query_embedding, n_results=3, store=store)
+        emit({
+            "event": "context",
+            "data": {
+                "sources": [
+                    {key: chunk[key] for key in ("file_name", "chunk_num", "distance")}
+                    for chunk in chunks
+                ],
+                "cached": False
+            }
+        })
+        
+        if not chunks:
+            emit({"event": "token", "data": {"text": NO_DOCUMENTS_ANSWER}})
+            emit({"event": "done", "data": {"time_to_first_token": None, "total_time": time.perf_counter() - started}})
+            return
+        
+        # Step 3: Construct prompt
+        with query_stage("prompt_build"):
+            prompt = construct_prompt(assemble_context(chunks).text, query)
+        
+        # Step 4: Stream the response
+        with query_stage("generate"):
+            messages = build_messages(prompt)
+            # A hedge races the providers to open the stream; the losing stream is closed
+            stream, route = await resources.ensure().router.call_async(
+                "chat",
+                lambda route: route.async_client.chat.completions.create(
+                    model=route.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                tokens=chat_budget(messages, 500),
+                discard=lambda stream: stream.close()
+            )
+            time_to_first_token = None
+            answer_parts = []
+            try:
+                async for event in stream:
+                    # The usage block arrives in a final event without choices
+                    if event.usage is not None:
+                        record_usage(route.model, event.usage)
+                    if not event.choices:
+                        continue
+                    text = event.choices[0].delta.content
+                    if not text:
+                        continue
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - started
+                        TIME_TO_FIRST_TOKEN.observe(time_to_first_token)
+                    answer_parts.append(text)
+                    emit({"event": "token", "data": {"text": text}})
+            finally:
+                # Closing the HTTP response cancels generation upstream
+                await stream.close()
+    
+    # Only complete answers are cached
+    store_answer(query_embedding, query, "".join(answer_parts), version, chunks)
+    
+    emit({
+        "event": "done",
+        "data": {
+            "time_to_first_token": time_to_first_token,
+            "total_time": time.perf_counter() - started
+        }
+    })
+
+@dataclass
+class BatchAnswer:
+    """Outcome of one question in a batch."""
+    query: str
+    status: str = "pending"
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+async def answer_batch_async(
+    queries: List[str],
+    store: Optional[VectorStore] = None,
+    use_cache: bool = True,
+    concurrency: Optional[int] = None
+) -> List[BatchAnswer]:
+    """
+    Answer many questions with shared embedding and retrieval work.
+    
+    All questions are embedded together (cached ones are reused, the rest
+    go out in token-bounded batches), retrieval runs as vectorized vector
+    store queries, and completions are generated with at most `concurrency`
+    in flight. Repeats of a question are answered once. A failing
+    completion only fails its own item.
+    
+    Args:
+        queries: User questions
+        store: Vector store (defaults to the shared one)
+        use_cache: Allow serving cached answers to equivalent questions
+        concurrency: Completions in flight (defaults to BATCH_QUERY_CONCURRENCY)
+        
+    Returns:
+        One BatchAnswer per question, in input order, with status
+        "completed", "cached" or "failed"
+    """
+    results = [BatchAnswer(query=query) for query in queries]
+    pending = []
+    for result in results:
+        if result.query.strip():
+            pending.append(result)
+        else:
+            result.status, result.error = "failed", "Query cannot be empty"
+    if not pending:
+        return results
+    
+    logger.info(f"Processing batch of {len(pending)} queries")
+    loop = asyncio.get_running_loop()
+    
+    # Step 1: Embed every question with as few API calls as possible
+    with query_stage("embed"):
+        embeddings = await asyncio.to_thread(generate_embeddings, [result.query for result in pending])
+    
+    # Serve cached answers generated against the same collection version
+    version = get_collection_version()
+    to_answer = []
+    # Repeats of a question in the batch share one answer
+    repeats: Dict[str, List[BatchAnswer]] = {}
+    for result, embedding in zip(pending, embeddings):
+        if result.query in repeats:
+            repeats[result.query].append(result)
+            continue
+        repeats[result.query] = []
+        cached = lookup_cached_answer(embedding, version, use_cache)
+        if cached:
+            result.status, result.answer = "cached", cached.answer
+        else:
+            to_answer.append((result, embedding))
+    
+    if to_answer:
+        # Step 2: Retrieve context for all remaining questions together
+        with query_stage("retrieve"):
+            chunk_lists = await loop.run_in_executor(
+                search_executor, retrieve_chunks_batch, [embedding for _, embedding in to_answer], 3, store
+            )
+        
+        # Steps 3-4: Build prompts and generate with bounded concurrency
+        semaphore = asyncio.Semaphore(concurrency or settings.BATCH_QUERY_CONCURRENCY)
+        
+        async def answer_one(result: BatchAnswer, embedding: List[float], chunks: List[Dict[str, Any]]):
+            if not chunks:
+                result.status, result.answer = "completed", NO_DOCUMENTS_ANSWER
+                return
+            try:
+                with query_stage("prompt_build"):
+                    prompt = construct_prompt(assemble_context(chunks).text, result.query)
+                async with semaphore:
+                    with query_stage("generate"):
+                        answer = await generate_response_async(prompt)
+                store_answer(embedding, result.query, answer, version, chunks)
+                result.status, result.answer = "completed", answer
+            except Exception as e:
+                result.status, result.error = "failed", str(e)
+        
+        await asyncio.gather(*(
+            answer_one(result, embedding, chunks)
+            for (result, embedding), chunks in zip(to_answer, chunk_lists)
+        ))
+    
+    for result in pending:
+        for repeat in repeats.get(result.query, []):
+            repeat.status, repeat.answer, repeat.error = result.status, result.answer, result.error
+    return results
@@ -0,0 +1,412 @@
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+from app.core.config import settings
+from app.core.metrics import query_stage
+from app.core.resources import resources
+from app.core.vector_store import VectorStore
+from app.services.context_service import assemble_context
+from app.services.query_service import (
+    CHAT_MODEL,
+    NO_DOCUMENTS_ANSWER,
+    construct_prompt,
+    generate_query_embedding_async,
+    generate_response_async,
+    query_semaphore,
+    retrieve_chunks_async
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Node types the frontend can place on the canvas, in pipeline order
+NODE_TYPES = ("userQuery", "knowledgeBase", "llmEngine", "output")
+
+# Connections that make sense between node types (source type, target type)
+ALLOWED_EDGES = {
+    ("userQuery", "knowledgeBase"),
+    ("userQuery", "llmEngine"),
+    ("knowledgeBase", "llmEngine"),
+    ("llmEngine", "output")
+}
+
+# Bounds for per-node settings
+MAX_TOP_K = 50
+MAX_GENERATION_TOKENS = 4096
+
+class WorkflowError(ValueError):
+    """Raised when a workflow graph cannot be compiled."""
+
+@dataclass(frozen=True)
+class RetrievalStep:
+    """Search the chunks of one knowledge base node's files."""
+    node_id: str
+    file_names: Tuple[str, ...]
+    top_k: int
+    inputs: Tuple[str, ...] = ()
+
+@dataclass(frozen=True)
+class GenerationStep:
+    """Prompt an LLM with the chunks of the knowledge bases feeding it."""
+    node_id: str
+    prompt_template: Optional[str]
+    model: str
+    temperature: float
+    max_tokens: int
+    inputs: Tuple[str, ...] = ()
+
+@dataclass(frozen=True)
+class OutputStep:
+    """Deliver the answer of the LLM node feeding it."""
+    node_id: str
+    inputs: Tuple[str, ...] = ()
+
+Step = Union[RetrievalStep, GenerationStep, OutputStep]
+
+@dataclass(frozen=True)
+class WorkflowPlan:
+    """
+    A validated workflow in execution order.
+
+    Every step lists the node IDs whose results it consumes; steps are in
+    topological order, so each step's inputs come before it.
+    """
+    graph_hash: str
+    steps: Tuple[Step, ...]
+    outputs: Tuple[str, ...]
+
+    @property
+    def needs_embedding(self) -> bool:
+        return any(isinstance(step, RetrievalStep) for step in self.steps)
+
+@dataclass
+class WorkflowResult:
+    """Answers of every output node and the chunks retrieved along the way."""
+    outputs: Dict[str, str]
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def answer(self) -> str:
+        """Answer of the first output node."""
+        return next(iter(self.outputs.values()), "")
+
+def graph_hash(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> str:
+    """
+    Hash the parts of a workflow graph that affect execution.
+
+    Canvas positions, selection state and labels are ignored, so dragging a
+    node around does not invalidate its compiled plan.
+
+    Args:
+        nodes: Workflow nodes as sent by the frontend
+        edges: Workflow edges as sent by the frontend
+
+    Returns:
+        SHA-256 hex digest
+    """
+    canonical = {
+        "nodes": sorted(
+            json.dumps(
+                [node.get("id"), node.get("type"), (node.get("data") or {}).get("config") or {}],
+                sort_keys=True,
+                default=str
+            )
+            for node in nodes
+        ),
+        "edges": sorted({json.dumps([edge.get("source"), edge.get("target")], default=str) for edge in edges})
+    }
+    return hashlib.sha256(json.dumps(canonical).encode("utf-8")).hexdigest()
+
+def _option(config: Dict[str, Any], *keys: str) -> Any:
+    """First value present under any of the keys (camelCase or snake_case)."""
+    for key in keys:
+        value = config.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _number(node_id: str, name: str, value: Any, low: float, high: float, cast=float):
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise WorkflowError(f"Node {node_id}: {name} must be a number, got {value!r}")
+    if not low <= number <= high:
+        raise WorkflowError(f"Node {node_id}: {name} must be between {low} and {high}, got {number}")
+    return number
+
+def _retrieval_step(node_id: str, config: Dict[str, Any], inputs: Tuple[str, ...]) -> RetrievalStep:
+    uploaded = config.get("uploadedFile")
+    files = uploaded if isinstance(uploaded, list) else [uploaded] if uploaded else []
+    file_names = tuple(
+        name for name in (
+            (item.get("file_name") or item.get("name")) if isinstance(item, dict) else item
+            for item in files
+        ) if name
+    )
+    if not file_names:
+        raise WorkflowError(f"Knowledge Base node {node_id} requires an uploaded PDF document")
+    top_k = _option(config, "topK", "top_k")
+    return RetrievalStep(
+        node_id=node_id,
+        file_names=file_names,
+        top_k=3 if top_k is None else _number(node_id, "top_k", top_k, 1, MAX_TOP_K, int),
+        inputs=inputs
+    )
+
+def _generation_step(node_id: str, config: Dict[str, Any], inputs: Tuple[str, ...]) -> GenerationStep:
+    temperature = _option(config, "temperature")
+    max_tokens = _option(config, "maxTokens", "max_tokens")
+    model = str(_option(config, "model") or CHAT_MODEL)
+    # Only models a configured provider serves; anything else would be sent to the default provider as is
+    allowed = resources.ensure().router.chat_models()
+    if model not in allowed:
+        raise WorkflowError(f"Node {node_id}: model must be one of {', '.join(allowed)}, got {model!r}")
+    return GenerationStep(
+        node_id=node_id,
+        prompt_template=_option(config, "customPrompt", "prompt"),
+        model=model,
+        temperature=0.7 if temperature is None else _number(node_id, "temperature", temperature, 0.0, 2.0),
+        max_tokens=500 if max_tokens is None else _number(node_id, "max_tokens", max_tokens, 1, MAX_GENERATION_TOKENS, int),
+        inputs=inputs
+    )
+
+def compile_workflow(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> WorkflowPlan:
+    """
+    Validate a workflow graph and compile it into an execution plan.
+
+    The graph must contain exactly one User Query node and at least one
+    LLM Engine and Output node. Knowledge Base nodes must have a document
+    and be fed by the User Query; every LLM Engine must be reachable from
+    the User Query; every Output must be fed by exactly one LLM Engine.
+    Edges may only point forward along User Query -> Knowledge Base ->
+    LLM Engine -> Output, so a valid graph is always acyclic.
+
+    Args:
+        nodes: Workflow nodes ({id, type, data: {config}})
+        edges: Workflow edges ({source, target})
+
+    Returns:
+        The compiled plan
+
+    Raises:
+        WorkflowError: If the graph is invalid
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for node in nodes:
+        node_id, node_type = node.get("id"), node.get("type")
+        if not node_id:
+            raise WorkflowError("Every workflow node needs an id")
+        if node_id in by_id:
+            raise WorkflowError(f"Duplicate node id {node_id}")
+        if node_type not in NODE_TYPES:
+            raise WorkflowError(f"Node {node_id} has unknown type {node_type!r}")
+        by_id[node_id] = node
+
+    counts = {node_type: 0 for node_type in NODE_TYPES}
+    for node in by_id.values():
+        counts[node["type"]] += 1
+    missing = [node_type for node_type in NODE_TYPES if node_type != "knowledgeBase" and not counts[node_type]]
+    if missing:
+        raise WorkflowError(f"Missing required components: {', '.join(missing)}")
+    if counts["userQuery"] > 1:
+        raise WorkflowError("A workflow can only have one User Query node")
+
+    parents: Dict[str, List[str]] = {node_id: [] for node_id in by_id}
+    for edge in edges:
+        source, target = edge.get("source"), edge.get("target")
+        if source not in by_id or target not in by_id:
+            raise WorkflowError(f"Edge {source} -> {target} references an unknown node")
+        pair = (by_id[source]["type"], by_id[target]["type"])
+        if pair not in ALLOWED_EDGES:
+            raise WorkflowError(f"Cannot connect {pair[0]} node {source} to {pair[1]} node {target}")
+        if source not in parents[target]:
+            parents[target].append(source)
+
+    # Node order follows the canvas order within each type, types in pipeline order
+    ordered = sorted(by_id, key=lambda node_id: NODE_TYPES.index(by_id[node_id]["type"]))
+    steps: List[Step] = []
+    outputs: List[str] = []
+    reachable = set()
+    for node_id in ordered:
+        node_type = by_id[node_id]["type"]
+        config = (by_id[node_id].get("data") or {}).get("config") or {}
+        # The User Query node is the plan's input; edges from it only express reachability
+        inputs = tuple(parent for parent in parents[node_id] if by_id[parent]["type"] != "userQuery")
+        if node_type == "userQuery":
+            reachable.add(node_id)
+            continue
+        if not any(parent in reachable for parent in parents[node_id]):
+            raise WorkflowError(f"Node {node_id} ({node_type}) is not connected to the User Query")
+        reachable.add(node_id)
+
+        if node_type == "knowledgeBase":
+            steps.append(_retrieval_step(node_id, config, inputs))
+        elif node_type == "llmEngine":
+            steps.append(_generation_step(node_id, config, inputs))
+        else:
+            if len(inputs) != 1:
+                raise WorkflowError(f"Output node {node_id} must be connected to exactly one LLM Engine")
+            steps.append(OutputStep(node_id=node_id, inputs=inputs))
+            outputs.append(node_id)
+
+    return WorkflowPlan(graph_hash=graph_hash(nodes, edges), steps=tuple(steps), outputs=tuple(outputs))
+
+class PlanCache:
+    """LRU cache of compiled workflow plans keyed by graph hash."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, WorkflowPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> WorkflowPlan:
+        """
+        Return the cached plan for this graph, compiling and caching it on a miss.
+
+        Raises:
+            WorkflowError: If the graph is invalid (invalid graphs are not cached)
+        """
+        key = graph_hash(nodes, edges)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        plan = compile_workflow(nodes, edges)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan
+
+# Shared plan cache
+plan_cache = PlanCache(settings.WORKFLOW_PLAN_CACHE_SIZE)
+
+def build_workflow_prompt(template: Optional[str], context: str, query: str) -> str:
+    """
+    Build the prompt of an LLM Engine node.
+
+    A custom template gets its {context} and {question} placeholders filled
+    in (other braces are left alone); a template without placeholders is
+    used as instructions in front of the default prompt.
+
+    Args:
+        template: The node's custom prompt, if any
+        context: Retrieved context
+        query: User question
+
+    Returns:
+        Formatted prompt
+    """
+    if not template:
+        return construct_prompt(context, query)
+    if "{context}" in template or "{question}" in template:
+        return template.replace("{context}", context).replace("{question}", query)
+    return f"{template}\n\n{construct_prompt(context, query)}"
+
+async def execute_workflow(
+    plan: WorkflowPlan,
+    query: str,
+    store: Optional[VectorStore] = None
+) -> WorkflowResult:
+    """
+    Run a compiled workflow for one question.
+
+    The query is embedded once and shared by every Knowledge Base node.
+    Each step runs as its own task as soon as its inputs are ready, so
+    independent branches (e.g. several knowledge bases, or several LLM
+    engines) run concurrently. If any step fails the others are cancelled.
+    Answers are not served from the semantic answer cache, since custom
+    prompts and models change what a correct answer looks like.
+
+    Args:
+        plan: Compiled workflow plan
+        query: User question
+        store: Vector store (defaults to the shared one)
+
+    Returns:
+        Answers of the output nodes and the retrieved sources
+    """
+    async with query_semaphore:
+        logger.info(f"Running workflow {plan.graph_hash[:12]} for query: {query}")
+        query_embedding = None
+        if plan.needs_embedding:
+            with query_stage("embed"):
+                query_embedding = await generate_query_embedding_async(query)
+
+        tasks: Dict[str, "asyncio.Task[Any]"] = {}
+
+        async def run(step: Step) -> Any:
+            inputs = [await tasks[node_id] for node_id in step.inputs]
+            if isinstance(step, RetrievalStep):
+                with query_stage("retrieve"):
+                    return await retrieve_chunks_async(
+                        query_embedding, n_results=step.top_k, store=store, file_names=list(step.file_names)
+                    )
+            if isinstance(step, GenerationStep):
+                chunks = sorted(
+                    (chunk for chunk_list in inputs for chunk in chunk_list),
+                    key=lambda chunk: float("inf") if chunk["distance"] is None else chunk["distance"]
+                )
+                if step.inputs and not chunks:
+                    return NO_DOCUMENTS_ANSWER
+                with query_stage("prompt_build"):
+                    prompt = build_workflow_prompt(step.prompt_template, assemble_context(chunks).text, query)
+                with query_stage("generate"):
+                    return await generate_response_async(
+                        prompt, model=step.model, temperature=step.temperature, max_tokens=step.max_tokens
+                    )
+            return inputs[0]
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for step in plan.steps:
+                    tasks[step.node_id] = group.create_task(run(step))
+        except ExceptionGroup as errors:
+            # Surface the first failure itself rather than the group
+            raise errors.exceptions[0]
+
+        sources = [
+            {key: chunk[key] for key in ("file_name", "chunk_num", "distance")}
+            for step in plan.steps if isinstance(step, RetrievalStep)
+            for chunk in tasks[step.node_id].result()
+        ]
+        return WorkflowResult(
+            outputs={node_id: tasks[node_id].result() for node_id in plan.outputs},
+            sources=sources
+        )
+
+async def answer_workflow(
+    query: str,
+    nodes: List[Dict[str, Any]],
+    edges: List[Dict[str, Any]],
+    store: Optional[VectorStore] = None
+) -> WorkflowResult:
+    """
+    Compile (or fetch the cached plan for) a workflow graph and run it.
+
+    Args:
+        query: User question
+        nodes: Workflow nodes as sent by the frontend
+        edges: Workflow edges as sent by the frontend
+        store: Vector store (defaults to the shared one)
+
+    Returns:
+        Answers of the output nodes and the retrieved sources
+
+    Raises:
+        WorkflowError: If the graph is invalid
+    """
+    plan = plan_cache.get_or_compile(nodes, edges)
+    return await execute_workflow(plan, query, store)
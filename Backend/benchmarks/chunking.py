@@ -0,0 +1,84 @@
+"""
+Benchmark text chunking.
+
+Compares the streaming token-based chunker with langchain's
+RecursiveCharacterTextSplitter (the previous implementation, on the joined
+document text and page by page) on large synthetic documents: chunks/sec
+and peak Python memory while chunking.
+
+Usage:
+    python -m benchmarks.chunking --pages 1000 10000 --chunk-tokens 250 --overlap-tokens 50
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, Iterator, Tuple
+
+from benchmarks.synthetic_pdfs import WORDS
+
+def synthetic_pages(pages: int, lines_per_page: int = 45, seed: int = 0) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for pseudo-random pages with a blank line between paragraphs."""
+    rng = random.Random(seed)
+    for page_number in range(1, pages + 1):
+        lines = [f"Section {page_number}"]
+        for line in range(lines_per_page):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+            if line % 9 == 8:
+                lines.append("")
+        yield page_number, "\n".join(lines)
+
+def measure(run: Callable[[], int]) -> Tuple[int, float, float]:
+    """Run a chunking method twice: once timed, once under tracemalloc. Returns (chunks, seconds, peak MB)."""
+    started = time.perf_counter()
+    chunks = run()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, elapsed, peak / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--chunk-tokens", type=int, default=250)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.services.chunking import estimate_tokens, iter_chunks
+    from app.services.context_service import count_tokens, get_tokenizer
+
+    # Same chunk size in characters for the character-based splitter (~4 characters per token)
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_tokens * 4,
+        chunk_overlap=args.overlap_tokens * 4,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+    def methods(pages):
+        yield "langchain-joined", lambda: len(splitter.split_text("".join(text for _, text in pages)))
+        yield "langchain-pages", lambda: sum(len(splitter.split_text(text)) for _, text in pages)
+        yield "stream-estimate", lambda: sum(1 for _ in iter_chunks(
+            pages, args.chunk_tokens, args.overlap_tokens, estimate_tokens
+        ))
+        if get_tokenizer() is not None:
+            yield "stream-tiktoken", lambda: sum(1 for _ in iter_chunks(
+                pages, args.chunk_tokens, args.overlap_tokens, count_tokens
+            ))
+
+    # The page texts are generated up front, so neither time nor memory includes them
+    print(f"{'pages':>6} {'method':>17} {'chunks':>8} {'seconds':>8} {'chunks/s':>10} {'peak MB':>8}")
+    for page_count in args.pages:
+        pages = list(synthetic_pages(page_count))
+        for name, run in methods(pages):
+            chunks, elapsed, peak = measure(run)
+            print(f"{page_count:>6} {name:>17} {chunks:>8} {elapsed:>8.3f} {chunks / elapsed:>10.0f} {peak:>8.2f}")
+
+if __name__ == "__main__":
+    main()
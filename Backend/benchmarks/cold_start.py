@@ -0,0 +1,132 @@
+"""
+Benchmark cold start: import time and time-to-ready.
+
+Each run starts a fresh interpreter, so nothing is cached in-process:
+- import: `import main` in a subprocess, plus which heavy modules
+  (chromadb, openai, fitz, ...) that import pulled in;
+- startup: the API under uvicorn against the local fake OpenAI server,
+  timing from process spawn until /api/v1/health answers (live) and until
+  /api/v1/ready passes (ready). The service's own startup breakdown from
+  /api/v1/ready is reported alongside.
+
+Usage:
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.end_to_end import BACKEND_DIR, free_port
+from benchmarks.fake_openai import start_server
+
+HEAVY_MODULES = ("chromadb", "openai", "httpx", "fitz", "numpy", "tiktoken", "langchain_text_splitters")
+
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+)
+
+def measure_import(env: Dict[str, str]) -> Dict[str, Any]:
+    """Time `import main` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_startup(env: Dict[str, str], log_path: str, timeout: float) -> Dict[str, Any]:
+    """Spawn the API and time how long it takes to become live and ready."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}/api/v1"
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    live = ready = None
+    report: Dict[str, Any] = {}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and ready is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"API exited during startup, see {log_path}")
+            try:
+                if live is None and httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    live = time.perf_counter() - started
+                if live is not None:
+                    response = httpx.get(f"{base_url}/ready", timeout=1)
+                    report = response.json()
+                    if response.status_code == 200:
+                        ready = time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    if ready is None:
+        raise RuntimeError(f"API did not become ready within {timeout}s, see {log_path}")
+    return {"live": live, "ready": ready, "breakdown": report.get("startup_seconds", {})}
+
+def summarize(values: List[float]) -> str:
+    return f"median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra settings for the API")
+    args = parser.parse_args()
+
+    fake = start_server(latency_ms=5, chat_latency_ms=5)
+    workdir = tempfile.mkdtemp(prefix="bench_cold_start_")
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake.server_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "DATABASE_URL": f"sqlite:///{workdir}/rag.sqlite3",
+        "CHROMA_DB_PATH": f"{workdir}/chroma",
+        "NUMPY_INDEX_PATH": f"{workdir}/vector_index",
+        "EMBEDDING_CACHE_PATH": f"{workdir}/embedding_cache/embeddings.sqlite3",
+        "UPLOAD_SPOOL_DIR": f"{workdir}/spool"
+    })
+    env.update(dict(item.split("=", 1) for item in args.env))
+
+    imports, lives, readies = [], [], []
+    breakdowns: Dict[str, List[float]] = {}
+    loaded: List[str] = []
+    for run in range(args.runs):
+        probe = measure_import(env)
+        imports.append(probe["seconds"])
+        loaded = probe["loaded"]
+        result = measure_startup(env, f"{workdir}/api_{run}.log", args.timeout)
+        lives.append(result["live"])
+        readies.append(result["ready"])
+        for step, seconds in result["breakdown"].items():
+            breakdowns.setdefault(step, []).append(seconds)
+
+    print(f"runs: {args.runs}")
+    print(f"import main:    {summarize(imports)}")
+    print(f"  heavy modules loaded by the import: {', '.join(loaded) or 'none'}")
+    print(f"time to live:   {summarize(lives)}")
+    print(f"time to ready:  {summarize(readies)}")
+    print("startup breakdown (median, as reported by /api/v1/ready):")
+    for step, values in breakdowns.items():
+        print(f"  {step:<20} {statistics.median(values):.3f}s")
+    fake.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark batched, concurrent embedding generation.
+
+Runs generate_embeddings over synthetic chunks against the local fake OpenAI
+server for a grid of batch sizes and concurrency levels.
+
+Usage:
+    python -m benchmarks.embedding_batches --chunks 2000 --latency-ms 80
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.fake_openai import start_server
+
+def synthetic_chunks(count: int, size: int = 1000):
+    """Generate distinct chunk-sized texts."""
+    filler = "lorem ipsum dolor sit amet consectetur adipiscing elit "
+    return [f"chunk {i} " + (filler * (size // len(filler) + 1))[:size] for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    parser.add_argument("--batch-tokens", type=int, nargs="+", default=[2000, 8000, 32000, 100000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms, per_item_ms=args.per_item_ms)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # Every run must hit the API, otherwise later grid points only measure the cache
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+    # Import after the environment points at the fake server
+    from app.services.embedding_service import generate_embeddings
+
+    chunks = synthetic_chunks(args.chunks)
+
+    print(f"{'batch_tokens':>12} {'concurrency':>11} {'batches':>7} {'wall_s':>8} "
+          f"{'chunks/s':>9} {'p50_batch_s':>11} {'max_batch_s':>11}")
+    for batch_tokens in args.batch_tokens:
+        for concurrency in args.concurrency:
+            timings = []
+            started = time.perf_counter()
+            generate_embeddings(chunks, batch_max_tokens=batch_tokens,
+                                concurrency=concurrency, timings=timings)
+            wall = time.perf_counter() - started
+            seconds = [t.seconds for t in timings]
+            print(f"{batch_tokens:>12} {concurrency:>11} {len(timings):>7} {wall:>8.3f} "
+                  f"{len(chunks) / wall:>9.1f} {statistics.median(seconds):>11.3f} {max(seconds):>11.3f}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
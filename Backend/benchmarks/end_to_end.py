@@ -0,0 +1,241 @@
+"""
+End-to-end benchmark of the running service against a local fake OpenAI server.
+
+Starts the fake OpenAI server and the API (uvicorn, in a subprocess pointed
+at the fake server through OPENAI_BASE_URL, with throwaway SQLite and vector
+store directories unless --database-url is given), generates synthetic
+PDFs of several sizes, uploads them through /api/v1/upload, waits for the
+ingestion jobs, then fires queries at /api/v1/query with a fixed
+concurrency. Prints a JSON report (pages/sec, chunks/sec, latency
+percentiles, error counts and the run configuration) that can be diffed
+between releases.
+
+Usage:
+    python -m benchmarks.end_to_end --pdf-pages 5 50 200 --queries 200 --concurrency 16 --output report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.fake_openai import start_server
+from benchmarks.synthetic_pdfs import make_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of latencies in seconds, reported in milliseconds."""
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    array = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(array, 50)), 2),
+        "p95_ms": round(float(np.percentile(array, 95)), 2),
+        "p99_ms": round(float(np.percentile(array, 99)), 2),
+        "mean_ms": round(float(array.mean()), 2),
+        "max_ms": round(float(array.max()), 2)
+    }
+
+def start_api(port: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """Start the API with uvicorn and wait until /health answers."""
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited during startup, see {log_path}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/v1/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API did not become healthy, see {log_path}")
+
+async def ingest(client: httpx.AsyncClient, paths: List[str], pages: List[int], poll_seconds: float) -> Dict[str, Any]:
+    """Upload every PDF, wait for all jobs, and measure ingestion throughput."""
+    started = time.perf_counter()
+    jobs = {}
+    upload_latencies = []
+    errors = 0
+    for path, page_count in zip(paths, pages):
+        upload_started = time.perf_counter()
+        with open(path, "rb") as handle:
+            response = await client.post(
+                "/api/v1/upload",
+                files={"file": (os.path.basename(path), handle, "application/pdf")}
+            )
+        upload_latencies.append(time.perf_counter() - upload_started)
+        if response.status_code != 202:
+            errors += 1
+            continue
+        jobs[response.json()["job_id"]] = {"pages": page_count, "submitted": upload_started}
+
+    document_latencies = []
+    chunks = 0
+    pages_done = 0
+    failed = 0
+    pending = set(jobs)
+    while pending:
+        await asyncio.sleep(poll_seconds)
+        for job_id in list(pending):
+            status = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+            if status["status"] in ("completed", "failed"):
+                pending.discard(job_id)
+                document_latencies.append(time.perf_counter() - jobs[job_id]["submitted"])
+                if status["status"] == "completed":
+                    chunks += status["chunks_stored"]
+                    pages_done += jobs[job_id]["pages"]
+                else:
+                    failed += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": len(paths),
+        "pages": pages_done,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages_done / elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 2),
+        "upload_errors": errors,
+        "failed_jobs": failed,
+        "upload_latency": percentiles(upload_latencies),
+        "document_latency": percentiles(document_latencies)
+    }
+
+async def run_queries(client: httpx.AsyncClient, queries: int, concurrency: int, use_cache: bool) -> Dict[str, Any]:
+    """Send `queries` questions with `concurrency` in flight and measure latency."""
+    latencies = []
+    errors = 0
+    counter = iter(range(queries))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/query", json={
+                    "query": f"What does section {index % 97 + 1} say about {['latency', 'storage', 'retrieval', 'caching'][index % 4]}?",
+                    "use_cache": use_cache
+                })
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": queries,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "queries_per_second": round(len(latencies) / elapsed, 2),
+        "errors": errors,
+        "latency": percentiles(latencies)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[5, 50, 200], help="Page count of each synthetic PDF")
+    parser.add_argument("--copies", type=int, default=1, help="PDFs generated per page count")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--use-cache", action="store_true", help="Allow semantic answer cache hits")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Embeddings latency")
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Completion latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra settings for the API")
+    parser.add_argument("--output", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    fake = start_server(latency_ms=args.latency_ms, chat_latency_ms=args.chat_latency_ms,
+                        jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate)
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake.server_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/rag.sqlite3",
+        "CHROMA_DB_PATH": f"{workdir}/chroma",
+        "NUMPY_INDEX_PATH": f"{workdir}/vector_index",
+        "EMBEDDING_CACHE_PATH": f"{workdir}/embedding_cache/embeddings.sqlite3",
+        "UPLOAD_SPOOL_DIR": f"{workdir}/spool"
+    })
+    env.update(dict(item.split("=", 1) for item in args.env))
+
+    paths, pages = [], []
+    for copy in range(args.copies):
+        for page_count in args.pdf_pages:
+            paths.append(make_pdf(f"{workdir}/synthetic_{page_count}_{copy}.pdf", page_count, seed=copy))
+            pages.append(page_count)
+
+    port = free_port()
+    api = start_api(port, env, f"{workdir}/api.log")
+
+    async def run():
+        timeout = httpx.Timeout(300.0)
+        limits = httpx.Limits(max_connections=args.concurrency + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout, limits=limits) as client:
+            ingestion = await ingest(client, paths, pages, poll_seconds=0.1)
+            querying = await run_queries(client, args.queries, args.concurrency, args.use_cache)
+        return ingestion, querying
+
+    try:
+        ingestion, querying = asyncio.run(run())
+    finally:
+        api.terminate()
+        api.wait(timeout=30)
+        fake.shutdown()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {
+            "pdf_pages": args.pdf_pages,
+            "copies": args.copies,
+            "fake_openai": {
+                "latency_ms": args.latency_ms,
+                "chat_latency_ms": args.chat_latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "error_rate": args.error_rate,
+                "rate_limit_rate": args.rate_limit_rate
+            },
+            "env": dict(item.split("=", 1) for item in args.env)
+        },
+        "ingestion": ingestion,
+        "query": querying
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
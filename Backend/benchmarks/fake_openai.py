@@ -0,0 +1,356 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Returns deterministic vectors and text derived from the input so benchmarks
+can run without network access or API spend. Latency, jitter, latency
+spikes and the rate of injected failures (500s and 429s with Retry-After)
+are configurable.
+Requests/min and tokens/min limits can be enforced per endpoint the way
+the real API does: over-limit requests get a 429 with the Retry-After
+needed for the budget to refill.
+
+Usage:
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 50 --chat-latency-ms 400 --error-rate 0.01
+    python -m benchmarks.fake_openai --port 8100 --rpm-limit 600 --tpm-limit 1000000
+    python -m benchmarks.fake_openai --port 8100 --spike-rate 0.05 --spike-ms 3000
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+EMBEDDING_DIMENSIONS = 1536
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic unit-length pseudo-random vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+class LimitBucket:
+    """
+    Requests or tokens budget of one endpoint, refilled at `per_minute` per minute.
+
+    Enforced over one-second windows: the bucket holds a second of budget.
+    A request larger than that is let through once the bucket is full.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+def request_tokens(endpoint: str, request: dict) -> int:
+    """Tokens a request counts against the limit (prompt estimate, plus max_tokens for chat)."""
+    if endpoint == "embeddings":
+        inputs = request.get("input", [])
+        return sum(len(text) // 4 for text in ([inputs] if isinstance(inputs, str) else inputs))
+    prompt = sum(len(message.get("content") or "") for message in request.get("messages", []))
+    return prompt // 4 + int(request.get("max_tokens") or 0)
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler implementing /v1/embeddings, /v1/chat/completions and /v1/models."""
+
+    server_version = "FakeOpenAI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {
+                "object": "list",
+                "data": [
+                    {"id": "text-embedding-3-small", "object": "model", "created": 0, "owned_by": "fake"},
+                    {"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "fake"}
+                ]
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _send_rate_limit(self, message: str, retry_after: float):
+        body = json.dumps({"error": {"message": message, "type": "rate_limit_error"}}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Retry-After", str(max(1, math.ceil(retry_after))))
+        self.send_header("retry-after-ms", str(max(1, math.ceil(retry_after * 1000))))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self) -> bool:
+        """Inject a configured fraction of server errors and rate limits."""
+        config = self.server.config
+        roll = self.server.random()
+        if roll < config.error_rate:
+            self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return True
+        if roll < config.error_rate + config.rate_limit_rate:
+            self._send_rate_limit("Injected rate limit", config.retry_after_seconds)
+            return True
+        return False
+
+    def _sleep(self, milliseconds: float):
+        """Sleep for a latency plus uniform jitter, and sometimes a latency spike."""
+        config = self.server.config
+        jitter = config.jitter_ms * self.server.random()
+        spike = config.spike_ms if self.server.random() < config.spike_rate else 0.0
+        time.sleep((milliseconds + jitter + spike) / 1000)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.rstrip("/")
+        endpoint = "embeddings" if path.endswith("/embeddings") else "chat" if path.endswith("/chat/completions") else None
+        if endpoint:
+            retry_after = self.server.admit(endpoint, request_tokens(endpoint, request))
+            if retry_after is not None:
+                self._send_rate_limit(f"Rate limit reached for {endpoint}", retry_after)
+                return
+        if self._maybe_fail():
+            return
+        if endpoint:
+            self.server.count(endpoint, "served")
+
+        if endpoint == "embeddings":
+            self._handle_embeddings(request)
+        elif endpoint == "chat":
+            self._handle_chat(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _handle_embeddings(self, request: dict):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        config = self.server.config
+        self._sleep(config.latency_ms + config.per_item_ms * len(inputs))
+
+        self._send_json(200, {
+            "object": "list",
+            "model": request.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {
+                "prompt_tokens": sum(len(text) // 4 for text in inputs),
+                "total_tokens": sum(len(text) // 4 for text in inputs)
+            }
+        })
+
+    def _handle_chat(self, request: dict):
+        config = self.server.config
+        self._sleep(config.chat_latency_ms)
+
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        content = f"Stand-in answer {digest}."
+
+        if request.get("stream"):
+            self._stream_chat(request, digest, content)
+            return
+
+        self._send_json(200, {
+            "id": f"chatcmpl-{digest}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4
+            }
+        })
+
+    def _stream_chat(self, request: dict, digest: str, content: str):
+        """Send the completion as server-sent events using chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload: str):
+            data = payload.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        words = content.split(" ")
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.server.config.token_latency_ms / 1000)
+                chunk = {
+                    "id": f"chatcmpl-{digest}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-4o-mini"),
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": "stop" if i == len(words) - 1 else None
+                    }]
+                }
+                send(f"data: {json.dumps(chunk)}\n\n")
+            send("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            pass
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying the latency and failure configuration."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeOpenAIHandler)
+        self.config = config
+        self._random = random.Random(getattr(config, "seed", 0))
+        self._random_lock = threading.Lock()
+        self._limits: Dict[str, List[LimitBucket]] = {}
+        self._limits_lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        rpm_limit = getattr(config, "rpm_limit", 0)
+        tpm_limit = getattr(config, "tpm_limit", 0)
+        for endpoint in ("embeddings", "chat"):
+            self._limits[endpoint] = [
+                LimitBucket(rpm_limit) if rpm_limit else None,
+                LimitBucket(tpm_limit) if tpm_limit else None
+            ]
+
+    def handle_error(self, request, client_address):
+        # A client that gave up on a request (e.g. the losing side of a hedge) is not a server error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def random(self) -> float:
+        """Seeded random number shared by all handler threads."""
+        with self._random_lock:
+            return self._random.random()
+
+    def count(self, endpoint: str, outcome: str, amount: int = 1):
+        """Add to the per-endpoint request counters in `stats` (e.g. "embeddings_served")."""
+        with self._limits_lock:
+            key = f"{endpoint}_{outcome}"
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def admit(self, endpoint: str, tokens: int) -> Optional[float]:
+        """
+        Charge a request to the endpoint's limits.
+
+        Returns:
+            None if the request is within the limits, else the seconds until it would be
+        """
+        with self._limits_lock:
+            now = time.monotonic()
+            requests, token_budget = self._limits[endpoint]
+            wait = 0.0
+            if requests:
+                wait = requests.wait_time(1, now)
+            if token_budget:
+                wait = max(wait, token_budget.wait_time(tokens, now))
+            if wait > 0:
+                key = f"{endpoint}_rate_limited"
+                self.stats[key] = self.stats.get(key, 0) + 1
+                return wait
+            if requests:
+                requests.level -= 1
+            if token_budget:
+                token_budget.level -= tokens
+            key = f"{endpoint}_tokens"
+            self.stats[key] = self.stats.get(key, 0) + tokens
+            return None
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 50.0,
+                 per_item_ms: float = 0.5, chat_latency_ms: float = 400.0,
+                 token_latency_ms: float = 20.0, jitter_ms: float = 0.0,
+                 spike_rate: float = 0.0, spike_ms: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after_seconds: float = 1.0, rpm_limit: int = 0, tpm_limit: int = 0,
+                 seed: int = 0) -> FakeOpenAIServer:
+    """
+    Start the fake server on a background thread.
+
+    Args:
+        latency_ms / chat_latency_ms: Fixed latency of embeddings / chat requests
+        per_item_ms: Extra embeddings latency per input
+        token_latency_ms: Delay between streamed tokens
+        jitter_ms: Uniform random latency added to every request
+        spike_rate / spike_ms: Fraction of requests delayed by an extra spike_ms
+        error_rate: Fraction of requests answered with a 500
+        rate_limit_rate: Fraction of requests answered with a 429
+        retry_after_seconds: Retry-After value sent with 429s
+        rpm_limit / tpm_limit: Requests / tokens per minute allowed per endpoint (0 = unlimited)
+        seed: Seed for jitter, spikes and failure injection
+
+    Returns:
+        The running server; its base URL is f"http://{host}:{server.server_port}/v1"
+    """
+    config = argparse.Namespace(latency_ms=latency_ms, per_item_ms=per_item_ms,
+                                chat_latency_ms=chat_latency_ms, token_latency_ms=token_latency_ms,
+                                jitter_ms=jitter_ms, spike_rate=spike_rate, spike_ms=spike_ms,
+                                error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+                                retry_after_seconds=retry_after_seconds, rpm_limit=rpm_limit,
+                                tpm_limit=tpm_limit, seed=seed)
+    server = FakeOpenAIServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fixed latency per embeddings request")
+    parser.add_argument("--per-item-ms", type=float, default=0.5, help="Extra latency per embedded input")
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Fixed latency per chat completion")
+    parser.add_argument("--token-latency-ms", type=float, default=20.0, help="Delay between streamed tokens")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random latency added to every request")
+    parser.add_argument("--spike-rate", type=float, default=0.0, help="Fraction of requests hit by a latency spike")
+    parser.add_argument("--spike-ms", type=float, default=0.0, help="Extra latency of a spike")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument("--retry-after-seconds", type=float, default=1.0, help="Retry-After sent with 429s")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Requests per minute allowed per endpoint")
+    parser.add_argument("--tpm-limit", type=int, default=0, help="Tokens per minute allowed per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer((args.host, args.port), args)
+    print(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
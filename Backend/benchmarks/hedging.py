@@ -0,0 +1,131 @@
+"""
+Benchmark tail latency of chat completions with provider routing and hedging.
+
+Starts two local fake OpenAI servers standing in for two providers, each
+with jitter and independent latency spikes (a share of requests stalls
+for --spike-ms), and sends the same stream of generate_response_async
+calls through the router in three modes:
+- single: the default provider only (the previous behaviour);
+- routed: both providers, latency-aware routing without hedging;
+- hedged: both providers, a call still unanswered after the primary's
+  rolling p95 (or --hedge-delay-ms) is duplicated on the other provider.
+Reports p50/p95/p99/max latency, the share of extra requests the hedges
+cost and how the calls were split between the providers.
+
+Usage:
+    python -m benchmarks.hedging --requests 400 --concurrency 16 --spike-rate 0.02 --spike-ms 2000
+    python -m benchmarks.hedging --backup-latency-ms 300 --hedge-delay-ms 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_openai import start_server
+
+MODES = ("single", "routed", "hedged")
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+def run_mode(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Send every request once in the given mode against fresh stand-in providers."""
+    from prometheus_client import REGISTRY
+    from app.core.config import settings
+    from app.core.resources import resources
+    from app.services.query_service import generate_response_async
+
+    primary = start_server(chat_latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           spike_rate=args.spike_rate, spike_ms=args.spike_ms, seed=1)
+    backup = start_server(chat_latency_ms=args.backup_latency_ms or args.latency_ms, jitter_ms=args.jitter_ms,
+                          spike_rate=args.spike_rate, spike_ms=args.spike_ms, seed=2)
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{primary.server_port}/v1"
+    settings.LLM_PROVIDERS = "" if mode == "single" else json.dumps([{
+        "name": "backup",
+        "base_url": f"http://127.0.0.1:{backup.server_port}/v1",
+        "api_key": "benchmark",
+        "chat_model": "backup-chat"
+    }])
+    settings.LLM_HEDGE_ENABLED = mode == "hedged"
+    settings.LLM_HEDGE_DELAY_MS = args.hedge_delay_ms
+    resources.init()
+
+    def hedges(winner: str) -> float:
+        return REGISTRY.get_sample_value("rag_llm_hedges_total", {"operation": "chat", "winner": winner}) or 0.0
+
+    hedges_before = {winner: hedges(winner) for winner in ("primary", "hedge")}
+
+    async def workload() -> List[float]:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: List[float] = []
+
+        async def one(index: int):
+            async with semaphore:
+                started = time.perf_counter()
+                await generate_response_async(f"{mode} question {index}", max_tokens=50)
+                if index >= args.warmup:
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(index) for index in range(args.warmup + args.requests)))
+        await resources.close()
+        return latencies
+
+    latencies = asyncio.run(workload())
+    served = {"primary": primary.stats.get("chat_served", 0), "backup": backup.stats.get("chat_served", 0)}
+    primary.shutdown()
+    backup.shutdown()
+
+    calls = args.warmup + args.requests
+    return {
+        "mode": mode,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "extra": (served["primary"] + served["backup"]) / calls - 1,
+        "backup_share": served["backup"] / max(1, served["primary"] + served["backup"]),
+        "hedges_won": {winner: int(hedges(winner) - before) for winner, before in hedges_before.items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=400, help="Measured chat calls per mode")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured calls that fill the latency window first")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Chat latency of both providers")
+    parser.add_argument("--backup-latency-ms", type=float, default=0.0,
+                        help="Chat latency of the second provider (defaults to --latency-ms)")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--spike-rate", type=float, default=0.02, help="Share of requests hit by a latency spike")
+    parser.add_argument("--spike-ms", type=float, default=2000.0)
+    parser.add_argument("--hedge-delay-ms", type=float, default=0.0,
+                        help="Fixed hedge delay (0 = the primary's rolling p95)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_hedging_")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["VECTOR_STORE_BACKEND"] = "numpy"
+    os.environ["NUMPY_INDEX_PATH"] = f"{workdir}/vector_index"
+    import logging
+    logging.disable(logging.WARNING)
+
+    results = [run_mode(mode, args) for mode in args.modes]
+
+    print(f"{args.requests} chat calls at concurrency {args.concurrency}; latency {args.latency_ms:.0f} ms "
+          f"+ up to {args.jitter_ms:.0f} ms jitter, {args.spike_rate:.0%} of requests spike by {args.spike_ms:.0f} ms")
+    print(f"{'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'extra':>6} "
+          f"{'backup':>7} {'hedges won':>16}")
+    for result in results:
+        won = result["hedges_won"]
+        print(f"{result['mode']:>8} {result['p50'] * 1000:>8.0f} {result['p95'] * 1000:>8.0f} "
+              f"{result['p99'] * 1000:>8.0f} {result['max'] * 1000:>8.0f} {result['extra'] * 100:>5.1f}% "
+              f"{result['backup_share'] * 100:>6.0f}% {won['hedge']:>5} of {won['hedge'] + won['primary']:>5}")
+
+if __name__ == "__main__":
+    main()
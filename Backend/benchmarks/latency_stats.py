@@ -0,0 +1,97 @@
+"""
+Check that a cancelled hedge loser does not count as a latency sample.
+
+Builds an LLMRouter over two in-process routes (no network), gives the
+primary a window of fast calls, then makes hedged calls for which the
+primary stalls, so the backup answers and the primary's call is
+cancelled. Checks that the primary's hedge percentile, its number of
+samples and its error rate are unchanged by the cancelled calls, and
+that the backup recorded its answers. Exits non-zero if any check fails.
+
+Usage:
+    python -m benchmarks.latency_stats
+"""
+import argparse
+import asyncio
+import sys
+
+from app.core.call_scheduler import CallScheduler
+from app.core.config import settings
+from app.core.llm_router import HEDGE_MIN_SAMPLES, LLMRouter, Provider
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fast-ms", type=float, default=10, help="Latency of the primary's measured calls")
+    parser.add_argument("--stall-ms", type=float, default=2000, help="Latency of the primary's stalled calls")
+    parser.add_argument("--hedges", type=int, default=5, help="Hedged calls whose primary call is cancelled")
+    args = parser.parse_args()
+
+    settings.LLM_HEDGE_DELAY_MS = 0
+    settings.LLM_HEDGE_MIN_DELAY_MS = 0
+    settings.LLM_EXPLORE_RATE = 0.0
+
+    def provider(name: str) -> Provider:
+        return Provider(
+            name=name,
+            chat_model=f"{name}-chat",
+            embedding_model=None,
+            clients={},
+            async_clients={},
+            schedulers={"chat": CallScheduler(f"{name}:chat")}
+        )
+
+    router = LLMRouter([provider("primary"), provider("backup")])
+    primary, backup = router.routes("chat")
+    if primary.provider.name != "primary":
+        primary, backup = backup, primary
+
+    async def answer(seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        return "answer"
+
+    # Pin the route order, so every call starts on the primary
+    router.routes = lambda operation, model=None: [primary, backup]
+
+    async def run():
+        for _ in range(HEDGE_MIN_SAMPLES):
+            await router.call_async("chat", lambda route: answer(args.fast_ms / 1000), hedge=False)
+        before = (
+            router.stats(primary).percentile(settings.LLM_HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES),
+            len(router.stats(primary)._latencies),
+            sum(router.stats(primary)._failures)
+        )
+
+        def factory(route):
+            return answer(args.stall_ms / 1000 if route is primary else args.fast_ms / 1000)
+
+        winners = [(await router.call_async("chat", factory, hedge=True))[1] for _ in range(args.hedges)]
+        after = (
+            router.stats(primary).percentile(settings.LLM_HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES),
+            len(router.stats(primary)._latencies),
+            sum(router.stats(primary)._failures)
+        )
+        return before, after, winners
+
+    before, after, winners = asyncio.run(run())
+    problems = []
+    if any(winner is not backup for winner in winners):
+        problems.append("expected the backup to win every hedge")
+    if after[0] != before[0]:
+        problems.append(f"the cancelled calls moved the primary's p{settings.LLM_HEDGE_PERCENTILE:g} "
+                        f"from {before[0] * 1000:.1f} ms to {after[0] * 1000:.1f} ms")
+    if after[1] != before[1]:
+        problems.append(f"the cancelled calls were kept as latency samples ({before[1]} -> {after[1]} samples)")
+    if after[2] != before[2]:
+        problems.append("the cancelled calls were counted as errors")
+    if len(router.stats(backup)._latencies) != args.hedges:
+        problems.append("the backup's answers were not recorded")
+
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"cancelled hedge losers ignored: primary p{settings.LLM_HEDGE_PERCENTILE:g} "
+          f"stays {after[0] * 1000:.1f} ms over {after[1]} samples")
+
+if __name__ == "__main__":
+    main()
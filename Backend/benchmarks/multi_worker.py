@@ -0,0 +1,175 @@
+"""
+Multi-process load test of the single-writer deployment.
+
+Starts the fake OpenAI server, one vector writer process
+(python -m app.core.vector_writer) and the API under uvicorn with a
+growing number of worker processes, all sharing one vector store
+directory. The store is seeded with random chunks through the writer, one
+PDF is uploaded through the API (so its writes travel over the writer
+socket and must become visible to every worker), then queries are fired
+at /api/v1/query. Reports queries/sec and latency per worker count.
+
+Retrieval is exact search over every stored vector, so with a large store
+and a fast fake API the query path is CPU-bound and throughput should grow
+with the number of workers up to the number of cores.
+
+Usage:
+    python -m benchmarks.multi_worker --workers 1 2 4 --chunks 200000 --queries 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.end_to_end import BACKEND_DIR, free_port, run_queries
+from benchmarks.fake_openai import EMBEDDING_DIMENSIONS, start_server
+from benchmarks.synthetic_pdfs import make_pdf
+
+def start_writer(env: Dict[str, str], socket_path: str, log_path: str) -> subprocess.Popen:
+    """Start the vector writer and wait for its socket."""
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.core.vector_writer"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    deadline = time.time() + 120
+    while not os.path.exists(socket_path):
+        if process.poll() is not None or time.time() > deadline:
+            process.terminate()
+            raise RuntimeError(f"Vector writer did not start, see {log_path}")
+        time.sleep(0.1)
+    return process
+
+def seed(socket_path: str, chunks: int, batch: int = 2000):
+    """Write random chunks through the writer, the way API workers do."""
+    from app.core.vector_writer import VectorWriterClient
+    client = VectorWriterClient(socket_path)
+    rng = np.random.default_rng(0)
+    for start in range(0, chunks, batch):
+        count = min(batch, chunks - start)
+        client.call(
+            "upsert",
+            [f"seed:{start + i}" for i in range(count)],
+            rng.standard_normal((count, EMBEDDING_DIMENSIONS), dtype=np.float32),
+            [f"Seed chunk {start + i} about latency, storage, retrieval and caching." for i in range(count)],
+            [{"file_name": "seed.pdf", "chunk_num": start + i} for i in range(count)]
+        )
+    client.close()
+
+def start_api(port: int, workers: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """Start uvicorn with `workers` processes and wait until /ready passes."""
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited during startup, see {log_path}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/v1/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API did not become ready, see {log_path}")
+
+def upload_and_wait(base_url: str, path: str, timeout: float = 300) -> Dict[str, object]:
+    """Ingest one PDF through the API and return the finished job."""
+    with open(path, "rb") as source:
+        response = httpx.post(f"{base_url}/api/v1/upload", files={"file": (os.path.basename(path), source, "application/pdf")})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = httpx.get(f"{base_url}/api/v1/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.2)
+    raise RuntimeError(f"Ingestion job {job_id} did not finish")
+
+async def load(base_url: str, queries: int, concurrency: int) -> Dict[str, object]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        # Warm every worker's connections and caches before measuring
+        await run_queries(client, min(queries, concurrency * 4), concurrency, use_cache=False)
+        return await run_queries(client, queries, concurrency, use_cache=False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    parser.add_argument("--chunks", type=int, default=200000, help="Random chunks seeded into the store")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    fake = start_server(latency_ms=1, per_item_ms=0, chat_latency_ms=1)
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    socket_path = f"{workdir}/vector_writer.sock"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake.server_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "DATABASE_URL": f"sqlite:///{workdir}/rag.sqlite3",
+        "CHROMA_DB_PATH": f"{workdir}/chroma",
+        "NUMPY_INDEX_PATH": f"{workdir}/vector_index",
+        "EMBEDDING_CACHE_PATH": f"{workdir}/embedding_cache/embeddings.sqlite3",
+        "UPLOAD_SPOOL_DIR": f"{workdir}/spool",
+        "VECTOR_STORE_BACKEND": args.backend,
+        "VECTOR_WRITER_ADDRESS": socket_path,
+        "ANSWER_CACHE_ENABLED": "false",
+        "QUERY_CONCURRENCY": str(args.concurrency)
+    })
+
+    writer = start_writer(env, socket_path, f"{workdir}/writer.log")
+    results: List[Dict[str, object]] = []
+    try:
+        started = time.perf_counter()
+        seed(socket_path, args.chunks)
+        print(f"Seeded {args.chunks} chunks through the writer in {time.perf_counter() - started:.1f}s")
+        pdf = make_pdf(f"{workdir}/upload.pdf", args.pdf_pages)
+
+        for index, workers in enumerate(args.workers):
+            port = free_port()
+            api = start_api(port, workers, env, f"{workdir}/api_{workers}.log")
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                if index == 0:
+                    job = upload_and_wait(base_url, pdf)
+                    print(f"Uploaded a {args.pdf_pages}-page PDF through {workers} worker(s): "
+                          f"{job['status']}, {job['chunks_stored']} chunks written by the writer")
+                result = asyncio.run(load(base_url, args.queries, args.concurrency))
+                result["workers"] = workers
+                results.append(result)
+            finally:
+                api.terminate()
+                api.wait(timeout=60)
+    finally:
+        writer.terminate()
+        writer.wait(timeout=60)
+        fake.shutdown()
+
+    print(f"CPU cores: {os.cpu_count()}, backend: {args.backend}, chunks: {args.chunks}")
+    print(f"{'workers':>7} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for result in results:
+        latency = result["latency"]
+        print(f"{result['workers']:>7} {result['queries_per_second']:>10} {latency['p50_ms']:>8} "
+              f"{latency['p95_ms']:>8} {result['errors']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark parallel PDF text extraction.
+
+Measures pages/sec of iter_pdf_pages for several worker counts on synthetic
+PDFs, next to the original single-threaded extract_text_from_pdf loop.
+
+Usage:
+    python -m benchmarks.pdf_extraction --pages 200 2000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from benchmarks.synthetic_pdfs import make_pdf
+
+def extract_serial_concat(path: str) -> int:
+    """The original extraction loop: string concatenation over all pages."""
+    document = fitz.open(path)
+    full_text = ""
+    for page_num in range(document.page_count):
+        full_text += document[page_num].get_text()
+    document.close()
+    return len(full_text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--pages-per-task", type=int, default=32)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from app.services.pdf_extraction import iter_pdf_pages, shutdown_extraction_pool
+
+    directory = tempfile.mkdtemp(prefix="bench_pdf_")
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'pages':>6} {'method':>14} {'seconds':>8} {'pages/s':>9}")
+    for pages in args.pages:
+        path = make_pdf(os.path.join(directory, f"synthetic_{pages}.pdf"), pages)
+
+        started = time.perf_counter()
+        extract_serial_concat(path)
+        elapsed = time.perf_counter() - started
+        print(f"{pages:>6} {'serial-concat':>14} {elapsed:>8.3f} {pages / elapsed:>9.1f}")
+
+        for workers in args.workers:
+            # Warm the pool so process start-up is not counted
+            list(iter_pdf_pages(path, workers=workers, pages_per_task=args.pages_per_task))
+            started = time.perf_counter()
+            count = sum(1 for _ in iter_pdf_pages(path, workers=workers, pages_per_task=args.pages_per_task))
+            elapsed = time.perf_counter() - started
+            print(f"{pages:>6} {f'workers={workers}':>14} {elapsed:>8.3f} {count / elapsed:>9.1f}")
+
+    shutdown_extraction_pool()
+
+if __name__ == "__main__":
+    main()
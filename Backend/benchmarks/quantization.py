@@ -0,0 +1,113 @@
+"""
+Report recall@k versus memory for quantized vector storage.
+
+Builds NumPy vector stores with no quantization, float16 and int8 over the
+same clustered synthetic embeddings (real embeddings are far from uniform,
+so clusters make near neighbours hard to tell apart), then measures, for
+several re-rank oversampling factors, the recall@k against exact float32
+search, query latency and the bytes a search scan touches.
+
+Usage:
+    python -m benchmarks.quantization --chunks 100000 --top-k 3 10 --oversample 1 2 4 8
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+def clustered_vectors(count: int, dim: int, seed: int, spread: float = 0.35) -> np.ndarray:
+    """Unit vectors scattered around count // 50 random centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, count // 50), dim), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    vectors = centres[rng.integers(0, len(centres), count)]
+    vectors += rng.standard_normal((count, dim), dtype=np.float32) * (spread / np.sqrt(dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth nearest rows (by inner product of unit vectors) for each query."""
+    scores = vectors @ queries.T
+    top = np.argpartition(-scores, k - 1, axis=0)[:k].T
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores.T, top, axis=1), axis=1), axis=1)
+
+def disk_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--oversample", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["none", "float16", "int8"])
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from app.core.vector_store import NumpyVectorStore
+
+    vectors = clustered_vectors(args.chunks, args.dim, seed=0)
+    # Queries are perturbed copies of stored chunks, like questions about a passage
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.chunks, args.queries)]
+    queries = queries + rng.standard_normal(queries.shape, dtype=np.float32) * (0.5 / np.sqrt(args.dim))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = {k: exact_top_k(vectors, queries, k) for k in args.top_k}
+
+    results = []
+    for mode in args.modes:
+        path = tempfile.mkdtemp(prefix=f"bench_quant_{mode}_")
+        try:
+            store = NumpyVectorStore(path, quantization=mode)
+            for start in range(0, args.chunks, 10000):
+                part = vectors[start:start + 10000]
+                store.upsert(
+                    ids=[str(start + i) for i in range(len(part))],
+                    embeddings=part,
+                    documents=[""] * len(part),
+                    metadatas=[{}] * len(part)
+                )
+            for oversample in (args.oversample if mode != "none" else [1]):
+                store.rerank_oversample = oversample
+                for k in args.top_k:
+                    latencies = []
+                    hits = 0
+                    for query, expected in zip(queries, truth[k]):
+                        started = time.perf_counter()
+                        rows, _ = store.search([query], k)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        hits += len(np.intersect1d(rows[0], expected))
+                    results.append({
+                        "mode": mode,
+                        "oversample": oversample if mode != "none" else None,
+                        "k": k,
+                        "recall": hits / (k * len(queries)),
+                        "p50_ms": float(np.percentile(latencies, 50)),
+                        "scan_mb": store.memory_bytes() / (1024 * 1024),
+                        "bytes_per_vector": store.memory_bytes() / args.chunks,
+                        "disk_mb": disk_mb(path)
+                    })
+            store.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"chunks": args.chunks, "dim": args.dim, "results": results}, indent=2))
+        return
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries")
+    print(f"{'mode':>8} {'oversample':>10} {'k':>3} {'recall':>7} {'p50_ms':>7} "
+          f"{'scan_mb':>8} {'B/vector':>9} {'disk_mb':>8}")
+    for row in results:
+        oversample = "-" if row["oversample"] is None else row["oversample"]
+        print(f"{row['mode']:>8} {oversample:>10} {row['k']:>3} {row['recall']:>7.3f} {row['p50_ms']:>7.2f} "
+              f"{row['scan_mb']:>8.1f} {row['bytes_per_vector']:>9.0f} {row['disk_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark query throughput as the number of concurrent clients grows.
+
+Seeds a temporary vector store, then drives the blocking answer_query
+pipeline (as the old endpoint ran it, on the event loop) and the async
+answer_query_async pipeline with N concurrent clients against the fake
+OpenAI server, which adds fixed latency to every call.
+
+Usage:
+    python -m benchmarks.query_concurrency --clients 1 4 16 64 --chat-latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_openai import fake_embedding, start_server
+
+def seed_collection(chunks: int):
+    """Fill the benchmark vector store with synthetic chunks."""
+    from app.core.resources import resources
+    store = resources.ensure().vector_store
+    texts = [f"Synthetic chunk {i} about topic {i % 50}." for i in range(chunks)]
+    for start in range(0, chunks, 1000):
+        part = texts[start:start + 1000]
+        store.upsert(
+            ids=[f"bench_{start + i}" for i in range(len(part))],
+            documents=part,
+            embeddings=[fake_embedding(text) for text in part],
+            metadatas=[{"file_name": "bench.pdf", "chunk_num": start + i} for i in range(len(part))]
+        )
+
+async def run_clients(answer, clients: int, queries_per_client: int, offset: int) -> float:
+    """Run `clients` concurrent loops of queries and return queries/sec."""
+    async def client(index: int):
+        for n in range(queries_per_client):
+            await answer(f"Question {offset}-{index}-{n} about topic {n % 50}?")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return clients * queries_per_client / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries-per-client", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Embedding latency")
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0, help="Completion latency")
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms, chat_latency_ms=args.chat_latency_ms)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["CHROMA_DB_PATH"] = tempfile.mkdtemp(prefix="bench_chroma_")
+
+    # Import after the environment points at the fake server
+    import logging
+    logging.disable(logging.INFO)
+    from app.services import query_service
+
+    seed_collection(args.chunks)
+
+    async def blocking_answer(query: str):
+        # What the endpoint used to do: a synchronous call inside an async handler
+        query_service.answer_query(query)
+
+    async def run():
+        print(f"{'clients':>7} {'blocking_qps':>12} {'async_qps':>10} {'speedup':>8}")
+        for offset, clients in enumerate(args.clients):
+            blocking = await run_clients(blocking_answer, clients, args.queries_per_client, offset)
+            non_blocking = await run_clients(query_service.answer_query_async, clients,
+                                             args.queries_per_client, offset + 1000)
+            print(f"{clients:>7} {blocking:>12.2f} {non_blocking:>10.2f} {non_blocking / blocking:>7.1f}x")
+
+    asyncio.run(run())
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
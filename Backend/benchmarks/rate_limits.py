@@ -0,0 +1,133 @@
+"""
+Benchmark ingestion embedding against a provider that enforces rate limits.
+
+Runs several concurrent "uploads" (generate_embeddings calls, as ingestion
+workers make them) against the local fake OpenAI server with requests/min
+and tokens/min limits, in three modes:
+- sdk-retries: no call scheduler, the OpenAI SDK's own two retries (the
+  previous behaviour);
+- adaptive: the call scheduler with unknown limits, adapting to 429s,
+  Retry-After and AIMD concurrency alone;
+- budgeted: the call scheduler given the provider's limits.
+Reports failed uploads, sustained chunks/sec and tokens/min as a share of
+the limit, and how many 429s the provider returned.
+
+Usage:
+    python -m benchmarks.rate_limits --uploads 4 --chunks 500 --rpm-limit 300 --tpm-limit 1000000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.embedding_batches import synthetic_chunks
+from benchmarks.fake_openai import start_server
+
+MODES = ("sdk-retries", "adaptive", "budgeted")
+
+def run_mode(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Ingest every upload once in the given mode against a fresh rate-limited server."""
+    from prometheus_client import REGISTRY
+    from app.core.call_scheduler import embedding_scheduler
+    from app.core.config import settings
+    from app.core.resources import resources
+    from app.services.embedding_service import generate_embeddings
+
+    server = start_server(latency_ms=args.latency_ms, per_item_ms=args.per_item_ms,
+                          rpm_limit=args.rpm_limit, tpm_limit=args.tpm_limit)
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1"
+    settings.LLM_SCHEDULER_ENABLED = mode != "sdk-retries"
+    if mode == "budgeted":
+        embedding_scheduler.configure(args.rpm_limit, args.tpm_limit, args.max_in_flight)
+    else:
+        embedding_scheduler.configure(0, 0, args.max_in_flight)
+    resources.init()
+
+    def retries() -> float:
+        return sum(
+            REGISTRY.get_sample_value("rag_llm_retries_total", {"operation": "embedding", "reason": reason}) or 0.0
+            for reason in ("rate_limit", "server_error", "connection")
+        )
+
+    retries_before = retries()
+    failures: List[str] = []
+    lock = threading.Lock()
+
+    def upload(index: int):
+        texts = synthetic_chunks(args.chunks, args.chunk_chars)
+        texts = [f"{mode} upload {index} {text}" for text in texts]
+        try:
+            generate_embeddings(texts, batch_max_items=args.batch_items, concurrency=args.concurrency)
+        except Exception as e:
+            with lock:
+                failures.append(f"{type(e).__name__}: {str(e)[:80]}")
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(args.uploads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = dict(server.stats)
+    server.shutdown()
+    asyncio.run(resources.close())
+
+    tokens = stats.get("embeddings_tokens", 0)
+    succeeded = args.uploads - len(failures)
+    return {
+        "mode": mode,
+        "failed": len(failures),
+        "seconds": elapsed,
+        "chunks_per_second": succeeded * args.chunks / elapsed,
+        "limit_share": tokens / elapsed * 60 / args.tpm_limit if args.tpm_limit else 0.0,
+        "rate_limited": stats.get("embeddings_rate_limited", 0),
+        "served": stats.get("embeddings_served", 0),
+        "retries": int(retries() - retries_before),
+        "final_limit": embedding_scheduler.limit if settings.LLM_SCHEDULER_ENABLED else None,
+        "errors": failures[:1]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent uploads")
+    parser.add_argument("--chunks", type=int, default=500, help="Chunks per upload")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Characters per chunk (~4 per token)")
+    parser.add_argument("--batch-items", type=int, default=64, help="Chunks per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Batches in flight per upload")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="Scheduler concurrency ceiling")
+    parser.add_argument("--rpm-limit", type=int, default=300)
+    parser.add_argument("--tpm-limit", type=int, default=1000000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_rate_limits_")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["VECTOR_STORE_BACKEND"] = "numpy"
+    os.environ["NUMPY_INDEX_PATH"] = f"{workdir}/vector_index"
+    import logging
+    logging.disable(logging.ERROR)
+
+    results = [run_mode(mode, args) for mode in args.modes]
+
+    print(f"{args.uploads} uploads x {args.chunks} chunks of ~{args.chunk_chars // 4} tokens; "
+          f"limits {args.rpm_limit} requests/min, {args.tpm_limit} tokens/min")
+    print(f"{'mode':>12} {'failed':>6} {'seconds':>8} {'chunks/s':>9} {'% of TPM':>8} "
+          f"{'429s':>6} {'served':>6} {'retries':>7} {'limit':>6}")
+    for result in results:
+        limit = f"{result['final_limit']:.1f}" if result["final_limit"] is not None else "-"
+        print(f"{result['mode']:>12} {result['failed']:>6} {result['seconds']:>8.1f} "
+              f"{result['chunks_per_second']:>9.1f} {result['limit_share'] * 100:>7.0f}% "
+              f"{result['rate_limited']:>6} {result['served']:>6} {result['retries']:>7} {limit:>6}")
+        for error in result["errors"]:
+            print(f"{'':>12} first failure: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Synthetic PDF generation for benchmarks.
+
+Usage:
+    python -m benchmarks.synthetic_pdfs --pages 500 --output /tmp/synthetic.pdf
+"""
+import argparse
+import random
+
+import fitz  # PyMuPDF
+
+WORDS = (
+    "system pipeline document embedding vector query latency throughput context answer "
+    "retrieval chunk index model token batch cache worker process storage network "
+    "request response server client memory disk page section table figure result"
+).split()
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0) -> str:
+    """
+    Write a PDF of `pages` pages filled with deterministic pseudo-random prose.
+
+    Args:
+        path: Output path
+        pages: Number of pages
+        lines_per_page: Text lines per page
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        lines = [f"Section {page_number + 1}"]
+        for _ in range(lines_per_page):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+        page.insert_text((50, 50), "\n".join(lines), fontsize=9)
+    document.save(path)
+    document.close()
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--output", default="synthetic.pdf")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_pdf(args.output, args.pages, seed=args.seed))
+
+if __name__ == "__main__":
+    main()
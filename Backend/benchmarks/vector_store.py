@@ -0,0 +1,132 @@
+"""
+Benchmark the vector store backends.
+
+For each corpus size, builds a ChromaDB and a NumPy (memory-mapped) index
+of random unit vectors, then reopens each index in a fresh process and
+measures top-k query latency, resident memory and size on disk. Builds and
+measurements run in separate processes so their memory does not mix.
+
+Usage:
+    python -m benchmarks.vector_store --sizes 10000 100000 1000000 --backends chroma numpy
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+BATCH = 5000
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+def random_vectors(seed: int, count: int, dim: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def open_store(backend: str, path: str):
+    import logging
+    logging.disable(logging.INFO)
+    from app.core.vector_store import ChromaVectorStore, NumpyVectorStore
+    if backend == "numpy":
+        return NumpyVectorStore(path)
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    client = chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+    return ChromaVectorStore(client.get_or_create_collection(name="bench"))
+
+def build(backend: str, path: str, size: int, dim: int) -> float:
+    """Insert `size` random chunks and return the elapsed seconds."""
+    store = open_store(backend, path)
+    started = time.perf_counter()
+    for start in range(0, size, BATCH):
+        count = min(BATCH, size - start)
+        store.upsert(
+            ids=[f"chunk_{start + i}" for i in range(count)],
+            embeddings=random_vectors(start, count, dim),
+            documents=[f"Synthetic chunk {start + i}" for i in range(count)],
+            metadatas=[{"file_name": f"doc_{(start + i) // 100}.pdf", "chunk_num": (start + i) % 100} for i in range(count)]
+        )
+    elapsed = time.perf_counter() - started
+    store.close()
+    return elapsed
+
+def measure(backend: str, path: str, dim: int, queries: int, top_k: int) -> Dict[str, Any]:
+    """Reopen an index and measure query latency and memory."""
+    baseline = rss_mb()
+    started = time.perf_counter()
+    store = open_store(backend, path)
+    open_seconds = time.perf_counter() - started
+
+    query_vectors = random_vectors(10 ** 9, queries + 1, dim)
+    started = time.perf_counter()
+    store.query([query_vectors[0]], top_k)
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    for vector in query_vectors[1:]:
+        started = time.perf_counter()
+        store.query([vector], top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    store.close()
+    return {
+        "open_s": open_seconds,
+        "cold_ms": cold_ms,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": rss_mb() - baseline
+    }
+
+def run_in_process(function, *args):
+    """Run function(*args) in a fresh spawned process and return its result."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"], choices=["chroma", "numpy"])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    print(f"{'chunks':>8} {'backend':>7} {'build_s':>8} {'open_s':>7} {'cold_ms':>8} "
+          f"{'p50_ms':>7} {'p95_ms':>7} {'rss_mb':>8} {'disk_mb':>8}")
+    for size in args.sizes:
+        for backend in args.backends:
+            path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+            try:
+                build_seconds = run_in_process(build, backend, path, size, args.dim)
+                result = run_in_process(measure, backend, path, args.dim, args.queries, args.top_k)
+                print(f"{size:>8} {backend:>7} {build_seconds:>8.1f} {result['open_s']:>7.2f} "
+                      f"{result['cold_ms']:>8.1f} {result['p50_ms']:>7.2f} {result['p95_ms']:>7.2f} "
+                      f"{result['rss_mb']:>8.1f} {disk_mb(path):>8.1f}")
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Check that the vector writer only accepts authenticated connections.
+
+Starts a VectorWriterServer over a NumPy store on a Unix socket in a
+temporary directory (no VECTOR_WRITER_AUTHKEY, so the writer generates
+its own key) and checks that:
+- the socket and its key file are private to the writer's user;
+- a client without the key, whose first message is a pickle that would
+  create a marker directory when loaded, is rejected without the pickle
+  being loaded or anything being written;
+- a client with a wrong key is rejected;
+- VectorWriterClient, which reads the key file, can still write;
+- a host:port address without VECTOR_WRITER_AUTHKEY is refused by both
+  the server and the client.
+Exits non-zero if any check fails.
+
+Usage:
+    python -m benchmarks.writer_auth
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+class CreateMarker:
+    """Pickles as a call to os.mkdir(path), which runs if the writer ever loads it."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_writer_auth_")
+    os.environ.pop("VECTOR_WRITER_AUTHKEY", None)
+    import logging
+    logging.disable(logging.WARNING)
+    from multiprocessing.connection import Client
+    from app.core.vector_store import NumpyVectorStore
+    from app.core.vector_writer import VectorWriterClient, VectorWriterError, VectorWriterServer, key_path
+
+    store = NumpyVectorStore(f"{workdir}/index")
+    address = f"{workdir}/writer.sock"
+    server = VectorWriterServer(store, address)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            break
+        time.sleep(0.05)
+
+    problems = []
+    for path in (address, key_path(address)):
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+        if mode & 0o077:
+            problems.append(f"{os.path.basename(path)} is accessible to other users (mode {mode:o})")
+
+    marker = f"{workdir}/unpickled"
+    try:
+        connection = Client(address, family="AF_UNIX")
+        connection.send(CreateMarker(marker))
+        connection.send(("upsert", (["forged"], np.ones((1, 4), dtype=np.float32), ["x"], [{"file_name": "x"}])))
+        connection.recv()
+    except Exception:
+        pass
+    try:
+        Client(address, family="AF_UNIX", authkey=b"wrong key")
+        problems.append("a client with a wrong key was accepted")
+    except Exception:
+        pass
+    time.sleep(0.2)
+    if os.path.exists(marker):
+        problems.append("the writer loaded a pickle from an unauthenticated client")
+    if store.count():
+        problems.append(f"an unauthenticated client wrote {store.count()} chunks")
+
+    client = VectorWriterClient(address)
+    try:
+        client.call("upsert", ["real"], np.ones((1, 4), dtype=np.float32), ["text"], [{"file_name": "a.pdf"}])
+    except VectorWriterError as e:
+        problems.append(f"authenticated write failed: {str(e)}")
+    if store.count() != 1:
+        problems.append(f"expected 1 chunk after the authenticated write, found {store.count()}")
+    client.close()
+    server.close()
+
+    tcp_server = VectorWriterServer(store, "127.0.0.1:0")
+    try:
+        tcp_server.serve_forever()
+        problems.append("the writer listened on TCP without VECTOR_WRITER_AUTHKEY")
+    except VectorWriterError:
+        pass
+    try:
+        VectorWriterClient("127.0.0.1:9")
+        problems.append("a TCP client was created without VECTOR_WRITER_AUTHKEY")
+    except VectorWriterError:
+        pass
+    store.close()
+
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    if problems:
+        sys.exit(1)
+    print("vector writer authentication OK")
+
+if __name__ == "__main__":
+    main()
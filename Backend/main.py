@@ -1,10 +1,21 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.endpoints import router
-from app.models.database import init_db
-from app.core.config import settings
+from app.api.middleware import InFlightMiddleware
+from app.models.database import close_async_db, init_db
+from app.core.config import ensure_directories, settings
+from app.core.resources import resources
+from app.core.startup import startup
+from app.services.context_service import get_tokenizer
+from app.services.ingestion_queue import ingestion_queue
+from app.services.pdf_extraction import shutdown_extraction_pool
 
 # Configure logging
 logging.basicConfig(
@@ -13,6 +24,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup.reset(started=_import_started)
+startup.record("import", time.perf_counter() - _import_started)
+
+async def warm_up_in_background():
+    """
+    Create and warm the shared resources after the server starts accepting connections.
+
+    Heavy clients (ChromaDB, OpenAI) are imported and built here instead of
+    blocking startup; /api/v1/ready passes once every component is warm.
+    Creating the resources is retried with exponential backoff (from
+    READINESS_RETRY_SECONDS up to READINESS_RETRY_MAX_SECONDS), e.g. while
+    the vector writer has not created the store yet; components that fail
+    to warm are retried every READINESS_RETRY_SECONDS. The tokenizer is
+    loaded last and best-effort: it is not needed for readiness (context
+    sizes fall back to an estimate without it).
+    """
+    delay = settings.READINESS_RETRY_SECONDS
+    while True:
+        try:
+            with startup.step("resources"):
+                await asyncio.to_thread(resources.init)
+            break
+        except Exception as e:
+            logger.error(f"Failed to initialize shared resources, retrying in {delay:.1f}s: {str(e)}")
+            startup.mark_failed("vector_store", str(e))
+            startup.mark_failed("llm_client", str(e))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.READINESS_RETRY_MAX_SECONDS)
+
+    if not settings.WARMUP_ON_STARTUP:
+        startup.mark_ready("vector_store")
+        startup.mark_ready("llm_client")
+        return
+
+    pending = {"vector_store": resources.warm_up_vector_store, "llm_client": resources.warm_up_clients}
+    while pending:
+        for component, warm_up in list(pending.items()):
+            with startup.step(f"warm_{component}"):
+                warmed = await warm_up()
+            if warmed:
+                startup.mark_ready(component)
+                del pending[component]
+            else:
+                startup.mark_failed(component, "warm-up failed, retrying")
+        if pending:
+            await asyncio.sleep(settings.READINESS_RETRY_SECONDS)
+
+    try:
+        with startup.step("tokenizer"):
+            await asyncio.to_thread(get_tokenizer)
+    except Exception as e:
+        logger.warning(f"Failed to load the tokenizer at startup: {str(e)}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -21,17 +85,38 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up RAG Backend Service...")
     try:
-        # Initialize database tables
-        init_db()
+        with startup.step("directories"):
+            ensure_directories()
+        
+        # Initialize database tables (this also opens the first pooled connection)
+        with startup.step("database"):
+            init_db()
+        startup.mark_ready("database")
         logger.info("Database initialized successfully")
+        
+        # Start background ingestion workers
+        ingestion_queue.start()
     except Exception as e:
-        logger.error(f"Failed to initialize database: {str(e)}")
+        logger.error(f"Failed to initialize service: {str(e)}")
         raise
     
+    # Shared vector store and LLM clients are created and warmed in the background
+    warm_up_task = asyncio.create_task(warm_up_in_background())
+    
     yield
     
     # Shutdown
     logger.info("Shutting down RAG Backend Service...")
+    startup.reset()
+    warm_up_task.cancel()
+    try:
+        await warm_up_task
+    except asyncio.CancelledError:
+        pass
+    ingestion_queue.stop()
+    shutdown_extraction_pool()
+    await resources.close()
+    await close_async_db()
 
 # Create FastAPI application
 app = FastAPI(
@@ -53,6 +138,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Track in-flight requests per route for /metrics
+app.add_middleware(InFlightMiddleware)
+
 # Include routers
 app.include_router(router)
 
@@ -67,9 +155,20 @@ async def root():
         "version": settings.APP_VERSION,
         "status": "running",
         "docs": "/docs",
-        "health": "/api/v1/health"
+        "health": "/api/v1/health",
+        "ready": "/api/v1/ready",
+        "metrics": "/metrics"
     }
 
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+async def metrics():
+    """
+    Expose stage latencies, token usage, cache hit/miss counts, errors and
+    in-flight requests in the Prometheus text format.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     